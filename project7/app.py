@@ -1,9 +1,19 @@
 import os 
-from flask import Flask, session, render_template, request, jsonify, send_from_directory
-from datetime import datetime
+from flask import Flask, session, render_template, request, jsonify, send_from_directory, send_file, make_response, Response, stream_with_context
+from datetime import datetime, timezone
+import hashlib
 import json
 import uuid
 from research import ResearchPipeline
+from cache import normalize_query
+import metrics
+from jobs import AwaitingApproval, Job, JobManager
+from progress import JobProgress, ProgressEstimator
+from scheduler import PRIORITIES, JobTicket, job_context
+from checkpoint import CheckpointStore
+from state import JobCheckpoint
+from saved_pages import RECORD_SUFFIX, SavedPageIndex, read_record, record_path, write_record
+import asyncio
 import threading
 import time
 
@@ -16,210 +26,495 @@ SAVED_PAGES_DIR = 'saved_pages'
 # Ensure the directory exists
 os.makedirs(SAVED_PAGES_DIR, exist_ok=True)
 
+# Metadata index so listing pages doesn't read every saved file
+saved_index = SavedPageIndex(SAVED_PAGES_DIR)
+SAVED_PAGES_PER_PAGE = 50  # bookmarks shown per sidebar page
+
 # Variables for LLM integration
 research_question = []
 research_answer = """test output."""
 researcher = ResearchPipeline()  # Initialize the research pipeline
 research_sources = []
 
-# Progress tracking
-current_progress = 0
-progress_lock = threading.Lock()
-current_task = ""
-research_results = {"output": "", "sources": []}  # Store research results
-stage_durations = {
-    "init": 2,        # 2 seconds
-    "plan": 5,        # 5 seconds
-    "start_research": 2,  # 2 seconds
-    "research": 20,   # 15 seconds per point
-    "start_write": 2, # 2 seconds
-    "write": 10,      # 10 seconds
-    "finalize": 3     # 3 seconds
-}
-
-def update_progress(progress, task=""):
-    global current_progress, current_task
-    with progress_lock:
-        current_progress = progress
-        current_task = task
-
-def reset_progress():
-    global current_progress, current_task, research_results
-    with progress_lock:
-        current_progress = 0
-        current_task = ""
-        research_results = {"output": "", "sources": []}
-
-@app.route('/progress', methods=['GET'])
-def get_progress():
-    with progress_lock:
-        return jsonify({
-            'progress': current_progress,
-            'task': current_task
-        })
+# Shared event loop that runs research jobs without a thread per job
+research_loop = asyncio.new_event_loop()
+threading.Thread(target=research_loop.run_forever, daemon=True).start()
+
+def submit_research(coro):
+    """Hand a research coroutine to the shared loop and return its future"""
+    return asyncio.run_coroutine_threadsafe(coro, research_loop)
+
+# Research jobs
+MAX_CONCURRENT_JOBS = 4  # jobs running at once; the rest wait in the queue
+JOB_HISTORY_LIMIT = 200  # finished jobs kept for polling
+PROGRESS_INTERVAL = 2  # seconds between progress/ETA updates within a stage
+MAX_PLAN_FEEDBACK_ROUNDS = 5  # feedback rounds on a reviewed plan before it must be approved
+PLAN_REVIEW_TIMEOUT = 24 * 60 * 60  # seconds a plan waits for review before its job is cancelled
+
+# Learns stage durations from finished jobs to estimate progress and ETAs
+progress_estimator = ProgressEstimator(researcher.config.PROGRESS_PATH)
+
+# Per-job pipeline state, so crashed or failed jobs resume where they stopped
+checkpoints = CheckpointStore(researcher.config.CHECKPOINT_PATH)
+checkpoints.prune(researcher.config.CHECKPOINT_TTL)
+
+def job_stages():
+    """Stages a research job runs with the current configuration"""
+    stages = ["plan"]
+    if researcher.config.MULTI_QUERY:
+        stages.append("queries")
+    return stages + ["research", "write"]
+
+async def run_research_job(job):
+    """Run one job inside a metrics trace and its scheduler ticket, checkpointing it"""
+    estimate = progress_estimator.expected_job(researcher.llm.model_name, job_stages())
+    ticket = JobTicket(job.user, job.priority, estimate)
+    review = job.options.get('review_plan', False)
+    checkpoints.register(job, JobCheckpoint(query=job.query, plan_approved=False if review else None))
+    checkpoint = checkpoints.load(job.id)
+    try:
+        # a job resumed after plan review keeps adding to its trace
+        with metrics.trace(job.trace) as trace, job_context(ticket):
+            job.trace = trace
+            result = await research_job(job, ticket, checkpoint)
+    except AwaitingApproval:
+        checkpoints.set_status(job.id, CheckpointStore.AWAITING_APPROVAL)
+        raise
+    except asyncio.CancelledError:
+        checkpoints.set_status(job.id, CheckpointStore.CANCELLED)
+        raise
+    except Exception:
+        checkpoints.set_status(job.id, CheckpointStore.ERROR)
+        raise
+    checkpoints.remove(job.id)
+    return result
+
+async def research_job(job, ticket, checkpoint):
+    """Run the research pipeline for one job, restoring stages saved in its checkpoint"""
+    query = job.query
+
+    def save(stage=None):
+        if stage:
+            checkpoint.stage = stage
+        checkpoints.save(job.id, checkpoint)
+
+    tracker = JobProgress(progress_estimator, researcher.llm.model_name, job_stages(), researcher.limiter)
+    task = "Initializing research process..."
+
+    def report(new_task=None):
+        nonlocal task
+        task = new_task or task
+        progress, eta = tracker.snapshot()
+        job.update_progress(progress, task, round(eta, 1))
+        # the scheduler ranks shortest-first on time left and follows
+        # priority changes from submitters who attach later
+        ticket.estimate = eta
+        ticket.priority = job.priority
+
+    def begin(stage, new_task):
+        tracker.begin(stage, job.trace.totals())
+        report(new_task)
+
+    def end():
+        tracker.end(job.trace.totals())
+
+    async def tick():
+        # keep percent and ETA moving between stage events
+        while True:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            report()
+
+    report()
+    ticker = asyncio.create_task(tick())
+    try:
+        if checkpoint.outline:
+            outline = checkpoint.outline
+            tracker.skip("plan")
+        else:
+            begin("plan", "Planning research outline...")
+            if researcher.config.STREAM_PLAN and not researcher.config.MULTI_QUERY and checkpoint.plan_approved is None:
+                # searches start while the outline is still streaming
+                outline = await researcher.aplan_and_prefetch(query)
+            else:
+                outline = await researcher.aplan(query)
+            # the plan sample is recorded under the outline it produced
+            tracker.outline_size = len(outline)
+            end()
+            checkpoint.outline = outline
+            save("plan")
+        tracker.outline_size = len(outline)
+
+        if checkpoint.plan_approved is False:
+            feedback = checkpoint.feedback_on_report_plan
+            if len(feedback) > checkpoint.plan_revisions:
+                begin("plan", "Revising research outline...")
+                outline = await researcher.aplan(query, outline=outline, feedback=feedback[-1])
+                tracker.outline_size = len(outline)
+                end()
+                checkpoint.outline = outline
+                checkpoint.plan_revisions = len(feedback)
+                save("plan")
+            # park until the user approves; nothing is held while waiting
+            job.emit("plan", {"outline": outline, "rounds_left": MAX_PLAN_FEEDBACK_ROUNDS - len(feedback)})
+            raise AwaitingApproval("Waiting for plan approval...")
+        job.emit("outline", {"outline": outline})
+
+        queries = checkpoint.queries
+        if researcher.config.MULTI_QUERY and queries is None and checkpoint.evidence is None:
+            # One call writes the search queries for every point
+            begin("queries", "Writing search queries...")
+            queries = await researcher.aplan_queries(query, outline)
+            end()
+            checkpoint.queries = queries
+            save("queries")
+        elif researcher.config.MULTI_QUERY:
+            tracker.skip("queries")
+        if queries is not None:
+            job.emit("queries", {"queries": queries})
+
+        def on_research_progress(done, total, bullet, found):
+            tracker.advance(done / total)
+            report(f"Researched point {done}/{total}...")
+            job.emit("evidence", {
+                "bullet": bullet, "done": done, "total": total,
+                "evidence": [s.model_dump() for s in found],
+            })
+
+        if checkpoint.evidence is not None:
+            evidence = checkpoint.evidence
+            tracker.skip("research")
+            for done, bullet in enumerate(outline, 1):
+                on_research_progress(done, len(outline), bullet, evidence.get(bullet, []))
+        else:
+            begin("research", "Gathering evidence...")
+            evidence = await researcher.aresearch_all(outline, on_research_progress, queries)
+            evidence = researcher.compact(outline, evidence)
+            end()
+            checkpoint.evidence = evidence
+            save("research")
+
+        begin("write", "Writing final report...")
+        if researcher.config.WRITE_MODE == "sections":
+            # Sections are drafted in parallel, so report each one as it lands
+            def on_section(done, total, section):
+                checkpoint.sections[section.name] = section
+                save()
+                tracker.advance(done / total)
+                report(f"Drafted section {done}/{total}...")
+                job.emit("section", {"name": section.name, "content": section.content, "done": done, "total": total})
+
+            for done, section in enumerate(checkpoint.sections.values(), 1):
+                job.emit("section", {"name": section.name, "content": section.content, "done": done, "total": len(outline)})
+            result = await researcher.awrite_sections(
+                query, outline, evidence, on_section=on_section, drafted=dict(checkpoint.sections)
+            )
+        else:
+            # One report call, streamed token by token
+            chunks = []
+            async for chunk in researcher.astream_write(query, outline, evidence):
+                chunks.append(chunk)
+                job.emit("token", {"text": chunk})
+            result = "".join(chunks)
+        end()
+        report("Finalizing report...")
+    finally:
+        ticker.cancel()
+
+    sources = [s.model_dump(exclude={"content"}) for s in researcher.citations(evidence)]
+    return {"output": result, "sources": sources}
+
+def job_key(requirements, options):
+    """Key under which identical submissions share one job; None for reviewed plans"""
+    if options.get('review_plan'):
+        return None
+    return normalize_query(" ".join(requirements))
+
+def release_cancelled(job):
+    """Record a job cancelled while it was not running and stop its early searches"""
+    checkpoints.set_status(job.id, CheckpointStore.CANCELLED)
+    for future in speculative_research.pop(job.id, []):
+        future.cancel()
+
+jobs = JobManager(
+    run_research_job,
+    research_loop,
+    max_concurrent=MAX_CONCURRENT_JOBS,
+    max_history=JOB_HISTORY_LIMIT,
+    key=job_key,
+    approval_timeout=PLAN_REVIEW_TIMEOUT,
+    on_expire=release_cancelled,
+)
+
+def resume_orphaned_jobs():
+    """Resubmit jobs left unfinished by a worker that died, under their old ids"""
+    for orphan in checkpoints.claim_orphans():
+        print(f"Resuming research job {orphan['job_id']}")
+        # a job still under review parks again at its plan
+        checkpoint = checkpoints.load(orphan['job_id'])
+        options = {'review_plan': checkpoint.plan_approved is not None}
+        jobs.submit(orphan['requirements'], orphan['user'], orphan['priority'], orphan['job_id'], options)
+
+# Run as a script the app serves from a reloader child; the parent only
+# watches files, and jobs resumed there could never be reached
+if __name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+    resume_orphaned_jobs()
+
+def get_requirements(data):
+    """Pull the list of requirements out of a request body, or None if invalid"""
+    if not data or not isinstance(data.get('requirements'), list):
+        return None
+    requirements = [r for r in data['requirements'] if isinstance(r, str) and r.strip()]
+    return requirements or None
+
+def get_priority(data):
+    """Scheduling priority named in a request body, or None if invalid"""
+    name = (data or {}).get('priority', 'interactive')
+    return PRIORITIES.get(name) if isinstance(name, str) else None
+
+def session_user():
+    """Per-browser id that the token budget is shared fairly between"""
+    if 'uid' not in session:
+        session['uid'] = str(uuid.uuid4())
+    return session['uid']
+
+def job_result(job):
+    """Shape a finished job's result like the /process response"""
+    trace = job.trace.to_dict() if job.trace else None
+    if job.status == Job.DONE:
+        sources = job.result['sources']
+        return {
+            'output': job.result['output'],
+            # plain URLs, as clients that predate the structured citations expect
+            'references': [source['url'] for source in sources],
+            'sources': sources,
+            'trace': trace,
+        }
+    if job.status == Job.CANCELLED:
+        output = 'Research was cancelled.'
+    else:
+        output = f"Error processing research: {job.error}"
+    return {'output': output, 'references': [], 'sources': [], 'trace': trace}
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json(silent=True)
+    requirements = get_requirements(data)
+    priority = get_priority(data)
+    if requirements is None or priority is None:
+        return jsonify({'error': 'Invalid request format'}), 400
+
+    # with review_plan the job stops after planning until /jobs/<id>/plan approves it
+    review = data.get('review_plan') is True
+    job = jobs.submit(requirements, session_user(), priority, options={'review_plan': review})
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job.finished:
+        return jsonify(job.to_dict()), 202
+    return jsonify(job_result(job))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """Server-Sent Events: stage changes, evidence and report tokens as they happen"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    # EventSource sends the last id it saw when it reconnects
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        start = 0
+
+    def generate():
+        for item in job.iter_events(start):
+            if item is None:
+                yield ": keep-alive\n\n"
+                continue
+            index, event, data = item
+            if event == "done":
+                data = dict(job_result(job), status=job.status)
+            yield f"id: {index}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    outcome = jobs.cancel(job_id)
+    if outcome == Job.CANCELLED:
+        # a job cancelled while queued or parked is not running, so record it here
+        release_cancelled(job)
+    # 'detached' means the job keeps running for other submitters
+    return jsonify({'success': outcome is not None, 'outcome': outcome})
+
+# Searches started for approved plan points while the rest is under review
+speculative_research = {}
+
+async def speculate(bullets):
+    """Search approved points ahead of time; results wait in the search cache"""
+    # timed as its own stage, so the research histogram only covers jobs
+    with metrics.span('speculative'):
+        await researcher.aresearch_all.__wrapped__(researcher, bullets)
+
+def review_state(job, checkpoint):
+    """Plan review details for the JSON API"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'outline': checkpoint.outline,
+        'approved': checkpoint.plan_approved,
+        'feedback': checkpoint.feedback_on_report_plan,
+        'rounds_left': MAX_PLAN_FEEDBACK_ROUNDS - len(checkpoint.feedback_on_report_plan),
+    }
+
+@app.route('/jobs/<job_id>/plan', methods=['GET'])
+def get_job_plan(job_id):
+    job = jobs.get(job_id)
+    checkpoint = checkpoints.load(job_id)
+    if job is None or checkpoint is None or checkpoint.plan_approved is None:
+        return jsonify({'error': 'No plan under review'}), 404
+    return jsonify(review_state(job, checkpoint))
+
+@app.route('/jobs/<job_id>/plan', methods=['POST'])
+def review_job_plan(job_id):
+    """Approve, edit or give feedback on a parked job's plan"""
+    job = jobs.get(job_id)
+    checkpoint = checkpoints.load(job_id)
+    if job is None or checkpoint is None or checkpoint.plan_approved is None:
+        return jsonify({'error': 'No plan under review'}), 404
+    if job.status != Job.AWAITING_APPROVAL:
+        return jsonify({'error': 'Job is not waiting for plan approval'}), 409
+
+    data = request.get_json(silent=True) or {}
+    approved_sections = data.get('approved_sections')
+    feedback = data.get('feedback')
+    if isinstance(approved_sections, list) and not researcher.config.MULTI_QUERY:
+        # multi-query searches depend on query writing, so only plain
+        # outline-point searches are worth starting early
+        bullets = [b for b in approved_sections if b in checkpoint.outline]
+        if bullets:
+            speculative_research.setdefault(job_id, []).append(submit_research(speculate(bullets)))
+
+    if data.get('approve') is True:
+        outline = data.get('outline', checkpoint.outline)
+        if not isinstance(outline, list) or not all(isinstance(b, str) for b in outline):
+            return jsonify({'error': 'Invalid outline'}), 400
+        outline = [b.strip() for b in outline if b.strip()]
+        if not outline:
+            return jsonify({'error': 'Invalid outline'}), 400
+        checkpoint.outline = outline
+        checkpoint.plan_approved = True
+    elif isinstance(feedback, str) and feedback.strip():
+        if len(checkpoint.feedback_on_report_plan) >= MAX_PLAN_FEEDBACK_ROUNDS:
+            return jsonify({'error': 'No feedback rounds left; approve or edit the plan'}), 409
+        checkpoint.feedback_on_report_plan.append(feedback.strip())
+    elif isinstance(approved_sections, list):
+        return jsonify(review_state(job, checkpoint)), 202
+    else:
+        return jsonify({'error': 'Invalid request format'}), 400
+
+    if not job.unpark():
+        return jsonify({'error': 'Job is not waiting for plan approval'}), 409
+    checkpoints.save(job_id, checkpoint)
+    if checkpoint.plan_approved:
+        speculative_research.pop(job_id, None)
+    jobs.resume(job)
+    return jsonify(review_state(job, checkpoint)), 202
+
+@app.route('/jobs/<job_id>/retry', methods=['POST'])
+def retry_job(job_id):
+    """Run a failed or cancelled job again from its last checkpointed stage"""
+    job = jobs.get(job_id)
+    if job is not None and not job.finished:
+        return jsonify({'error': 'Job is still running'}), 409
+    saved = checkpoints.get(job_id)
+    if saved is None or saved['status'] not in (CheckpointStore.ERROR, CheckpointStore.CANCELLED):
+        return jsonify({'error': 'No checkpoint to retry from'}), 404
+
+    checkpoints.set_status(job_id, CheckpointStore.QUEUED)
+    options = {'review_plan': checkpoints.load(job_id).plan_approved is not None}
+    job = jobs.submit(saved['requirements'], saved['user'], saved['priority'], job_id, options)
+    if job.id != job_id:
+        # attached to an identical running job instead
+        checkpoints.set_status(job_id, saved['status'])
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
 
 llmLinks = []  # Test links, will be replaced with actual LLM links
 
-def get_saved_pages():
-    """Get list of all saved pages"""
-    pages = []
-    for filename in os.listdir(SAVED_PAGES_DIR):
-        if filename.endswith('.html'):
-            file_path = os.path.join(SAVED_PAGES_DIR, filename)
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Extract title from the file content
-                title_start = content.find('<title>') + 7
-                title_end = content.find('</title>')
-                if title_start > 7 and title_end > title_start:
-                    title = content[title_start:title_end].strip()
-                else:
-                    # Fallback to filename without extension
-                    title = filename[:-5]
-                
-                # Get file creation time
-                created_at = datetime.fromtimestamp(os.path.getctime(file_path))
-                
-                pages.append({
-                    'id': filename[:-5],  # Remove .html extension
-                    'title': title,
-                    'created_at': created_at
-                })
-    
-    # Sort by creation time, newest first
-    return sorted(pages, key=lambda x: x['created_at'], reverse=True)
+_saved_output_template = None
+
+def get_saved_output_template():
+    """Compile saved_output.html once and reuse it for every saved page view"""
+    global _saved_output_template
+    if _saved_output_template is None:
+        _saved_output_template = app.jinja_env.get_template('saved_output.html')
+    return _saved_output_template
+
+def get_saved_pages(page=1):
+    """Get one page of saved pages, newest first"""
+    return saved_index.list(page, SAVED_PAGES_PER_PAGE)
 
 def get_next_sequence_number():
     """Get the next sequence number for saved pages"""
-    pages = get_saved_pages()
-    if not pages:
-        return 1
-    
-    # Extract numbers from titles like "Research #1", "Research #2", etc.
-    numbers = []
-    for page in pages:
-        title = page['title']
-        if title.startswith("Research #"):
-            try:
-                num = int(title.split("#")[1])
-                numbers.append(num)
-            except (ValueError, IndexError):
-                pass
-    
-    return max(numbers) + 1 if numbers else 1
+    return saved_index.next_sequence_number()
 
 @app.route('/', methods=['GET'])
 def index():
-    saved_pages = get_saved_pages()
+    page = max(request.args.get('page', 1, type=int), 1)
+    total_pages = max(1, -(-saved_index.count() // SAVED_PAGES_PER_PAGE))
+    saved_pages = get_saved_pages(page)
     return render_template(
         "index.html",
         title="Project 7 - Research Helper",
-        saved_outputs=saved_pages
+        saved_outputs=saved_pages,
+        page=page,
+        total_pages=total_pages
     )
 
 @app.route('/process', methods=['POST'])
 def process():
+    """Submit a job and wait for it; kept for clients that predate /jobs"""
     try:
         data = request.get_json()
-        query = data.get('requirements', [])
-        print("Received data:", data)  # Debug print
-        
-        if not data or 'requirements' not in data:
+        requirements = get_requirements(data)
+        if requirements is None:
             return jsonify({
                 'output': 'Error: Invalid request format',
-                'references': []
+                'references': [],
+                'sources': []
             }), 400
 
-        requirements = data.get('requirements', [])
-        print("Requirements:", requirements)  # Debug print
-        
-        # Store inputs for LLM processing
-        research_question = requirements
-        
-        # Process the research question using the research pipeline
-        try:
-            # Join the requirements into a single query string
-            query = " ".join(requirements)
-            
-            # Reset progress before starting
-            reset_progress()
-            
-            # Create a thread for the research process
-            def research_thread():
-                try:
-                    # Stage 1/7: Initializing (0-14%)
-                    update_progress(14, "Initializing research process...")
-                    
-                    # Stage 2/7: Planning research outline (14-28%)
-                    update_progress(28, "Planning research outline...")
-                    outline = researcher.plan(query)
-                    
-                    # Stage 3/7: Starting evidence gathering (28-42%)
-                    update_progress(42, "Starting evidence gathering...")
-                    evidence = {}
-                    
-                    # Stage 4/7: Gathering evidence for each point (42-70%)
-                    for i, bullet in enumerate(outline):
-                        progress = 42 + (i / len(outline) * 28)  # 42% to 70%
-                        update_progress(int(progress), f"Researching point {i+1}/{len(outline)}...")
-                        evidence[bullet] = researcher.research(bullet)
-                    
-                    # Stage 5/7: Starting final report (70-84%)
-                    update_progress(84, "Writing final report...")
-                    
-                    # Stage 6/7: Writing report (84-98%)
-                    result = researcher.write(query, outline, evidence)
-                    update_progress(98, "Finalizing report...")
-                    
-                    # Stage 7/7: Extracting sources and completing (98-100%)
-                    sources = []
-                    if "<sources>" in result and "</sources>" in result:
-                        sources_text = result.split("<sources>")[1].split("</sources>")[0]
-                        sources = [s.strip() for s in sources_text.split("\n") if s.strip()]
-                    
-                    update_progress(100, "Research complete!")
-                    
-                    # Store results in the global variable
-                    with progress_lock:
-                        research_results["output"] = result
-                        research_results["sources"] = sources
-                    
-                except Exception as e:
-                    print(f"Error in research thread: {str(e)}")
-                    update_progress(0, f"Error: {str(e)}")
-                    with progress_lock:
-                        research_results["output"] = f"Error processing research: {str(e)}"
-                        research_results["sources"] = []
-            
-            # Start the research thread
-            thread = threading.Thread(target=research_thread)
-            thread.start()
-            
-            # Wait for the thread to complete
-            thread.join()
-            
-            # Get the results from the global variable
-            with progress_lock:
-                output = research_results["output"]
-                references = research_results["sources"]
-            
-        except Exception as e:
-            print(f"Error in research pipeline: {str(e)}")
-            output = f"Error processing research: {str(e)}"
-            references = []
-        
-        response = {
-            'output': output,
-            'references': references
-        }
-        print("Sending response:", response)  # Debug print
-        
-        return jsonify(response)
+        job = jobs.submit(requirements, session_user())
+        job.wait()
+        return jsonify(job_result(job))
     except Exception as e:
         print("Error:", str(e))  # Debug print
         return jsonify({
             'output': f'Error processing request: {str(e)}',
-            'references': []
+            'references': [],
+            'sources': []
         }), 500
 
 @app.route('/save_output', methods=['POST'])
@@ -232,25 +527,18 @@ def save_output():
         
         # Use the title from the modal
         title = data.get('title', 'Untitled Research')
+        created_at = datetime.now()
         
-        # Create the HTML content
-        html_content = render_template(
-            'saved_output.html',
-            output={
-                'id': page_id,
-                'title': title,
-                'requirements': data['requirements'],
-                'content': data['content'],
-                'references': data['references'],
-                'created_at': datetime.now()
-            },
-            saved_outputs=get_saved_pages()
-        )
-        
-        # Save the HTML file
-        file_path = os.path.join(SAVED_PAGES_DIR, f"{page_id}.html")
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        # Store the report itself; it is rendered when viewed
+        size = write_record(SAVED_PAGES_DIR, {
+            'id': page_id,
+            'title': title,
+            'requirements': data['requirements'],
+            'content': data['content'],
+            'references': data['references'],
+            'created_at': created_at.timestamp()
+        })
+        saved_index.add(page_id, title, created_at, size)
         
         return jsonify({'success': True, 'id': page_id})
     except Exception as e:
@@ -259,21 +547,49 @@ def save_output():
 
 @app.route('/view_saved/<id>', methods=['GET'])
 def view_saved(id):
-    file_path = os.path.join(SAVED_PAGES_DIR, f"{id}.html")
-    
-    if not os.path.exists(file_path):
-        return "Output not found", 404
-    
-    # Read the HTML file
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
+    record_file = record_path(SAVED_PAGES_DIR, id)
+    if not os.path.exists(record_file):
+        # Pages saved before records were introduced are static HTML
+        file_path = os.path.join(SAVED_PAGES_DIR, f"{id}.html")
+        if not os.path.exists(file_path):
+            return "Output not found", 404
+        return send_file(file_path, mimetype='text/html', conditional=True, etag=True)
+
+    # The page embeds the sidebar, so it changes with the record or the index
+    modified = max(os.path.getmtime(record_file), saved_index.updated_at())
+    last_modified = datetime.fromtimestamp(int(modified), tz=timezone.utc)
+    etag = hashlib.sha1(f"{id}:{modified}".encode()).hexdigest()
+
+    # Answer conditional GETs without loading or rendering anything
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(request.if_modified_since and request.if_modified_since >= last_modified)
+    if not_modified:
+        response = make_response('', 304)
+    else:
+        record = read_record(SAVED_PAGES_DIR, id)
+        if record is None:
+            return "Output not found", 404
+        record['created_at'] = datetime.fromtimestamp(record['created_at'])
+        response = make_response(render_template(
+            get_saved_output_template(),
+            output=record,
+            saved_outputs=get_saved_pages()
+        ))
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True  # always revalidate with the validators
+    return response
 
 @app.route('/delete_output/<id>', methods=['DELETE'])
 def delete_output(id):
     try:
-        file_path = os.path.join(SAVED_PAGES_DIR, f"{id}.html")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        for file_path in (os.path.join(SAVED_PAGES_DIR, f"{id}.html"), record_path(SAVED_PAGES_DIR, id)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        saved_index.remove(id)
         return jsonify({'success': True})
     except Exception as e:
         print("Error deleting output:", str(e))
@@ -284,9 +600,10 @@ def clear_saved():
     try:
         # Get all files in the saved_pages directory
         for filename in os.listdir(SAVED_PAGES_DIR):
-            if filename.endswith('.html'):
+            if filename.endswith(('.html', RECORD_SUFFIX)):
                 file_path = os.path.join(SAVED_PAGES_DIR, filename)
                 os.remove(file_path)
+        saved_index.clear()
         return jsonify({'success': True})
     except Exception as e:
         print("Error clearing saved pages:", str(e))
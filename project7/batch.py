@@ -0,0 +1,224 @@
+"""
+Batch research: run many queries through one pipeline and write JSONL.
+
+Input is JSONL, one query per line, either a JSON string or an object with
+``query`` and an optional ``id``. Without an id the query is identified by a
+hash of its normalized text, so the same topic keeps its id from night to
+night. Queries run concurrently on one ``ResearchPipeline``, so their LLM
+calls share the token budget and fill the window together; they are
+scheduled as batch work, behind any interactive jobs in the same process.
+
+Each result is appended to the output file and flushed as soon as its query
+finishes, so the output doubles as the checkpoint. Rerunning with the same
+output file skips ids that already have a ``done`` record and retries the
+ones that failed or never finished.
+
+Usage:
+    python research.py --batch topics.jsonl --output reports.jsonl
+    cat topics.jsonl | python research.py --batch - --output reports.jsonl
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import IO
+
+from cache import normalize_query
+from scheduler import BATCH, JobTicket, job_context
+
+
+def query_id(query: str) -> str:
+    """
+    Stable id for a query that came without one.
+
+    Args:
+        query: Research question
+
+    Returns:
+        Short hash of the normalized question
+    """
+    return hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()[:16]
+
+
+def read_queries(stream: IO[str]) -> list[dict]:
+    """
+    Parse queries from JSONL.
+
+    Blank lines are skipped, and so are later lines repeating an id.
+
+    Args:
+        stream: Open text stream of JSONL
+
+    Returns:
+        Dictionaries with id and query, in input order
+    """
+    queries = []
+    seen = set()
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            print(f"Skipping line {number}: {e}", file=sys.stderr)
+            continue
+        if isinstance(item, str):
+            item = {"query": item}
+        query = item.get("query") if isinstance(item, dict) else None
+        if not isinstance(query, str) or not query.strip():
+            print(f"Skipping line {number}: no query", file=sys.stderr)
+            continue
+        item_id = item.get("id")
+        item_id = query_id(query) if item_id is None else str(item_id)
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        queries.append({"id": item_id, "query": query})
+    return queries
+
+
+def finished_ids(path: str) -> set[str]:
+    """
+    Ids that already have a successful result in an output file.
+
+    Args:
+        path: Output JSONL from an earlier run
+
+    Returns:
+        Ids whose latest record is ``done``
+    """
+    status = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # a line cut short when the last run was killed
+                continue
+            if not isinstance(record, dict):
+                continue
+            status[record.get("id")] = record.get("status")
+    return {item_id for item_id, state in status.items() if state == "done"}
+
+
+class ResultWriter:
+    """
+    Appends result records to JSONL, one durable line per finished query.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the output for appending.
+
+        Args:
+            path: Output JSONL file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() > 0:
+            # finish a line cut short by an interrupted run
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def write(self, record: dict):
+        """
+        Append a record and flush it to disk.
+
+        Args:
+            record: Result record
+        """
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        Close the output file.
+        """
+        self._file.close()
+
+
+async def run_batch(
+    pipeline, queries: list[dict], writer: ResultWriter, concurrency: int
+) -> dict:
+    """
+    Research every query, at most ``concurrency`` at a time.
+
+    Args:
+        pipeline: Shared ``ResearchPipeline``
+        queries: Dictionaries with id and query
+        writer: Where finished results go
+        concurrency: Queries in flight at once
+
+    Returns:
+        Counts of done and failed queries
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    counts = {"done": 0, "error": 0}
+    total = len(queries)
+
+    async def run_one(item: dict):
+        async with semaphore:
+            started = time.perf_counter()
+            record = {"id": item["id"], "query": item["query"]}
+            try:
+                with job_context(JobTicket("batch", BATCH)):
+                    output = await pipeline.adeep_research(item["query"])
+                record.update(status="done", output=output)
+            except Exception as e:
+                record.update(status="error", error=str(e))
+            record["seconds"] = round(time.perf_counter() - started, 3)
+            writer.write(record)
+            counts[record["status"]] += 1
+            print(
+                f"[{counts['done'] + counts['error']}/{total}] {record['status']} "
+                f"{item['id']} ({record['seconds']:.1f}s)",
+                file=sys.stderr,
+            )
+
+    await asyncio.gather(*(run_one(item) for item in queries))
+    return counts
+
+
+def main(pipeline, source: str, output: str, concurrency: int):
+    """
+    Run a batch from the command line.
+
+    Args:
+        pipeline: Shared ``ResearchPipeline``
+        source: Input JSONL path, or ``-`` for stdin
+        output: Output JSONL path, appended to and used to resume
+        concurrency: Queries in flight at once
+    """
+    if source == "-":
+        queries = read_queries(sys.stdin)
+    else:
+        with open(source, encoding="utf-8") as f:
+            queries = read_queries(f)
+
+    done = finished_ids(output)
+    pending = [item for item in queries if item["id"] not in done]
+    print(
+        f"{len(queries)} queries, {len(queries) - len(pending)} already done, "
+        f"{len(pending)} to run",
+        file=sys.stderr,
+    )
+    if not pending:
+        return
+
+    writer = ResultWriter(output)
+    try:
+        counts = asyncio.run(run_batch(pipeline, pending, writer, concurrency))
+    finally:
+        writer.close()
+    print(f"Finished: {counts['done']} done, {counts['error']} failed", file=sys.stderr)
@@ -0,0 +1,639 @@
+"""
+Offline benchmark for the research pipeline.
+
+Runs ``ResearchPipeline`` against deterministic local stand-ins for ChatGroq,
+Tavily and the tiktoken encoding, so performance can be measured offline
+without spending API quota. The
+stand-ins have configurable latency, output size and failure rate. Each run
+reports end-to-end latency, time per stage, throughput at several job
+concurrency levels and time spent throttled in ``Budget``, written as JSON
+so runs can be compared.
+
+The ``load`` command drives a running web app's ``/process`` endpoint
+instead.
+
+Usage:
+    python bench.py --output run.json pipeline --concurrency 1 4 16 --jobs 16
+    python bench.py load --url http://127.0.0.1:5000 --jobs 20 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import copy
+import hashlib
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+from research import Config, ResearchPipeline, TokenCounter
+from state import Feedback, OutlineQueries, SearchQuery, SectionQueries
+
+
+# ---------- Stand-ins ----------
+class WordEncoding:
+    """
+    Offline stand-in for a tiktoken encoding: one token per word.
+
+    Each token keeps its trailing whitespace, so decoding a prefix gives back
+    the start of the text unchanged.
+    """
+
+    def encode_ordinary(self, text: str) -> list[str]:
+        return re.findall(r"\s*\S+\s*|\s+", text)
+
+    def encode_ordinary_batch(self, texts: list[str], num_threads: int = 8):
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+class FakeStats:
+    """
+    Call counters shared by a stand-in and its bound copies.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, failed: bool = False, input_tokens: int = 0, output_tokens: int = 0):
+        """
+        Record one call.
+
+        Args:
+            failed: Whether the call raised
+            input_tokens: Prompt tokens of the call
+            output_tokens: Completion tokens of the call
+        """
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def to_dict(self) -> dict:
+        """
+        Counters as a JSON-serializable dictionary.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "failures": self.failures,
+                "input_tokens": self.input_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+
+class FakeChatModel:
+    """
+    Deterministic stand-in for ChatGroq.
+
+    Planner prompts get an outline of ``outline_size`` bullets, structured
+    calls get a passing grade or generated queries, and everything else gets
+    ``output_tokens`` words of filler. Latency is a fixed delay plus the time
+    to generate the output at ``tokens_per_second``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        tokens_per_second: float = 500.0,
+        output_tokens: int = 200,
+        outline_size: int = 5,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        max_tokens: int = Config.WRITER_TOK,
+    ):
+        """
+        Configure the stand-in.
+
+        Args:
+            latency: Seconds before the first token
+            tokens_per_second: Generation speed after the first token
+            output_tokens: Words in a free-text answer, before ``max_tokens``
+            outline_size: Bullets in a planner answer
+            failure_rate: Probability that a call raises
+            seed: Seed for the failure draws
+            max_tokens: Completion cap, as on ChatGroq
+        """
+        self.model_name = "fake-llm"
+        self.temperature = 0.2
+        self.max_tokens = max_tokens
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.outline_size = outline_size
+        self.failure_rate = failure_rate
+        self.stats = FakeStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def bind(self, max_tokens: int | None = None, **kwargs) -> "FakeChatModel":
+        """
+        Copy of the model with a different completion cap, sharing its stats.
+        """
+        bound = copy.copy(self)
+        if max_tokens is not None:
+            bound.max_tokens = max_tokens
+        return bound
+
+    def with_structured_output(
+        self, schema, include_raw: bool = False
+    ) -> "FakeStructuredModel":
+        """
+        Runnable that answers with an instance of ``schema``.
+        """
+        return FakeStructuredModel(self, schema, include_raw)
+
+    def _prompt(self, messages: list) -> str:
+        return "\n".join(str(m.content) for m in messages)
+
+    def _fail(self) -> bool:
+        with self._rng_lock:
+            return self._rng.random() < self.failure_rate
+
+    def _reply(self, messages: list) -> tuple[str, dict, float]:
+        """
+        Produce the answer for a call and how long it should take.
+
+        Args:
+            messages: Chat messages of the call
+
+        Returns:
+            Tuple of (text, usage metadata, seconds)
+        """
+        prompt = self._prompt(messages)
+        input_tokens = TokenCounter.estimate(prompt)
+        if self._fail():
+            self.stats.add(failed=True, input_tokens=input_tokens)
+            raise RuntimeError("fake LLM failure")
+
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        if "bullet-point outline" in prompt:
+            text = "\n".join(
+                f"- Aspect {n} of topic {digest}"
+                for n in range(1, self.outline_size + 1)
+            )
+        else:
+            words = min(self.output_tokens, self.max_tokens)
+            text = " ".join(f"w{digest}{n}" for n in range(words))
+        output_tokens = len(text.split())
+        self.stats.add(input_tokens=input_tokens, output_tokens=output_tokens)
+        usage = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return text, usage, self.latency + output_tokens / self.tokens_per_second
+
+    def invoke(self, messages: list, **kwargs) -> AIMessage:
+        """
+        Answer a call, sleeping for its simulated latency.
+        """
+        text, usage, seconds = self._reply(messages)
+        time.sleep(seconds)
+        return AIMessage(content=text, usage_metadata=usage)
+
+    async def ainvoke(self, messages: list, **kwargs) -> AIMessage:
+        """
+        Async version of ``invoke``.
+        """
+        text, usage, seconds = self._reply(messages)
+        await asyncio.sleep(seconds)
+        return AIMessage(content=text, usage_metadata=usage)
+
+    def _chunks(self, text: str, usage: dict) -> list[AIMessageChunk]:
+        words = text.split(" ")
+        chunks = [
+            AIMessageChunk(content=w if n == 0 else " " + w)
+            for n, w in enumerate(words)
+        ]
+        return chunks + [AIMessageChunk(content="", usage_metadata=usage)]
+
+    def stream(self, messages: list, **kwargs):
+        """
+        Yield the answer word by word at the simulated speed.
+        """
+        text, usage, _ = self._reply(messages)
+        time.sleep(self.latency)
+        for chunk in self._chunks(text, usage):
+            time.sleep(1 / self.tokens_per_second)
+            yield chunk
+
+    async def astream(self, messages: list, **kwargs):
+        """
+        Async version of ``stream``.
+        """
+        text, usage, _ = self._reply(messages)
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks(text, usage):
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield chunk
+
+
+class FakeStructuredModel:
+    """
+    Structured-output runnable returned by ``FakeChatModel.with_structured_output``.
+    """
+
+    def __init__(self, llm: FakeChatModel, schema, include_raw: bool):
+        self.llm = llm
+        self.schema = schema
+        self.include_raw = include_raw
+
+    def _parse(self, messages: list):
+        if self.schema is Feedback:
+            return Feedback(grade="pass", follow_up_queries=[])
+        if self.schema is OutlineQueries:
+            prompt = self.llm._prompt(messages)
+            block = re.search(r"<Report outline>(.*?)</Report outline>", prompt, re.S)
+            bullets = re.findall(r"^- (.+)$", block.group(1) if block else "", re.M)
+            return OutlineQueries(
+                sections=[
+                    SectionQueries(
+                        section=b,
+                        queries=[
+                            SearchQuery(search_query=f"{b} ({n})") for n in range(1, 4)
+                        ],
+                    )
+                    for b in bullets
+                ]
+            )
+        raise TypeError(
+            f"FakeStructuredModel has no answer for schema {self.schema.__name__}"
+        )
+
+    def _wrap(self, raw: AIMessage, messages: list):
+        parsed = self._parse(messages)
+        if self.include_raw:
+            return {"raw": raw, "parsed": parsed, "parsing_error": None}
+        return parsed
+
+    def invoke(self, messages: list, **kwargs):
+        return self._wrap(self.llm.invoke(messages), messages)
+
+    async def ainvoke(self, messages: list, **kwargs):
+        return self._wrap(await self.llm.ainvoke(messages), messages)
+
+
+class FakeRetriever:
+    """
+    Deterministic stand-in for TavilySearchAPIRetriever.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        k: int = 3,
+        content_tokens: int = 150,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        Configure the stand-in.
+
+        Args:
+            latency: Seconds per search
+            k: Results per search
+            content_tokens: Words of content per result
+            failure_rate: Probability that a search raises
+            seed: Seed for the failure draws
+        """
+        self.latency = latency
+        self.k = k
+        self.content_tokens = content_tokens
+        self.failure_rate = failure_rate
+        self.stats = FakeStats()
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _results(self, query: str) -> list[Document]:
+        with self._rng_lock:
+            failed = self._rng.random() < self.failure_rate
+        self.stats.add(failed=failed)
+        if failed:
+            raise RuntimeError("fake search failure")
+        digest = hashlib.sha1(query.encode("utf-8")).hexdigest()[:12]
+        return [
+            Document(
+                page_content=" ".join(
+                    f"{digest[:4]}{n}{i}" for i in range(self.content_tokens)
+                ),
+                metadata={
+                    "source": f"https://example.com/{digest}/{n}",
+                    "title": f"Result {n} for {query}",
+                    "score": round(1 - n / 10, 2),
+                },
+            )
+            for n in range(self.k)
+        ]
+
+    def invoke(self, query: str, **kwargs) -> list[Document]:
+        results = self._results(query)
+        time.sleep(self.latency)
+        return results
+
+    async def ainvoke(self, query: str, **kwargs) -> list[Document]:
+        results = self._results(query)
+        await asyncio.sleep(self.latency)
+        return results
+
+
+# ---------- Measurements ----------
+def summarize(values: list[float]) -> dict:
+    """
+    Summary statistics for a list of timings.
+
+    Args:
+        values: Measured seconds
+
+    Returns:
+        Count, mean, p50, p95 and max, rounded to milliseconds
+    """
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(percentile(0.5), 3),
+        "p95": round(percentile(0.95), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+async def run_job(pipeline: ResearchPipeline, query: str) -> dict[str, float]:
+    """
+    Run one research job stage by stage, the way ``adeep_research`` does.
+
+    Args:
+        pipeline: Pipeline under test
+        query: Research question
+
+    Returns:
+        Seconds spent in each stage, plus ``total``
+    """
+    timings = {}
+    started = mark = time.perf_counter()
+
+    def lap(stage: str):
+        nonlocal mark
+        now = time.perf_counter()
+        timings[stage] = now - mark
+        mark = now
+
+    outline = await pipeline.aplan(query, use_cache=False)
+    lap("plan")
+    queries = None
+    if pipeline.config.MULTI_QUERY:
+        queries = await pipeline.aplan_queries(query, outline, use_cache=False)
+        lap("queries")
+    evidence = await pipeline.aresearch_all(outline, queries=queries)
+    lap("research")
+    evidence = pipeline.compact(outline, evidence)
+    lap("compact")
+    if pipeline.config.WRITE_MODE == "sections":
+        await pipeline.awrite_sections(query, outline, evidence, use_cache=False)
+    else:
+        await pipeline.awrite(query, outline, evidence, use_cache=False)
+    lap("write")
+    timings["total"] = time.perf_counter() - started
+    return timings
+
+
+async def run_level(args: argparse.Namespace, concurrency: int) -> dict:
+    """
+    Run ``args.jobs`` jobs with at most ``concurrency`` in flight.
+
+    Each level gets a fresh pipeline, cache and budget so levels do not
+    warm each other up.
+
+    Args:
+        args: Parsed command-line arguments
+        concurrency: Jobs allowed to run at once
+
+    Returns:
+        Latency, stage, throughput, throttling and failure figures
+    """
+    with tempfile.TemporaryDirectory() as workdir:
+        config = Config()
+        config.CACHE_PATH = f"{workdir}/cache.db"
+        config.BUDGET_PATH = f"{workdir}/budget.db"
+        config.TOKEN_BUDGET = args.tpm
+        config.WRITE_MODE = args.write_mode
+        config.MULTI_QUERY = args.multi_query
+        config.RESEARCH_CONCURRENCY = args.research_concurrency
+        llm = FakeChatModel(
+            latency=args.llm_latency,
+            tokens_per_second=args.llm_tokens_per_second,
+            output_tokens=args.llm_output_tokens,
+            outline_size=args.outline_size,
+            failure_rate=args.llm_failure_rate,
+            seed=args.seed,
+            max_tokens=config.WRITER_TOK,
+        )
+        retriever = FakeRetriever(
+            latency=args.search_latency,
+            content_tokens=args.search_content_tokens,
+            failure_rate=args.search_failure_rate,
+            seed=args.seed,
+        )
+        counter = TokenCounter(encoding=WordEncoding())
+        pipeline = ResearchPipeline(
+            config, llm=llm, retriever=retriever, counter=counter
+        )
+
+        semaphore = asyncio.Semaphore(concurrency)
+        timings: list[dict[str, float]] = []
+        errors: list[str] = []
+
+        async def one(n: int):
+            async with semaphore:
+                try:
+                    timings.append(await run_job(pipeline, f"Benchmark topic {n}"))
+                except Exception as e:
+                    errors.append(str(e))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(n) for n in range(args.jobs)))
+        wall = time.perf_counter() - started
+
+        stages = sorted({stage for t in timings for stage in t} - {"total"})
+        return {
+            "concurrency": concurrency,
+            "jobs": args.jobs,
+            "completed": len(timings),
+            "failed": len(errors),
+            "errors": sorted(set(errors)),
+            "wall_seconds": round(wall, 3),
+            "throughput_jobs_per_minute": round(len(timings) / wall * 60, 2),
+            "latency": summarize([t["total"] for t in timings]),
+            "stages": {s: summarize([t[s] for t in timings if s in t]) for s in stages},
+            "throttled_seconds": round(pipeline.limiter.throttled_seconds, 3),
+            "llm": llm.stats.to_dict(),
+            "search": retriever.stats.to_dict(),
+        }
+
+
+def bench_pipeline(args: argparse.Namespace) -> dict:
+    """
+    Benchmark the pipeline in-process at each requested concurrency level.
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        Benchmark results
+    """
+    levels = []
+    for concurrency in args.concurrency:
+        print(f"Running {args.jobs} jobs at concurrency {concurrency}...")
+        levels.append(asyncio.run(run_level(args, concurrency)))
+    return {"levels": levels}
+
+
+def bench_load(args: argparse.Namespace) -> dict:
+    """
+    Send research requests to a running web app's ``/process`` endpoint.
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        Latency, throughput and status code figures
+    """
+    url = args.url.rstrip("/") + "/process"
+
+    def request(n: int) -> tuple[float, str]:
+        body = json.dumps({"requirements": [f"Load test topic {n}"]}).encode("utf-8")
+        req = urllib.request.Request(
+            url, data=body, headers={"Content-Type": "application/json"}
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=args.timeout) as response:
+                response.read()
+                status = str(response.status)
+        except urllib.error.HTTPError as e:
+            status = str(e.code)
+        except Exception as e:
+            status = type(e).__name__
+        return time.perf_counter() - started, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(request, range(args.jobs)))
+    wall = time.perf_counter() - started
+
+    statuses: dict[str, int] = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [seconds for seconds, status in results if status == "200"]
+    return {
+        "url": url,
+        "jobs": args.jobs,
+        "concurrency": args.concurrency,
+        "statuses": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_jobs_per_minute": round(len(ok) / wall * 60, 2),
+        "latency": summarize(ok),
+    }
+
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Parse the benchmark's command line.
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Offline research pipeline benchmark")
+    parser.add_argument(
+        "--output", help="Write results to this JSON file as well as stdout"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    pipeline = commands.add_parser(
+        "pipeline", help="Benchmark the pipeline with local stand-ins"
+    )
+    pipeline.add_argument(
+        "--jobs", type=int, default=8, help="Jobs per concurrency level"
+    )
+    pipeline.add_argument(
+        "--concurrency",
+        type=int,
+        nargs="+",
+        default=[1, 4],
+        help="Concurrency levels to run",
+    )
+    pipeline.add_argument("--outline-size", type=int, default=5)
+    pipeline.add_argument(
+        "--write-mode", choices=["sections", "single"], default=Config.WRITE_MODE
+    )
+    pipeline.add_argument("--multi-query", action="store_true")
+    pipeline.add_argument(
+        "--research-concurrency", type=int, default=Config.RESEARCH_CONCURRENCY
+    )
+    pipeline.add_argument(
+        "--tpm", type=int, default=Config.TOKEN_BUDGET, help="Budget tokens per minute"
+    )
+    pipeline.add_argument("--llm-latency", type=float, default=0.3)
+    pipeline.add_argument("--llm-tokens-per-second", type=float, default=500.0)
+    pipeline.add_argument("--llm-output-tokens", type=int, default=200)
+    pipeline.add_argument("--llm-failure-rate", type=float, default=0.0)
+    pipeline.add_argument("--search-latency", type=float, default=0.5)
+    pipeline.add_argument("--search-content-tokens", type=int, default=150)
+    pipeline.add_argument("--search-failure-rate", type=float, default=0.0)
+    pipeline.add_argument("--seed", type=int, default=0)
+
+    load = commands.add_parser(
+        "load", help="Drive a running web app's /process endpoint"
+    )
+    load.add_argument("--url", default="http://127.0.0.1:5000")
+    load.add_argument("--jobs", type=int, default=10)
+    load.add_argument("--concurrency", type=int, default=4)
+    load.add_argument("--timeout", type=float, default=600)
+    return parser.parse_args()
+
+
+def main():
+    """
+    Run the benchmark and print its results as JSON.
+    """
+    args = _parse_args()
+    started_at = datetime.now(UTC).isoformat()
+    results = bench_pipeline(args) if args.command == "pipeline" else bench_load(args)
+    results = {
+        "command": args.command,
+        "started_at": started_at,
+        "arguments": {
+            k: v for k, v in vars(args).items() if k not in ("command", "output")
+        },
+        **results,
+    }
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
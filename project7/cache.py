@@ -0,0 +1,376 @@
+"""
+Persistent caches for the research pipeline.
+
+Search results and LLM responses are stored in SQLite so they survive
+process restarts and can be shared by every worker on the host.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import metrics
+from coalesce import AsyncSingleFlight, SingleFlight
+from langchain_core.documents import Document
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so near-identical bullets share a cache entry.
+
+    Args:
+        query: Raw query or outline point
+
+    Returns:
+        Lower-cased query without list markers, extra whitespace or
+        trailing punctuation
+    """
+    query = re.sub(r"^\s*(?:[-•*]|\d+[.)])\s*", "", query)
+    query = re.sub(r"\s+", " ", query.casefold())
+    return query.strip(" .,:;!?")
+
+
+class SQLiteCache:
+    """
+    Disk-backed key/value cache with TTL expiry and LRU eviction.
+    """
+
+    def __init__(self, path: str, table: str, ttl: float, max_entries: int):
+        """
+        Open (or create) the cache table.
+
+        Args:
+            path: SQLite database file
+            table: Table name, so several caches can share one file
+            ttl: Seconds an entry stays valid
+            max_entries: Entries kept before the least recently used are evicted
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)"
+            )
+
+    def get(self, key: str) -> Any | None:
+        """
+        Look up a value, refreshing its LRU position on a hit.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        found = self.lookup(key)
+        return None if found is None else found[0]
+
+    def lookup(self, key: str) -> tuple[Any, float] | None:
+        """
+        Like ``get``, but also report when the entry expires.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Tuple of (value, expiry as a ``time.time()`` timestamp), or None
+            if missing or expired
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute(
+                        f"DELETE FROM {self.table} WHERE key = ?", (key,)
+                    )
+                self.misses += 1
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.hits += 1
+        return json.loads(row[0]), row[1] + self.ttl
+
+    def set(self, key: str, value: Any):
+        """
+        Store a value and evict expired and least recently used entries.
+
+        Args:
+            key: Cache key
+            value: JSON-serializable value
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl,)
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness.
+
+        Returns:
+            Dictionary with hits, misses, hit rate and current entry count
+        """
+        with self._lock:
+            entries = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.table}"
+            ).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+class CachedRetriever:
+    """
+    Drop-in wrapper that puts a SQLiteCache in front of a search retriever.
+
+    Exposes the same ``invoke``/``ainvoke`` calls the pipeline uses, so the
+    CLI and the Flask app both benefit without other changes. Identical
+    searches already in flight are shared instead of sent again.
+    """
+
+    def __init__(self, retriever, cache: SQLiteCache):
+        """
+        Wrap a retriever.
+
+        Args:
+            retriever: Search tool with ``invoke``/``ainvoke`` (e.g. Tavily)
+            cache: Cache that stores the serialized documents
+        """
+        self.retriever = retriever
+        self.cache = cache
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+
+    @property
+    def k(self) -> int | None:
+        """
+        Number of results the wrapped retriever returns.
+        """
+        return getattr(self.retriever, "k", None)
+
+    @property
+    def cacheable(self) -> bool:
+        """
+        Whether results are cached; a local index is searched directly so
+        newly indexed documents show up at once.
+        """
+        return getattr(self.retriever, "cacheable", True)
+
+    def _key(self, query: str) -> str:
+        # backends answer differently, so each keeps its own entries
+        name = getattr(self.retriever, "name", None)
+        if name is None:
+            return json.dumps([normalize_query(query), self.k])
+        return json.dumps([normalize_query(query), self.k, name])
+
+    def _load(self, query: str) -> list[Document] | None:
+        cached = self.cache.get(self._key(query))
+        metrics.record_cache("search", cached is not None)
+        if cached is None:
+            return None
+        return [
+            Document(page_content=d["page_content"], metadata=d["metadata"])
+            for d in cached
+        ]
+
+    def _store(self, query: str, hits: list[Document]):
+        if not hits:
+            # no results is often a transient search failure; ask again next time
+            return
+        self.cache.set(
+            self._key(query),
+            [{"page_content": h.page_content, "metadata": h.metadata} for h in hits],
+        )
+
+    def invoke(self, query: str) -> list[Document]:
+        """
+        Search, serving repeated queries from the cache.
+
+        Args:
+            query: Search query
+
+        Returns:
+            Matching documents
+        """
+        if not self.cacheable:
+            return self.retriever.invoke(query)
+        hits = self._load(query)
+        if hits is None:
+            hits = self._flight.do(self._key(query), lambda: self._search(query))
+        return hits
+
+    def _search(self, query: str) -> list[Document]:
+        hits = self.retriever.invoke(query)
+        self._store(query, hits)
+        return hits
+
+    async def _asearch(self, query: str) -> list[Document]:
+        hits = await self.retriever.ainvoke(query)
+        self._store(query, hits)
+        return hits
+
+    async def ainvoke(self, query: str) -> list[Document]:
+        """
+        Async version of ``invoke``.
+
+        Args:
+            query: Search query
+
+        Returns:
+            Matching documents
+        """
+        if not self.cacheable:
+            return await self.retriever.ainvoke(query)
+        hits = self._load(query)
+        if hits is None:
+            hits = await self._aflight.do(
+                self._key(query), lambda: self._asearch(query)
+            )
+        return hits
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM responses.
+
+    A small in-memory LRU tier sits in front of a SQLiteCache, so hot prompts
+    are served without touching disk and everything else survives restarts.
+    Memory entries expire together with their disk entry.
+    """
+
+    def __init__(self, disk: SQLiteCache, max_memory_entries: int):
+        """
+        Set up both tiers.
+
+        Args:
+            disk: Persistent tier
+            max_memory_entries: Entries kept in memory before LRU eviction
+        """
+        self.disk = disk
+        self.max_memory_entries = max_memory_entries
+        self.memory_hits = 0
+        # key -> (expiry timestamp, response text)
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, temperature: float, max_tokens: int, messages: list) -> str:
+        """
+        Build the cache key for a chat call.
+
+        Args:
+            model: Model name
+            temperature: Sampling temperature
+            max_tokens: Completion token cap
+            messages: Formatted chat messages
+
+        Returns:
+            Hex digest identifying the call
+        """
+        contents = [(m.type, str(m.content)) for m in messages]
+        payload = json.dumps([model, temperature, max_tokens, contents])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        """
+        Look up a response, checking memory before disk.
+
+        Args:
+            key: Key from ``ResponseCache.key``
+
+        Returns:
+            The cached response text, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._memory[key]
+            elif entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                metrics.record_cache("llm", True)
+                return entry[1]
+        found = self.disk.lookup(key)
+        metrics.record_cache("llm", found is not None)
+        if found is None:
+            return None
+        value, expires_at = found
+        self._remember(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: str):
+        """
+        Store a response in both tiers.
+
+        Args:
+            key: Key from ``ResponseCache.key``
+            value: Response text
+        """
+        self._remember(key, value, time.time() + self.disk.ttl)
+        self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness across both tiers.
+
+        Returns:
+            Disk statistics plus memory hits and memory size
+        """
+        stats = self.disk.stats()
+        stats["memory_hits"] = self.memory_hits
+        stats["memory_entries"] = len(self._memory)
+        return stats
@@ -0,0 +1,236 @@
+"""
+Persistent per-job checkpoints of the research pipeline's state.
+
+A job saves a ``JobCheckpoint`` after every stage it completes: the outline,
+the search queries, the compacted evidence and each drafted section. The
+checkpoints live in SQLite next to the caches, so the planning and search
+work a job has already paid for survives a crashed worker. A restarted
+worker resumes the jobs whose owning process has died, and a failed or
+cancelled job can be retried from its last completed stage. A job waiting
+for the user to approve its plan is parked here too, with no worker held.
+
+Rows are removed once their job succeeds. Failed, cancelled and abandoned
+parked jobs keep theirs until ``prune`` drops them after a while.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from state import JobCheckpoint
+
+# Identifies this process in the ``owner`` column. A restarted server often
+# gets its old PID back (PID 1 in a container), so the PID alone cannot tell
+# the new process from the dead one that left the rows behind.
+INSTANCE = f"{os.getpid()}:{uuid.uuid4().hex}"
+
+
+class CheckpointStore:
+    """
+    SQLite store of job checkpoints.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+    AWAITING_APPROVAL = "awaiting_approval"
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open (or create) the store.
+
+        Args:
+            path: SQLite database file; the default keeps checkpoints private
+                to this process
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "job_id TEXT PRIMARY KEY, requirements TEXT NOT NULL, "
+                "user TEXT NOT NULL, priority INTEGER NOT NULL, "
+                "status TEXT NOT NULL, owner TEXT NOT NULL, "
+                "state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def register(self, job, checkpoint: JobCheckpoint | None = None):
+        """
+        Start tracking a job, unless it is tracked already.
+
+        Args:
+            job: The ``jobs.Job``
+            checkpoint: Initial state; by default an empty one for the
+                job's query
+        """
+        state = (checkpoint or JobCheckpoint(query=job.query)).model_dump_json()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, json.dumps(job.requirements), job.user, job.priority,
+                 self.QUEUED, INSTANCE, state, time.time()),
+            )
+
+    def load(self, job_id: str) -> JobCheckpoint | None:
+        """
+        The last saved state of a job.
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            The checkpoint, or None if the job is not tracked
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM checkpoints WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return JobCheckpoint.model_validate_json(row[0]) if row else None
+
+    def save(self, job_id: str, checkpoint: JobCheckpoint):
+        """
+        Store a job's state and mark the job as running in this process.
+
+        Args:
+            job_id: Job id
+            checkpoint: State after the latest completed step
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE checkpoints SET state = ?, status = ?, owner = ?, "
+                "updated_at = ? WHERE job_id = ?",
+                (
+                    checkpoint.model_dump_json(),
+                    self.RUNNING,
+                    INSTANCE,
+                    time.time(),
+                    job_id,
+                ),
+            )
+
+    def set_status(self, job_id: str, status: str):
+        """
+        Record a job's status, e.g. when it fails or is cancelled or retried.
+
+        Args:
+            job_id: Job id
+            status: One of the status constants
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE checkpoints SET status = ?, owner = ?, updated_at = ? "
+                "WHERE job_id = ?",
+                (status, INSTANCE, time.time(), job_id),
+            )
+
+    def remove(self, job_id: str):
+        """
+        Forget a job, once it has finished successfully.
+
+        Args:
+            job_id: Job id
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE job_id = ?", (job_id,))
+
+    def get(self, job_id: str) -> dict | None:
+        """
+        What is needed to resubmit a tracked job.
+
+        Args:
+            job_id: Job id
+
+        Returns:
+            Dictionary with job_id, requirements, user, priority and status,
+            or None if the job is not tracked
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, requirements, user, priority, status FROM checkpoints "
+                "WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "requirements": json.loads(row[1]),
+            "user": row[2],
+            "priority": row[3],
+            "status": row[4],
+        }
+
+    @staticmethod
+    def _alive(owner: str | int) -> bool:
+        owner = str(owner)
+        if owner == INSTANCE:
+            return True
+        # rows written before instance tokens hold a bare PID
+        pid = int(owner.partition(":")[0])
+        if pid == os.getpid():
+            # an earlier process that had our PID
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def claim_orphans(self) -> list[dict]:
+        """
+        Take over queued, running and parked jobs whose worker process has
+        died.
+
+        Each orphan is claimed atomically, so of several workers starting
+        together only one resumes it.
+
+        Returns:
+            Dictionaries like ``get`` returns, for the claimed jobs
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, owner FROM checkpoints WHERE status IN (?, ?, ?)",
+                (self.QUEUED, self.RUNNING, self.AWAITING_APPROVAL),
+            ).fetchall()
+        claimed = []
+        for job_id, owner in rows:
+            if self._alive(owner):
+                continue
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    "UPDATE checkpoints SET owner = ?, status = ?, updated_at = ? "
+                    "WHERE job_id = ? AND owner = ?",
+                    (INSTANCE, self.QUEUED, time.time(), job_id, owner),
+                )
+            if cursor.rowcount:
+                claimed.append(self.get(job_id))
+        return [job for job in claimed if job is not None]
+
+    def prune(self, max_age: float):
+        """
+        Drop checkpoints of failed and cancelled jobs nobody retried, and
+        of parked jobs nobody came back to.
+
+        Args:
+            max_age: Seconds since the last update after which they go
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE status IN (?, ?, ?) AND updated_at < ?",
+                (
+                    self.ERROR,
+                    self.CANCELLED,
+                    self.AWAITING_APPROVAL,
+                    time.time() - max_age,
+                ),
+            )
@@ -0,0 +1,121 @@
+"""
+Single-flight deduplication of identical in-flight work.
+
+When several callers ask for the same thing at the same time (the same
+search, the same LLM prompt), only the first one does the work; the others
+wait for it and share its result or its exception. Unlike the caches this
+covers the window before a result exists, so a burst of identical requests
+costs one search or one LLM call instead of one per caller.
+"""
+
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class _Call:
+    """
+    One in-flight piece of work and its outcome.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """
+    Thread-based single flight for synchronous callers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run ``fn`` unless an identical call is already running, then share
+        that call's outcome.
+
+        Args:
+            key: Identifies identical work
+            fn: Does the work
+
+        Returns:
+            Result of the leading call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """
+    Single flight for coroutines.
+
+    The work runs in its own task, so cancelling one caller does not cancel
+    it for the others; it is cancelled only once every caller has gone.
+    """
+
+    def __init__(self):
+        # keyed by event loop as well, since sync entry points each run
+        # their own loop
+        self._calls: dict[tuple[int, Hashable], list] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await ``factory()`` unless an identical call is already running,
+        then share that call's outcome.
+
+        Args:
+            key: Identifies identical work
+            factory: Returns the awaitable that does the work
+
+        Returns:
+            Result of the shared call
+        """
+        full_key = (id(asyncio.get_running_loop()), key)
+        entry = self._calls.get(full_key)
+        if entry is None:
+            # [task, number of callers waiting on it]
+            entry = [asyncio.ensure_future(factory()), 0]
+            self._calls[full_key] = entry
+
+            def forget(_):
+                # a later call may already have replaced this entry
+                if self._calls.get(full_key) is entry:
+                    del self._calls[full_key]
+
+            entry[0].add_done_callback(forget)
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
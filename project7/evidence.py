@@ -0,0 +1,162 @@
+"""
+Evidence compaction between the research and write stages.
+
+Search results for neighbouring outline points often repeat the same
+passages, and a single long page can take up most of the writer's context.
+Compaction drops near-duplicate search results across sections and trims
+each section to a token allotment so the write prompt has a predictable size.
+"""
+
+import re
+from collections import Counter
+
+from state import Source
+
+
+class EvidenceCompactor:
+    """
+    Deduplicates and trims per-section evidence.
+    """
+
+    def __init__(self, counter, shingle_size: int = 5, threshold: float = 0.8):
+        """
+        Configure the compactor.
+
+        Args:
+            counter: TokenCounter used to measure and trim evidence
+            shingle_size: Words per shingle when comparing passages
+            threshold: Jaccard similarity at which a passage counts as a duplicate
+        """
+        self.counter = counter
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+    def _shingles(self, passage: str) -> set[int]:
+        """
+        Hash the overlapping word n-grams of a passage.
+
+        Args:
+            passage: Text to shingle
+
+        Returns:
+            Set of shingle hashes; short passages yield a single shingle
+        """
+        words = re.findall(r"\w+", passage.casefold())
+        n = self.shingle_size
+        if len(words) <= n:
+            return {hash(" ".join(words))} if words else set()
+        return {hash(" ".join(words[i : i + n])) for i in range(len(words) - n + 1)}
+
+    def deduplicate(
+        self, outline: list[str], evidence: dict[str, list[Source]]
+    ) -> dict[str, list[Source]]:
+        """
+        Drop search results that nearly repeat one kept earlier in the outline.
+
+        Args:
+            outline: List of outline points, in report order
+            evidence: Dictionary mapping outline points to their search results
+
+        Returns:
+            Evidence with duplicate results removed
+        """
+        kept: list[set[int]] = []
+        index: dict[int, list[int]] = {}
+        result = {}
+        # a repeated point keeps the evidence of its first occurrence
+        for bullet in dict.fromkeys(outline):
+            records = []
+            for record in evidence.get(bullet, []):
+                shingles = self._shingles(record.content)
+                if not shingles:
+                    continue
+                # count shared shingles with each kept result via the index
+                overlap = Counter(i for s in shingles for i in index.get(s, ()))
+                if any(
+                    shared / (len(shingles) + len(kept[i]) - shared) >= self.threshold
+                    for i, shared in overlap.items()
+                ):
+                    continue
+                for s in shingles:
+                    index.setdefault(s, []).append(len(kept))
+                kept.append(shingles)
+                records.append(record)
+            result[bullet] = records
+        return result
+
+    def allot(self, sizes: dict[str, int], total: int) -> dict[str, int]:
+        """
+        Split a token allowance across sections.
+
+        Sections that need less than an even share hand the rest to the
+        others, so no tokens are wasted on short sections.
+
+        Args:
+            sizes: Tokens each section currently needs
+            total: Tokens available for all sections
+
+        Returns:
+            Token allotment per section
+        """
+        allotment = {}
+        remaining = total
+        ordered = sorted(sizes, key=sizes.get)
+        for n, bullet in enumerate(ordered):
+            share = remaining // (len(ordered) - n)
+            allotment[bullet] = min(sizes[bullet], share)
+            remaining -= allotment[bullet]
+        return allotment
+
+    def trim(
+        self, records: list[Source], sizes: list[int], max_tokens: int
+    ) -> list[Source]:
+        """
+        Fit a section's search results into its allotment.
+
+        Results are kept in order; the first one that does not fit is
+        truncated and the rest are dropped.
+
+        Args:
+            records: Search results for one section
+            sizes: Content tokens of each result
+            max_tokens: Tokens allowed for the section
+
+        Returns:
+            Search results within the allotment
+        """
+        trimmed = []
+        remaining = max_tokens
+        for record, size in zip(records, sizes, strict=True):
+            if size > remaining:
+                if remaining > 0:
+                    content = self.counter.truncate(record.content, remaining)
+                    trimmed.append(record.model_copy(update={"content": content}))
+                break
+            trimmed.append(record)
+            remaining -= size
+        return trimmed
+
+    def compact(
+        self, outline: list[str], evidence: dict[str, list[Source]], total_tokens: int
+    ) -> dict[str, list[Source]]:
+        """
+        Deduplicate evidence and fit it into a token envelope.
+
+        Args:
+            outline: List of outline points, in report order
+            evidence: Dictionary mapping outline points to their search results
+            total_tokens: Evidence tokens allowed across the whole report
+
+        Returns:
+            Compacted evidence, in outline order
+        """
+        deduped = self.deduplicate(outline, evidence)
+        counts = iter(
+            self.counter.count_batch([r.content for b in deduped for r in deduped[b]])
+        )
+        record_sizes = {b: [next(counts) for _ in deduped[b]] for b in deduped}
+        needed = {b: sum(sizes) for b, sizes in record_sizes.items()}
+        allotment = self.allot(needed, total_tokens)
+        return {
+            b: self.trim(deduped[b], record_sizes[b], allotment[b]) for b in outline
+        }
@@ -0,0 +1,479 @@
+"""
+Background research jobs for the web app.
+
+Each job keeps its own progress and result. Jobs run as coroutines on a
+shared event loop, and a semaphore caps how many run at once, so a request
+only has to submit a job and can return straight away. Every job also keeps
+an append-only event log that the web app streams to the browser.
+
+Submitting the same query while an identical job is still running attaches
+to that job instead of starting another, so duplicate submissions share one
+pipeline run, its progress and its result.
+
+A runner can park its job by raising ``AwaitingApproval``, e.g. to let the
+user review the research plan. A parked job holds no worker slot and no
+task until ``JobManager.resume`` runs it again. One left parked for longer
+than the manager's ``approval_timeout`` is cancelled.
+"""
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterator
+
+
+class AwaitingApproval(Exception):
+    """
+    Raised by a runner to park its job until it is resumed.
+    """
+
+
+class Job:
+    """
+    A single research request and its progress.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+    AWAITING_APPROVAL = "awaiting_approval"
+    FINISHED = (DONE, ERROR, CANCELLED)
+    DETACHED = "detached"  # cancelled by one submitter, still run for others
+
+    def __init__(
+        self,
+        requirements: list[str],
+        user: str = "anonymous",
+        priority: int = 0,
+        job_id: str | None = None,
+        options: dict | None = None,
+    ):
+        """
+        Create a queued job.
+
+        Args:
+            requirements: Research requirements entered by the user
+            user: Who submitted the job, for fair sharing of the token budget
+            priority: Scheduling priority of its LLM calls; lower goes first
+            job_id: Id to reuse when resuming or retrying a job
+            options: Runner-specific settings, e.g. whether the plan needs
+                approval
+        """
+        self.id = job_id or str(uuid.uuid4())
+        self.requirements = requirements
+        self.options = options or {}
+        self.user = user
+        self.priority = priority
+        self.query = " ".join(requirements)
+        self.key: str | None = None  # identifies identical submissions
+        self.subscribers = 1
+        self.status = self.QUEUED
+        self.progress = 0
+        self.eta: float | None = None
+        self.task = "Waiting for a free research worker..."
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.parked_at: float | None = None
+        self.future = None
+        self.trace = None  # metrics.Trace, set once the job starts
+        self.events: list[tuple[str, dict]] = []
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._done = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Whether the job has stopped running, successfully or not.
+        """
+        return self.status in self.FINISHED
+
+    def attach(self, priority: int):
+        """
+        Register one more submitter waiting on this job.
+
+        Args:
+            priority: The submitter's priority; the job runs at the most
+                urgent priority of everyone waiting on it
+        """
+        with self._lock:
+            self.subscribers += 1
+            self.priority = min(self.priority, priority)
+
+    def detach(self) -> int:
+        """
+        Drop one submitter.
+
+        Returns:
+            Submitters still waiting on the job
+        """
+        with self._lock:
+            self.subscribers = max(0, self.subscribers - 1)
+            return self.subscribers
+
+    def start(self):
+        """
+        Mark a queued job as running.
+        """
+        with self._lock:
+            if self.status == self.QUEUED:
+                self.status = self.RUNNING
+
+    def park(self, task: str):
+        """
+        Mark a running job as waiting for the user.
+
+        Args:
+            task: Human-readable description of what it waits for
+        """
+        with self._lock:
+            if self.status in self.FINISHED:
+                return
+            self.status = self.AWAITING_APPROVAL
+            self.parked_at = time.time()
+            self.task = task
+            self.eta = None
+            self._emit("stage", {"progress": self.progress, "task": task, "eta": None})
+
+    def unpark(self) -> bool:
+        """
+        Queue a parked job again.
+
+        Returns:
+            False if the job was not parked, e.g. because another request
+            resumed it first
+        """
+        with self._lock:
+            if self.status != self.AWAITING_APPROVAL:
+                return False
+            self.status = self.QUEUED
+            self.parked_at = None
+            return True
+
+    def expire(self, max_wait: float) -> bool:
+        """
+        Cancel the job if it has been parked for longer than ``max_wait``.
+
+        Args:
+            max_wait: Seconds a parked job may wait for the user
+
+        Returns:
+            True if the job was cancelled
+        """
+        with self._lock:
+            if self.status != self.AWAITING_APPROVAL:
+                return False
+            if time.time() - self.parked_at <= max_wait:
+                return False
+            self._finish(self.CANCELLED)
+        self._done.set()
+        return True
+
+    def _emit(self, event: str, data: dict):
+        # callers hold self._lock
+        self.events.append((event, data))
+        self._changed.notify_all()
+
+    def emit(self, event: str, data: dict):
+        """
+        Append an event to the job's log and wake any listeners.
+
+        Args:
+            event: Event name, e.g. ``"evidence"`` or ``"token"``
+            data: JSON-serializable payload
+        """
+        with self._lock:
+            self._emit(event, data)
+
+    def update_progress(self, progress: int, task: str = "", eta: float | None = None):
+        """
+        Record how far the job has got.
+
+        Args:
+            progress: Percent complete
+            task: Human-readable description of the current stage
+            eta: Estimated seconds until the job finishes
+        """
+        with self._lock:
+            self.progress = progress
+            self.task = task
+            self.eta = eta
+            self._emit("stage", {"progress": progress, "task": task, "eta": eta})
+
+    def finish(self, status: str, result: dict | None = None, error: str | None = None):
+        """
+        Mark the job as finished and wake anyone waiting on it.
+
+        Args:
+            status: One of DONE, ERROR or CANCELLED
+            result: Research output, for DONE jobs
+            error: Error message, for ERROR jobs
+        """
+        with self._lock:
+            self._finish(status, result, error)
+        self._done.set()
+
+    def _finish(
+        self, status: str, result: dict | None = None, error: str | None = None
+    ):
+        # callers hold self._lock and set self._done once they release it
+        if self.status in self.FINISHED:
+            return
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        if status == self.DONE:
+            self.progress, self.task, self.eta = 100, "Research complete!", 0.0
+        elif status == self.CANCELLED:
+            self.task = "Research cancelled"
+        else:
+            self.task = f"Error: {error}"
+        self._emit("done", {"status": status})
+
+    def iter_events(
+        self, start: int = 0, heartbeat: float = 15
+    ) -> Iterator[tuple[int, str, dict] | None]:
+        """
+        Follow the event log until the job finishes.
+
+        Args:
+            start: Index of the first event to return, for resuming a stream
+            heartbeat: Seconds without events before yielding None, so the
+                caller can keep an idle connection alive
+
+        Yields:
+            ``(index, event, data)`` tuples, or None on an idle heartbeat
+        """
+        index = start
+        while True:
+            with self._changed:
+                if index >= len(self.events) and not self.finished:
+                    self._changed.wait(heartbeat)
+                batch = self.events[index:]
+                finished = self.finished
+            if not batch:
+                if finished:
+                    return
+                yield None
+            for event, data in batch:
+                yield index, event, data
+                index += 1
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        Block until the job finishes.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            True if the job finished in time
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        """
+        Public view of the job for the JSON API.
+
+        Returns:
+            Job id, status, progress and timing
+        """
+        with self._lock:
+            return {
+                "id": self.id,
+                "status": self.status,
+                "progress": self.progress,
+                "task": self.task,
+                "eta": self.eta,
+                "error": self.error,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "subscribers": self.subscribers,
+                "priority": self.priority,
+            }
+
+
+class JobManager:
+    """
+    Runs jobs on a shared event loop with a bounded number of workers.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Job], Awaitable[dict]],
+        loop: asyncio.AbstractEventLoop,
+        max_concurrent: int,
+        max_history: int,
+        key: Callable[[list[str], dict], str | None] | None = None,
+        approval_timeout: float | None = None,
+        on_expire: Callable[[Job], None] | None = None,
+    ):
+        """
+        Set up the job manager.
+
+        Args:
+            runner: Coroutine function that performs a job and returns its result
+            loop: Running event loop that executes the jobs
+            max_concurrent: Jobs allowed to run at the same time
+            max_history: Finished jobs kept for polling before the oldest go
+            key: Optional function mapping requirements and options to a
+                key; a job submitted while one with the same key is
+                unfinished attaches to it, and a None key never shares
+            approval_timeout: Seconds a parked job waits for the user before
+                it is cancelled; None waits forever
+            on_expire: Called with each parked job cancelled for waiting
+                too long, outside the manager's lock
+        """
+        self.runner = runner
+        self.loop = loop
+        self.max_history = max_history
+        self.key = key
+        self.approval_timeout = approval_timeout
+        self.on_expire = on_expire
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._in_flight: dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        requirements: list[str],
+        user: str = "anonymous",
+        priority: int = 0,
+        job_id: str | None = None,
+        options: dict | None = None,
+    ) -> Job:
+        """
+        Queue a new job.
+
+        Args:
+            requirements: Research requirements entered by the user
+            user: Who submitted the job
+            priority: Scheduling priority of its LLM calls; lower goes first
+            job_id: Id of an earlier job to run again under the same id,
+                replacing it if it has finished
+            options: Runner-specific settings kept on the job
+
+        Returns:
+            The queued job, or the unfinished job it attached to
+        """
+        key = self.key(requirements, options or {}) if self.key else None
+        with self._lock:
+            running = self._in_flight.get(key) if key is not None else None
+            previous = self._jobs.get(job_id) if job_id is not None else None
+            if previous is not None and not previous.finished:
+                running = previous
+            if running is not None and not running.finished:
+                running.attach(priority)
+                return running
+            job = Job(requirements, user, priority, job_id, options)
+            job.key = key
+            self._jobs.pop(job.id, None)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._in_flight[key] = job
+            expired = self._prune()
+        self._expired(expired)
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job), self.loop)
+        return job
+
+    def resume(self, job: Job):
+        """
+        Run a job again after ``Job.unpark`` queued it.
+
+        Args:
+            job: The job
+        """
+        job.future = asyncio.run_coroutine_threadsafe(self._run(job), self.loop)
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        Look up a job.
+
+        Args:
+            job_id: Id returned by ``submit``
+
+        Returns:
+            The job, or None if it is unknown or was pruned
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> str | None:
+        """
+        Cancel a queued, running or parked job.
+
+        A job shared by several submitters only stops once all of them
+        have cancelled it; until then each cancel just detaches one.
+
+        Args:
+            job_id: Id returned by ``submit``
+
+        Returns:
+            ``Job.CANCELLED`` if the job stopped, ``Job.DETACHED`` if it
+            keeps running for other submitters, or None if it is unknown or
+            already finished
+        """
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return None
+        if job.detach() > 0:
+            return Job.DETACHED
+        if job.future is not None:
+            job.future.cancel()
+        # a job cancelled before it started never reaches _run's handler
+        job.finish(Job.CANCELLED)
+        self._forget(job)
+        return Job.CANCELLED
+
+    async def _run(self, job: Job):
+        try:
+            async with self._semaphore:
+                job.start()
+                result = await self.runner(job)
+            job.finish(Job.DONE, result=result)
+        except AwaitingApproval as e:
+            # stays listed until resumed or cancelled
+            job.park(str(e))
+            return
+        except asyncio.CancelledError:
+            job.finish(Job.CANCELLED)
+            raise
+        except Exception as e:
+            print(f"Error in research job {job.id}: {str(e)}")
+            job.finish(Job.ERROR, error=str(e))
+        finally:
+            self._forget(job)
+
+    def _forget(self, job: Job):
+        # later submissions of the same query start a fresh job
+        with self._lock:
+            if job.key is not None and self._in_flight.get(job.key) is job:
+                del self._in_flight[job.key]
+
+    def _prune(self) -> list[Job]:
+        # callers hold self._lock; parked jobs past the timeout are cancelled
+        # first, so they count as finished history below
+        expired = []
+        if self.approval_timeout is not None:
+            expired = [
+                job for job in self._jobs.values() if job.expire(self.approval_timeout)
+            ]
+        # drop the oldest finished jobs once the history is full
+        finished = [jid for jid, job in self._jobs.items() if job.finished]
+        for jid in finished[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[jid]
+        return expired
+
+    def _expired(self, jobs: list[Job]):
+        if self.on_expire is None:
+            return
+        for job in jobs:
+            self.on_expire(job)
@@ -0,0 +1,408 @@
+"""
+Timing and token instrumentation for the research pipeline.
+
+The pipeline wraps its stages in ``span`` blocks. A span records its wall
+time plus everything attributed to it while it is open: LLM tokens in and
+out, time spent throttled by the budget, and cache hits and misses. Spans
+feed two places:
+
+- process-wide counters and histograms, rendered in the Prometheus text
+  format for the web app's ``/metrics`` endpoint
+- the per-job ``Trace`` opened with ``trace()``, which the web app returns
+  with each job result
+
+The current span and trace live in context variables, so concurrent jobs on
+one event loop never mix their figures.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class Registry:
+    """
+    Minimal thread-safe store of labelled counters and histograms.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+        self._values: dict[str, dict[tuple, float | list]] = {}
+
+    def counter(self, name: str, help_text: str):
+        """
+        Declare a counter.
+
+        Args:
+            name: Metric name, ending in ``_total`` by convention
+            help_text: Description shown in the exposition
+        """
+        self._meta[name] = ("counter", help_text)
+        self._values[name] = {}
+
+    def histogram(
+        self, name: str, help_text: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        """
+        Declare a histogram.
+
+        Args:
+            name: Metric name
+            help_text: Description shown in the exposition
+            buckets: Upper bounds of the buckets, ascending
+        """
+        self._meta[name] = ("histogram", help_text)
+        self._buckets[name] = buckets
+        self._values[name] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        """
+        Add to a counter.
+
+        Args:
+            name: Declared counter name
+            value: Amount to add
+            labels: Label values
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        """
+        Record one observation in a histogram.
+
+        Args:
+            name: Declared histogram name
+            value: Observed value
+            labels: Label values
+        """
+        key = tuple(sorted(labels.items()))
+        buckets = self._buckets[name]
+        with self._lock:
+            # per-bucket counts, then sum and count
+            state = self._values[name].setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, pairs: tuple, **extra: str) -> str:
+        items = [*pairs, *extra.items()]
+        if not items:
+            return ""
+        return "{" + ",".join(f'{k}="{cls._escape(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+
+        Returns:
+            Exposition text
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in self._meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self._values[name].items()):
+                    if kind == "counter":
+                        lines.append(f"{name}{self._labels(key)} {value}")
+                        continue
+                    # value holds one count per bucket, then sum and count
+                    buckets = zip(self._buckets[name], value[:-2], strict=True)
+                    for bound, count in buckets:
+                        labels = self._labels(key, le=str(bound))
+                        lines.append(f"{name}_bucket{labels} {count}")
+                    labels = self._labels(key, le="+Inf")
+                    lines.append(f"{name}_bucket{labels} {value[-1]}")
+                    lines.append(f"{name}_sum{self._labels(key)} {value[-2]}")
+                    lines.append(f"{name}_count{self._labels(key)} {value[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+registry.histogram("research_stage_seconds", "Wall time of pipeline stages.")
+registry.counter(
+    "research_llm_tokens_total", "LLM tokens by stage and direction (in/out)."
+)
+registry.histogram(
+    "research_budget_wait_seconds", "Time LLM calls waited on the token budget."
+)
+registry.counter(
+    "research_budget_throttled_seconds_total",
+    "Total time spent throttled by the token budget.",
+)
+registry.counter(
+    "research_cache_lookups_total", "Cache lookups by cache and result (hit/miss)."
+)
+
+
+class Span:
+    """
+    Figures for one timed stage.
+    """
+
+    def __init__(self, stage: str, start: float):
+        """
+        Open a span.
+
+        Args:
+            stage: Stage name, e.g. ``"plan"``
+            start: Seconds since the trace started
+        """
+        self.stage = stage
+        self.start = start
+        self.seconds = 0.0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.throttled_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def to_dict(self) -> dict:
+        """
+        Span figures for JSON output.
+        """
+        return {
+            "stage": self.stage,
+            "start": round(self.start, 3),
+            "seconds": round(self.seconds, 3),
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "throttled_seconds": round(self.throttled_seconds, 3),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+
+class Trace:
+    """
+    Spans recorded for one job, in the order they finished.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        """
+        Record a finished span.
+
+        Args:
+            span: The span
+        """
+        with self._lock:
+            self.spans.append(span)
+
+    def totals(self) -> tuple[int, float]:
+        """
+        LLM tokens and throttled time recorded so far.
+
+        Returns:
+            Tuple of (tokens in and out, throttled seconds)
+        """
+        with self._lock:
+            return (
+                sum(s.tokens_in + s.tokens_out for s in self.spans),
+                sum(s.throttled_seconds for s in self.spans),
+            )
+
+    def to_dict(self) -> dict:
+        """
+        The trace for JSON output.
+
+        Returns:
+            Total seconds, every span, and per-stage totals
+        """
+        with self._lock:
+            spans = [s.to_dict() for s in self.spans]
+        stages: dict[str, dict] = {}
+        for s in spans:
+            total = stages.setdefault(
+                s["stage"],
+                {"count": 0, "seconds": 0.0, "tokens_in": 0, "tokens_out": 0,
+                 "throttled_seconds": 0.0, "cache_hits": 0, "cache_misses": 0},
+            )
+            total["count"] += 1
+            for field in ("seconds", "tokens_in", "tokens_out", "throttled_seconds",
+                          "cache_hits", "cache_misses"):
+                total[field] = round(total[field] + s[field], 3)
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 3),
+            "spans": spans,
+            "stages": stages,
+        }
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("research_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("research_span", default=None)
+
+
+def _reset(var: ContextVar, token, previous):
+    # generators can finish in a different context than they started in
+    try:
+        var.reset(token)
+    except ValueError:
+        var.set(previous)
+
+
+@contextmanager
+def trace(current: Trace | None = None) -> Iterator[Trace]:
+    """
+    Collect the spans of everything run inside the block.
+
+    Args:
+        current: Trace to keep adding to, e.g. for a job resumed after
+            waiting on the user
+
+    Yields:
+        The trace being recorded
+    """
+    previous = _current_trace.get()
+    current = current or Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _reset(_current_trace, token, previous)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[Span]:
+    """
+    Time a pipeline stage and attribute tokens, throttling and cache
+    lookups made inside it.
+
+    Args:
+        stage: Stage name used as the metric label
+
+    Yields:
+        The open span
+    """
+    job_trace = _current_trace.get()
+    started = time.perf_counter()
+    current = Span(stage, started - job_trace.started if job_trace else 0.0)
+    previous = _current_span.get()
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _reset(_current_span, token, previous)
+        current.seconds = time.perf_counter() - started
+        registry.observe("research_stage_seconds", current.seconds, stage=stage)
+        if job_trace is not None:
+            job_trace.add(current)
+
+
+def timed(stage: str) -> Callable:
+    """
+    Decorator that runs a function, coroutine or generator inside a span.
+
+    Args:
+        stage: Stage name used as the metric label
+
+    Returns:
+        The decorator
+    """
+    def decorate(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+        elif inspect.isasyncgenfunction(func):
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    async for item in func(*args, **kwargs):
+                        yield item
+        elif inspect.isgeneratorfunction(func):
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    yield from func(*args, **kwargs)
+        else:
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    return func(*args, **kwargs)
+        return functools.wraps(func)(wrapper)
+
+    return decorate
+
+
+def _stage() -> str:
+    current = _current_span.get()
+    return current.stage if current else "other"
+
+
+def record_tokens(tokens_in: int, tokens_out: int):
+    """
+    Attribute an LLM call's token usage to the current span.
+
+    Args:
+        tokens_in: Prompt tokens
+        tokens_out: Completion tokens
+    """
+    name = "research_llm_tokens_total"
+    registry.inc(name, tokens_in, stage=_stage(), direction="in")
+    registry.inc(name, tokens_out, stage=_stage(), direction="out")
+    current = _current_span.get()
+    if current is not None:
+        current.tokens_in += tokens_in
+        current.tokens_out += tokens_out
+
+
+def record_throttle(seconds: float):
+    """
+    Record how long a call waited on the token budget.
+
+    Args:
+        seconds: Time between asking for tokens and being admitted
+    """
+    registry.observe("research_budget_wait_seconds", seconds, stage=_stage())
+    registry.inc("research_budget_throttled_seconds_total", seconds, stage=_stage())
+    current = _current_span.get()
+    if current is not None:
+        current.throttled_seconds += seconds
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Record a cache lookup.
+
+    Args:
+        cache: Cache name, e.g. ``"search"`` or ``"llm"``
+        hit: Whether the lookup found an entry
+    """
+    result = "hit" if hit else "miss"
+    registry.inc("research_cache_lookups_total", cache=cache, result=result)
+    current = _current_span.get()
+    if current is not None:
+        if hit:
+            current.cache_hits += 1
+        else:
+            current.cache_misses += 1
+
+
+def render() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        Exposition text for the ``/metrics`` endpoint
+    """
+    return registry.render()
@@ -0,0 +1,304 @@
+"""
+Progress and ETA estimates for research jobs, learned from past runs.
+
+Every finished stage of a job records how long it worked and how many LLM
+tokens it used. Samples are kept per model, stage and outline size, in a
+rolling window of the most recent runs, in SQLite so they survive restarts
+and are shared by every worker on the host. Estimates use the median of the
+window. Before enough runs have been measured they fall back to other
+outline sizes (scaled per bullet) and then to fixed defaults.
+
+Time spent throttled is not part of the samples. It depends on how busy
+the token budget is right now, so ``JobProgress`` adds it separately from
+the budget's current headroom.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from statistics import median
+
+
+class ProgressEstimator:
+    """
+    Rolling per-stage duration and token history.
+    """
+
+    WINDOW = 50  # samples kept per model, stage and outline size
+    MIN_SAMPLES = 3  # samples needed before a bucket is trusted
+    DEFAULT_OUTLINE_SIZE = 5
+    DEFAULT_SECONDS = {"plan": 5.0, "queries": 5.0, "research": 20.0, "write": 10.0}
+    DEFAULT_TOKENS = {
+        "plan": 600.0,
+        "queries": 1_500.0,
+        "research": 0.0,
+        "write": 6_000.0,
+    }
+    # stages whose cost grows with the number of outline points
+    SCALES_WITH_OUTLINE = {"queries", "research", "write"}
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open (or create) the history.
+
+        Args:
+            path: SQLite database file; the default keeps the history private
+                to this process
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stage_samples ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL, "
+                "stage TEXT NOT NULL, outline_size INTEGER NOT NULL, "
+                "seconds REAL NOT NULL, tokens REAL NOT NULL, "
+                "recorded_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS stage_samples_bucket "
+                "ON stage_samples (model, stage, outline_size, id)"
+            )
+
+    def record(
+        self, model: str, stage: str, outline_size: int, seconds: float, tokens: float
+    ):
+        """
+        Add a measured stage and drop samples that fell out of the window.
+
+        Args:
+            model: LLM model name
+            stage: Stage name, e.g. ``"research"``
+            outline_size: Number of outline points in the job
+            seconds: Time the stage worked, excluding time throttled
+            tokens: LLM tokens the stage used
+        """
+        bucket = (model, stage, outline_size)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO stage_samples "
+                "(model, stage, outline_size, seconds, tokens, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*bucket, seconds, tokens, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM stage_samples WHERE model = ? AND stage = ? "
+                "AND outline_size = ? AND id NOT IN ("
+                "SELECT id FROM stage_samples WHERE model = ? AND stage = ? "
+                "AND outline_size = ? ORDER BY id DESC LIMIT ?)",
+                (*bucket, *bucket, self.WINDOW),
+            )
+
+    def typical_outline_size(self, model: str) -> int:
+        """
+        Outline size to assume before a job has planned its outline.
+
+        Args:
+            model: LLM model name
+
+        Returns:
+            Median outline size of recent planning runs, or the default
+        """
+        with self._lock:
+            sizes = [
+                size for (size,) in self._conn.execute(
+                    "SELECT outline_size FROM stage_samples WHERE model = ? "
+                    "AND stage = 'plan' ORDER BY id DESC LIMIT ?",
+                    (model, self.WINDOW),
+                )
+            ]
+        return round(median(sizes)) if sizes else self.DEFAULT_OUTLINE_SIZE
+
+    def expected(
+        self, model: str, stage: str, outline_size: int
+    ) -> tuple[float, float]:
+        """
+        Expected work time and tokens of a stage.
+
+        Args:
+            model: LLM model name
+            stage: Stage name
+            outline_size: Number of outline points in the job
+
+        Returns:
+            Tuple of (seconds, tokens)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT outline_size, seconds, tokens FROM stage_samples "
+                "WHERE model = ? AND stage = ? ORDER BY id DESC",
+                (model, stage),
+            ).fetchall()
+        exact = [(s, t) for size, s, t in rows if size == outline_size]
+        if len(exact) >= self.MIN_SAMPLES:
+            return median(s for s, _ in exact), median(t for _, t in exact)
+
+        if len(rows) >= self.MIN_SAMPLES:
+            recent = rows[: self.WINDOW]
+            if stage in self.SCALES_WITH_OUTLINE:
+                # per-point cost from other outline sizes
+                scale = [outline_size / max(size, 1) for size, _, _ in recent]
+                return (
+                    median(s * k for (_, s, _), k in zip(recent, scale, strict=True)),
+                    median(t * k for (_, _, t), k in zip(recent, scale, strict=True)),
+                )
+            return median(s for _, s, _ in recent), median(t for _, _, t in recent)
+
+        scale = (
+            outline_size / self.DEFAULT_OUTLINE_SIZE
+            if stage in self.SCALES_WITH_OUTLINE
+            else 1
+        )
+        seconds = self.DEFAULT_SECONDS.get(stage, 5.0) * scale
+        return seconds, self.DEFAULT_TOKENS.get(stage, 0.0) * scale
+
+    def expected_job(
+        self, model: str, stages: list[str], outline_size: int | None = None
+    ) -> float:
+        """
+        Expected work time of a whole job, e.g. for running short jobs first.
+
+        Args:
+            model: LLM model name
+            stages: Stages the job will run
+            outline_size: Number of outline points, if already known
+
+        Returns:
+            Expected seconds, excluding time throttled
+        """
+        size = outline_size or self.typical_outline_size(model)
+        return sum(self.expected(model, stage, size)[0] for stage in stages)
+
+
+class JobProgress:
+    """
+    Percent complete and ETA for one running job.
+    """
+
+    def __init__(
+        self, estimator: ProgressEstimator, model: str, stages: list[str], limiter
+    ):
+        """
+        Start tracking a job.
+
+        Args:
+            estimator: History used for the expected stage costs
+            model: LLM model name
+            stages: Stages the job will run, in order
+            limiter: The pipeline's ``Budget``, for expected throttling
+        """
+        self.estimator = estimator
+        self.model = model
+        self.stages = stages
+        self.limiter = limiter
+        self.outline_size: int | None = None
+        self.started = time.perf_counter()
+        self._finished: set[str] = set()
+        self._stage: str | None = None
+        self._stage_started = 0.0
+        self._stage_totals = (0, 0.0)
+        self._fraction = 0.0
+        self._percent = 0
+
+    def _size(self) -> int:
+        return self.outline_size or self.estimator.typical_outline_size(self.model)
+
+    def begin(self, stage: str, totals: tuple[int, float]):
+        """
+        Mark the start of a stage.
+
+        Args:
+            stage: Stage name
+            totals: ``(tokens, throttled seconds)`` the job had used so far
+        """
+        self._stage = stage
+        self._stage_started = time.perf_counter()
+        self._stage_totals = totals
+        self._fraction = 0.0
+
+    def advance(self, fraction: float):
+        """
+        Report how much of the current stage is done.
+
+        Args:
+            fraction: Share of the stage completed, from 0 to 1
+        """
+        self._fraction = min(max(fraction, 0.0), 1.0)
+
+    def end(self, totals: tuple[int, float]):
+        """
+        Mark the end of the current stage and add it to the history.
+
+        Args:
+            totals: ``(tokens, throttled seconds)`` the job has used so far
+        """
+        tokens = totals[0] - self._stage_totals[0]
+        throttled = totals[1] - self._stage_totals[1]
+        seconds = max(0.0, time.perf_counter() - self._stage_started - throttled)
+        self.estimator.record(self.model, self._stage, self._size(), seconds, tokens)
+        self._finished.add(self._stage)
+        self._stage = None
+
+    def skip(self, stage: str):
+        """
+        Count a stage as done without measuring it, e.g. when a resumed job
+        restores it from a checkpoint.
+
+        Args:
+            stage: Stage name
+        """
+        self._finished.add(stage)
+
+    def _throttle(self, tokens: float) -> float:
+        # time until the sliding window frees what the headroom cannot cover
+        shortfall = tokens - self.limiter.headroom()
+        if shortfall <= 0:
+            return 0.0
+        return shortfall / self.limiter.tpm * self.limiter.WINDOW
+
+    def eta(self) -> float:
+        """
+        Expected seconds until the job finishes, including throttling.
+
+        Returns:
+            Remaining seconds
+        """
+        size = self._size()
+        seconds = tokens = 0.0
+        for stage in self.stages:
+            if stage in self._finished:
+                continue
+            expected_seconds, expected_tokens = self.estimator.expected(
+                self.model, stage, size
+            )
+            if stage == self._stage:
+                # trust the in-stage progress, but never promise less than the
+                # stage still needs by its own history
+                elapsed = time.perf_counter() - self._stage_started
+                remaining = 1 - self._fraction
+                seconds += max(
+                    expected_seconds * remaining, expected_seconds - elapsed, 0.0
+                )
+                tokens += expected_tokens * remaining
+            else:
+                seconds += expected_seconds
+                tokens += expected_tokens
+        return seconds + self._throttle(tokens)
+
+    def snapshot(self) -> tuple[int, float]:
+        """
+        Current percent complete and ETA.
+
+        Returns:
+            Tuple of (percent from 0 to 99, never going backwards, and
+            remaining seconds)
+        """
+        eta = self.eta()
+        elapsed = time.perf_counter() - self.started
+        percent = int(100 * elapsed / (elapsed + eta)) if elapsed + eta > 0 else 0
+        self._percent = max(self._percent, min(percent, 99))
+        return self._percent, eta
@@ -102,6 +102,37 @@ Call the Queries tool
 </Format>
 """
 
+outline_query_writer_instructions="""You are an expert technical writer crafting targeted web search
+queries that will gather comprehensive information for writing every section of a
+technical report.
+
+<Report topic>
+{topic}
+</Report topic>
+
+<Report outline>
+{outline}
+</Report outline>
+
+<Task>
+Your goal is to generate {number_of_queries} search queries for each section in the
+report outline.
+
+The queries for a section should:
+
+1. Be related to that section's topic
+2. Examine different aspects of it
+3. Not repeat the queries of other sections
+
+Make the queries specific enough to find high-quality, relevant sources.
+</Task>
+
+<Format>
+Call the OutlineQueries tool with one entry per outline section, in outline order,
+copying each section's text exactly
+</Format>
+"""
+
 section_writer_instructions = """Write one section of a research report.
 
 <Task>
@@ -249,4 +280,18 @@ For Conclusion/Summary:
 - For conclusion: 100-150 word limit, ## for section title, only ONE structural element at most, no sources section
 - Markdown format
 - Do not include word count or any preamble in your response
-</Quality Checks>"""
\ No newline at end of file
+</Quality Checks>"""
+
+plan_feedback_instructions="""Here is the current outline for the report:
+
+<Outline>
+{outline}
+</Outline>
+
+<Feedback>
+{feedback}
+</Feedback>
+
+Revise the outline according to the feedback. Keep the points the feedback does not
+mention unchanged, word for word.
+Return the full revised outline as plain bullets (≤6 bullets), no prose."""
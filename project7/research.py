@@ -7,13 +7,38 @@ and producing a well-cited final document.
 """
 
 import argparse
+import asyncio
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
+import metrics
+import search_backends
 import tiktoken
+from cache import CachedRetriever, ResponseCache, SQLiteCache, normalize_query
+from coalesce import AsyncSingleFlight, SingleFlight
 from dotenv import load_dotenv
+from evidence import EvidenceCompactor
 from langchain.prompts import ChatPromptTemplate
-from langchain_community.retrievers import TavilySearchAPIRetriever
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_groq import ChatGroq
+from prompts import (
+    final_section_writer_instructions,
+    outline_query_writer_instructions,
+    plan_feedback_instructions,
+    section_grader_instructions,
+    section_writer_inputs,
+    section_writer_instructions,
+)
+from pydantic import BaseModel
+from scheduler import TokenScheduler
+from state import Feedback, OutlineQueries, SearchQuery, Section, SectionState, Source
 
 load_dotenv()
 
@@ -27,10 +52,63 @@ class Config:
     # Model settings
     GROQ_MODEL = "llama3-70b-8192"
     TOKEN_BUDGET = 12_000  # tokens-per-minute for free tier and note the underscores
+    BUDGET_PATH = ".research_cache/budget.db"  # shared by every worker on the host
+    CHECKPOINT_PATH = ".research_cache/checkpoints.db"  # per-job state for resuming
+    CHECKPOINT_TTL = 7 * 24 * 60 * 60  # seconds failed jobs stay retryable
+    PROGRESS_PATH = ".research_cache/progress.db"  # measured stage durations for ETAs
+
+    # Scheduling of LLM calls from concurrent jobs sharing the budget:
+    # interactive before batch, then the user with the smallest recent share
+    SCHEDULE_SHORTEST_FIRST = False  # rank by estimated time left before share
+    SCHEDULE_MAX_WAIT = 120  # seconds before a waiting call goes first anyway
 
     # Token allocations
     PLANNER_TOK = 512  # outline size
     WRITER_TOK = 1_024  # each section draft and note the underscores
+    EVIDENCE_TOK = 6_000  # research evidence allowed in the write prompt
+    SECTION_TOK = 512  # each researched section in "sections" mode
+    FINAL_SECTION_TOK = 384  # introduction and conclusion in "sections" mode
+
+    # "sections" drafts every section concurrently, then the intro and
+    # conclusion; "single" writes the whole report in one call
+    WRITE_MODE = "sections"
+
+    # Reflection ("sections" mode): grade each drafted section and re-search
+    # only the ones that fail, within a depth and token cap
+    REFLECTION = False
+    MAX_SEARCH_DEPTH = 2  # search rounds per section, including the first
+    REFLECTION_TOKEN_CAP = 24_000  # grading + redraft tokens per report
+    FOLLOW_UP_QUERIES = 2  # follow-up searches suggested per failing section
+    GRADER_TOK = 256
+
+    # Evidence gathering
+    RESEARCH_CONCURRENCY = 6  # max searches in flight at once
+    # Stream the outline and start each point's search as soon as its line
+    # is complete, so planning overlaps evidence gathering (single-query mode)
+    STREAM_PLAN = False
+    # Multi-query search: one LLM call writes QUERIES_PER_SECTION queries for
+    # every outline point, and their results are merged by URL
+    MULTI_QUERY = False
+    QUERIES_PER_SECTION = 3
+    BATCH_CONCURRENCY = 4  # queries in flight at once in --batch mode
+
+    # Search backend: "tavily" (web), "local" (full-text index on disk, no
+    # network) or "hybrid" (local first, web when it finds too little)
+    SEARCH_BACKEND = "tavily"
+    SEARCH_K = 3  # results per search
+    LOCAL_INDEX_PATH = ".research_cache/local_index.db"
+    INDEX_FETCHED_SOURCES = True  # add every web result to the local index
+    HYBRID_MIN_LOCAL_HITS = 2  # local results needed to skip the web search
+
+    # Search result cache (shared by every process on the host)
+    CACHE_PATH = ".research_cache/cache.db"
+    SEARCH_CACHE_TTL = 24 * 60 * 60  # seconds before a cached search expires
+    SEARCH_CACHE_MAX_ENTRIES = 10_000  # least recently used entries evicted past this
+
+    # LLM response cache for identical plan/write calls
+    RESPONSE_CACHE_TTL = 7 * 24 * 60 * 60
+    RESPONSE_CACHE_MAX_ENTRIES = 2_000  # on disk
+    RESPONSE_CACHE_MEMORY_ENTRIES = 256  # in process
 
     # Prompts
     PLANNER_PROMPT = ChatPromptTemplate.from_messages(
@@ -60,219 +138,2042 @@ class Config:
 class TokenCounter:
     """
     Utility for counting tokens in text.
+
+    Counts are memoized by a hash of the text, so prompt fragments that repeat
+    on every call (system prompts, unchanged evidence) are only encoded once.
     """
 
-    def __init__(self):
+    CHARS_PER_TOKEN = 4  # rough ratio used by estimate mode
+
+    def __init__(self, memo_size: int = 4_096, num_threads: int = 8, encoding=None):
         """
         Initialize the token counter with the appropriate encoding.
+
+        Args:
+            memo_size: Counts remembered before the least recently used go
+            num_threads: Threads tiktoken uses for batch encoding
+            encoding: Encoder to use instead of tiktoken's, e.g. an offline
+                stand-in; tiktoken's is loaded on first use, since the first
+                load on a host downloads it
+        """
+        self._enc = encoding
+        self.memo_size = memo_size
+        self.num_threads = num_threads
+        self._memo: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enc(self):
+        """
+        The encoding, loaded on first use.
+        """
+        if self._enc is None:
+            with self._lock:
+                if self._enc is None:
+                    # Groq uses o200k_base
+                    self._enc = tiktoken.encoding_for_model("gpt-4o")
+        return self._enc
+
+    @enc.setter
+    def enc(self, encoding):
+        self._enc = encoding
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    @classmethod
+    def estimate(cls, text: str) -> int:
+        """
+        Cheaply approximate the token count without encoding.
+
+        Args:
+            text: The text to estimate
+
+        Returns:
+            Approximate number of tokens
         """
-        self.enc = tiktoken.encoding_for_model("gpt-4o")  # Groq uses o200k_base
+        return -(-len(text) // cls.CHARS_PER_TOKEN)
+
+    def _remember(self, found: dict[bytes, int]):
+        with self._lock:
+            for key, n in found.items():
+                self._memo[key] = n
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
 
-    def count(self, text: str) -> int:
+    def count(self, text: str, estimate: bool = False) -> int:
         """
         Count the number of tokens in a text string.
 
         Args:
             text: The text to count tokens for
+            estimate: Return a cheap approximation instead of encoding
 
         Returns:
             Number of tokens
         """
-        return len(self.enc.encode(text))
+        if estimate:
+            return self.estimate(text)
+
+        key = self._key(text)
+        with self._lock:
+            n = self._memo.get(key)
+            if n is not None:
+                self._memo.move_to_end(key)
+                return n
+        # a single text skips the batch encoder's thread pool
+        n = len(self.enc.encode_ordinary(text))
+        self._remember({key: n})
+        return n
+
+    def count_batch(self, texts: list[str], estimate: bool = False) -> list[int]:
+        """
+        Count tokens for many strings in one call.
+
+        Memoized strings are answered from the cache; the rest are encoded
+        together with tiktoken's multi-threaded batch encoder.
+
+        Args:
+            texts: The texts to count tokens for
+            estimate: Return cheap approximations instead of encoding
+
+        Returns:
+            Number of tokens for each text, in order
+        """
+        if estimate:
+            return [self.estimate(t) for t in texts]
+
+        keys = [self._key(t) for t in texts]
+        counts: list[int | None] = []
+        with self._lock:
+            for key in keys:
+                counts.append(self._memo.get(key))
+                if counts[-1] is not None:
+                    self._memo.move_to_end(key)
+
+        missing = {keys[i]: texts[i] for i, c in enumerate(counts) if c is None}
+        if missing:
+            encoded = self.enc.encode_ordinary_batch(
+                list(missing.values()), num_threads=self.num_threads
+            )
+            found = {
+                key: len(tokens) for key, tokens in zip(missing, encoded, strict=True)
+            }
+            self._remember(found)
+            counts = [
+                found[k] if c is None else c for k, c in zip(keys, counts, strict=True)
+            ]
+        return counts
+
+    def count_messages(self, messages: list) -> int:
+        """
+        Count the tokens in the content of a list of chat messages.
+
+        Args:
+            messages: Formatted chat messages
+
+        Returns:
+            Total number of tokens
+        """
+        return sum(self.count_batch([str(m.content) for m in messages]))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Cut a text string down to at most ``max_tokens`` tokens.
+
+        Args:
+            text: The text to trim
+            max_tokens: Maximum number of tokens to keep
+
+        Returns:
+            The leading part of the text that fits
+        """
+        return self.enc.decode(self.enc.encode_ordinary(text)[:max_tokens])
 
 
 class Budget:
     """
-    Token rate limiter to stay within API rate limits.
+    Sliding-window token rate limiter to stay within API rate limits.
+
+    Every reservation is logged with its timestamp in SQLite, and a request
+    is admitted as soon as the tokens logged in the last 60 s plus its own
+    fit under the limit. Gunicorn workers (or any processes) that point at
+    the same database file therefore share one budget.
     """
 
-    def __init__(self, tpm: int):
+    WINDOW = 60  # seconds
+
+    def __init__(self, tpm: int, path: str = ":memory:"):
         """
         Initialize the budget with tokens-per-minute limit.
 
         Args:
             tpm: Tokens per minute limit
+            path: SQLite file shared between processes; the default keeps
+                the log private to this process
         """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
         self.tpm = tpm
-        self.window_start = time.time()
-        self.used = 0
+        self.throttled_seconds = 0.0  # time callers spent waiting for room
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_log ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "ts REAL NOT NULL, tokens INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS token_log_ts ON token_log (ts)"
+            )
+
+    def try_acquire(self, n_tokens: int) -> tuple[int | None, float]:
+        """
+        Reserve tokens if the sliding window has room for them.
+
+        Args:
+            n_tokens: Number of tokens to consume
+
+        Returns:
+            Tuple of (reservation id, 0) on success, or (None, seconds until
+            enough logged tokens expire) when the window is full
+        """
+        with self._lock:
+            # IMMEDIATE takes the write lock so check-and-insert is atomic
+            # across processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                self._conn.execute(
+                    "DELETE FROM token_log WHERE ts <= ?", (now - self.WINDOW,)
+                )
+                rows = self._conn.execute(
+                    "SELECT ts, tokens FROM token_log ORDER BY ts"
+                ).fetchall()
+                used = sum(tokens for _, tokens in rows)
+                # a request larger than the whole budget runs on an empty window
+                if used + n_tokens <= self.tpm or not rows:
+                    cursor = self._conn.execute(
+                        "INSERT INTO token_log (ts, tokens) VALUES (?, ?)",
+                        (now, n_tokens),
+                    )
+                    return cursor.lastrowid, 0.0
 
-    def consume(self, n_tokens: int):
+                wait = rows[-1][0] + self.WINDOW - now
+                freed = 0
+                for ts, tokens in rows:
+                    freed += tokens
+                    if used - freed + n_tokens <= self.tpm:
+                        wait = ts + self.WINDOW - now
+                        break
+                return None, max(wait, 0.01)
+            finally:
+                self._conn.execute("COMMIT")
+
+    def consume(self, n_tokens: int) -> int:
         """
         Track token usage and throttle if necessary to stay within budget.
 
         Args:
             n_tokens: Number of tokens to consume
+
+        Returns:
+            Reservation id, for reporting the real usage with ``record_usage``
+        """
+        started = time.perf_counter()
+        while True:
+            reservation, wait = self.try_acquire(n_tokens)
+            if reservation is not None:
+                self.add_throttled(time.perf_counter() - started)
+                return reservation
+            time.sleep(wait)
+
+    async def aconsume(self, n_tokens: int) -> int:
+        """
+        Async version of ``consume`` that awaits instead of sleeping.
+
+        Args:
+            n_tokens: Number of tokens to consume
+
+        Returns:
+            Reservation id, for reporting the real usage with ``record_usage``
+        """
+        started = time.perf_counter()
+        while True:
+            reservation, wait = self.try_acquire(n_tokens)
+            if reservation is not None:
+                self.add_throttled(time.perf_counter() - started)
+                return reservation
+            await asyncio.sleep(wait)
+
+    def add_throttled(self, seconds: float):
+        """
+        Count time a caller spent waiting for room in the window.
+
+        Args:
+            seconds: How long the caller waited before ``try_acquire``
+                admitted it
+        """
+        with self._lock:
+            self.throttled_seconds += seconds
+        metrics.record_throttle(seconds)
+
+    def record_usage(self, reservation: int, n_tokens: int):
+        """
+        Replace a reservation's estimate with the tokens actually used.
+
+        Args:
+            reservation: Id returned by ``consume``/``aconsume``
+            n_tokens: Tokens reported by the API
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE token_log SET tokens = ? WHERE id = ?", (n_tokens, reservation)
+            )
+
+    def headroom(self) -> int:
+        """
+        Tokens that could be consumed right now without waiting.
+
+        Returns:
+            Remaining tokens in the current sliding window
         """
-        now = time.time()
-        # reset every 60 s
-        if now - self.window_start >= 60:
-            self.window_start, self.used = now, 0
-        # throttle if over budget
-        if self.used + n_tokens > self.tpm:
-            sleep = 60 - (now - self.window_start)
-            time.sleep(max(0, sleep))
-            self.window_start, self.used = time.time(), 0
-        self.used += n_tokens
+        with self._lock:
+            used = self._conn.execute(
+                "SELECT COALESCE(SUM(tokens), 0) FROM token_log WHERE ts > ?",
+                (time.time() - self.WINDOW,),
+            ).fetchone()[0]
+        return max(0, self.tpm - used)
 
 
 # ---------- Research Pipeline Components ----------
+def _submit(pool: ThreadPoolExecutor, fn: Callable, *args) -> Future:
+    """
+    Run a function on a pool thread in a copy of the caller's context.
+
+    Pool threads start from an empty context, which would drop the job's
+    metrics span and trace and its scheduler ticket.
+
+    Args:
+        pool: Executor to run on
+        fn: Function to call
+        *args: Arguments for ``fn``
+
+    Returns:
+        Future for the call
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
 class ResearchPipeline:
     """
     End-to-end research pipeline.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        config: Config | None = None,
+        llm=None,
+        retriever=None,
+        counter: TokenCounter | None = None,
+    ):
         """
         Initialize the research pipeline with necessary components.
+
+        Args:
+            config: Settings to use instead of the ``Config`` defaults
+            llm: Chat model to use instead of ChatGroq, e.g. a local stand-in
+            retriever: Search retriever to use instead of the
+                ``Config.SEARCH_BACKEND`` one; it is wrapped in the search
+                cache like the default
+            counter: Token counter to use instead of a tiktoken one
         """
-        self.config = Config()
-        self.counter = TokenCounter() 
-        self.limiter = Budget(self.config.TOKEN_BUDGET)
-        self.llm = ChatGroq(
+        self.config = config or Config()
+        self.counter = counter or TokenCounter()
+        self.compactor = EvidenceCompactor(self.counter)
+        self.scheduler = TokenScheduler(
+            Budget(self.config.TOKEN_BUDGET, self.config.BUDGET_PATH),
+            shortest_first=self.config.SCHEDULE_SHORTEST_FIRST,
+            max_wait=self.config.SCHEDULE_MAX_WAIT,
+        )
+        self.llm = llm or ChatGroq(
             model=self.config.GROQ_MODEL,
             temperature=0.2,
             max_tokens=self.config.WRITER_TOK,
         )
-        self.search_tool = TavilySearchAPIRetriever(k=3)
+        self.search_cache = SQLiteCache(
+            self.config.CACHE_PATH,
+            "search_results",
+            ttl=self.config.SEARCH_CACHE_TTL,
+            max_entries=self.config.SEARCH_CACHE_MAX_ENTRIES,
+        )
+        self.search_tool = CachedRetriever(
+            retriever
+            or search_backends.create(self.config.SEARCH_BACKEND, self.config),
+            self.search_cache,
+        )
+        # identical LLM calls in flight are made once and shared
+        self._flight = SingleFlight()
+        self._aflight = AsyncSingleFlight()
+        # searches started while planning
+        self._prefetching: set[asyncio.Future] = set()
+        self.response_cache = ResponseCache(
+            SQLiteCache(
+                self.config.CACHE_PATH,
+                "llm_responses",
+                ttl=self.config.RESPONSE_CACHE_TTL,
+                max_entries=self.config.RESPONSE_CACHE_MAX_ENTRIES,
+            ),
+            max_memory_entries=self.config.RESPONSE_CACHE_MEMORY_ENTRIES,
+        )
 
-    def plan(self, query: str) -> list[str]:
+    @property
+    def limiter(self) -> Budget:
         """
-        Create a structured outline for the research topic.
+        Token budget that every LLM call is scheduled against.
+
+        Assigning a new ``Budget`` swaps it in the scheduler too.
+        """
+        return self.scheduler.budget
+
+    @limiter.setter
+    def limiter(self, budget: Budget):
+        self.scheduler.budget = budget
+
+    def _response_key(self, messages: list, max_tokens: int | None = None) -> str:
+        """
+        Build the response cache key for a call to ``self.llm``.
+
+        Args:
+            messages: Formatted chat messages
+            max_tokens: Completion cap for this call, if not the model default
+
+        Returns:
+            Cache key
+        """
+        return ResponseCache.key(
+            self.llm.model_name,
+            self.llm.temperature,
+            max_tokens or self.llm.max_tokens,
+            messages,
+        )
+
+    def _llm_for(self, max_tokens: int | None = None):
+        """
+        The chat model, capped at ``max_tokens`` if given.
+
+        Args:
+            max_tokens: Completion cap for this call, if not the model default
+
+        Returns:
+            Runnable chat model
+        """
+        if max_tokens is None or max_tokens == self.llm.max_tokens:
+            return self.llm
+        return self.llm.bind(max_tokens=max_tokens)
+
+    def _record_usage(self, reservation: int, response):
+        """
+        Feed the real token usage of a response back into the budget and
+        the metrics.
+
+        Args:
+            reservation: Id returned by the budget for this call
+            response: Chat model response
+        """
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            self.limiter.record_usage(reservation, usage["total_tokens"])
+            metrics.record_tokens(
+                usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+            )
+
+    def _call_llm(
+        self,
+        messages: list,
+        tokens: int,
+        use_cache: bool = True,
+        max_tokens: int | None = None,
+    ) -> str:
+        """
+        Call the LLM, serving identical calls from the response cache.
+
+        A cache hit skips the token budget entirely, and a call identical to
+        one already in flight waits for that one instead of spending more.
+
+        Args:
+            messages: Formatted chat messages
+            tokens: Tokens to reserve from the budget on a miss
+            use_cache: Whether to read and write the response cache
+            max_tokens: Completion cap for this call, if not the model default
+
+        Returns:
+            Response text
+        """
+        key = self._response_key(messages, max_tokens)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        def call() -> str:
+            reservation = self.scheduler.consume(tokens)
+
+            # Get response and ensure we're working with a string
+            response = self._llm_for(max_tokens).invoke(messages)
+            self._record_usage(reservation, response)
+            result = str(response.content) if response.content is not None else ""
+
+            if use_cache:
+                self.response_cache.set(key, result)
+            return result
+
+        return self._flight.do(key, call)
+
+    async def _acall_llm(
+        self,
+        messages: list,
+        tokens: int,
+        use_cache: bool = True,
+        max_tokens: int | None = None,
+    ) -> str:
+        """
+        Async version of ``_call_llm``.
+
+        Args:
+            messages: Formatted chat messages
+            tokens: Tokens to reserve from the budget on a miss
+            use_cache: Whether to read and write the response cache
+            max_tokens: Completion cap for this call, if not the model default
+
+        Returns:
+            Response text
+        """
+        key = self._response_key(messages, max_tokens)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        async def call() -> str:
+            reservation = await self.scheduler.aconsume(tokens)
+
+            response = await self._llm_for(max_tokens).ainvoke(messages)
+            self._record_usage(reservation, response)
+            result = str(response.content) if response.content is not None else ""
+
+            if use_cache:
+                self.response_cache.set(key, result)
+            return result
+
+        return await self._aflight.do(key, call)
+
+    def _structured_key(self, schema: type[BaseModel], messages: list) -> str:
+        """
+        Build the response cache key for a structured-output call.
+
+        Args:
+            schema: Pydantic model the response is parsed into
+            messages: Formatted chat messages
+
+        Returns:
+            Cache key
+        """
+        return ResponseCache.key(
+            f"{self.llm.model_name}:{schema.__name__}",
+            self.llm.temperature,
+            self.llm.max_tokens,
+            messages,
+        )
+
+    def _parse_structured(self, reservation: int, output: dict) -> BaseModel:
+        """
+        Record usage for a structured call and return its parsed result.
+
+        Args:
+            reservation: Id returned by the budget for this call
+            output: ``include_raw`` output of a structured-output runnable
+
+        Returns:
+            The parsed model
+        """
+        self._record_usage(reservation, output["raw"])
+        if output["parsed"] is None:
+            raise ValueError(f"Could not parse model output: {output['parsing_error']}")
+        return output["parsed"]
+
+    def _call_structured(
+        self,
+        messages: list,
+        schema: type[BaseModel],
+        tokens: int,
+        use_cache: bool = True,
+    ) -> BaseModel:
+        """
+        Call the LLM for a response parsed into ``schema``, with caching and
+        sharing of identical calls in flight.
+
+        Args:
+            messages: Formatted chat messages
+            schema: Pydantic model to parse the response into
+            tokens: Tokens to reserve from the budget on a miss
+            use_cache: Whether to read and write the response cache
+
+        Returns:
+            Parsed response
+        """
+        key = self._structured_key(schema, messages)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return schema.model_validate_json(cached)
+
+        def call() -> BaseModel:
+            reservation = self.scheduler.consume(tokens)
+            output = self.llm.with_structured_output(
+                schema, include_raw=True
+            ).invoke(messages)
+            result = self._parse_structured(reservation, output)
+
+            if use_cache:
+                self.response_cache.set(key, result.model_dump_json())
+            return result
+
+        return self._flight.do(key, call)
+
+    async def _acall_structured(
+        self,
+        messages: list,
+        schema: type[BaseModel],
+        tokens: int,
+        use_cache: bool = True,
+    ) -> BaseModel:
+        """
+        Async version of ``_call_structured``.
+
+        Args:
+            messages: Formatted chat messages
+            schema: Pydantic model to parse the response into
+            tokens: Tokens to reserve from the budget on a miss
+            use_cache: Whether to read and write the response cache
+
+        Returns:
+            Parsed response
+        """
+        key = self._structured_key(schema, messages)
+        if use_cache:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return schema.model_validate_json(cached)
+
+        async def call() -> BaseModel:
+            reservation = await self.scheduler.aconsume(tokens)
+            output = await self.llm.with_structured_output(
+                schema, include_raw=True
+            ).ainvoke(messages)
+            result = self._parse_structured(reservation, output)
+
+            if use_cache:
+                self.response_cache.set(key, result.model_dump_json())
+            return result
+
+        return await self._aflight.do(key, call)
+
+    def _plan_messages(
+        self, query: str, outline: list[str] | None = None, feedback: str | None = None
+    ) -> tuple[list, int]:
+        """
+        Build the planner messages and the tokens to reserve for them.
 
         Args:
             query: The research question
+            outline: Current outline, when revising it
+            feedback: The user's feedback on ``outline``
 
         Returns:
-            List of outline points
+            Tuple of (messages, tokens to reserve)
         """
         messages = self.config.PLANNER_PROMPT.format_messages(query=query)
+        if outline and feedback:
+            messages.append(
+                HumanMessage(
+                    content=plan_feedback_instructions.format(
+                        outline="\n".join(f"- {b}" for b in outline),
+                        feedback=feedback,
+                    )
+                )
+            )
         tokens = (
-            sum(self.counter.count(str(m.content)) for m in messages) #tokenizing the input
+            self.counter.count_messages(messages) #tokenizing the input
             + self.config.PLANNER_TOK
         )
-        self.limiter.consume(tokens)
+        return messages, tokens
+
+    @staticmethod
+    def _parse_outline(outline_text: str) -> list[str]:
+        """
+        Split the planner response into outline points.
 
-        # Get response and ensure we're working with a string
-        response = self.llm.invoke(messages)
-        outline_text = str(response.content) if response.content is not None else ""
+        Args:
+            outline_text: Raw planner response
 
+        Returns:
+            List of outline points
+        """
         return [
             line.lstrip("-• ").strip()
             for line in outline_text.splitlines()
             if line.strip()
         ]
 
-    def research(self, bullet: str) -> str:
+    @metrics.timed("plan")
+    def plan(
+        self,
+        query: str,
+        use_cache: bool = True,
+        outline: list[str] | None = None,
+        feedback: str | None = None,
+    ) -> list[str]:
         """
-        Gather evidence for a specific outline point.
+        Create a structured outline for the research topic.
 
         Args:
-            bullet: The outline point to research
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
+            outline: Current outline, to revise instead of planning afresh
+            feedback: The user's feedback on ``outline``
 
         Returns:
-            Combined search results as text
+            List of outline points
         """
-        hits = self.search_tool.invoke(bullet)
-        
-        combined = "\n".join(f"{h.metadata['title']} – {h.page_content}" for h in hits)
-        return combined
+        messages, tokens = self._plan_messages(query, outline, feedback)
+        outline_text = self._call_llm(messages, tokens, use_cache)
+        return self._parse_outline(outline_text)
 
-    def write(self, query: str, outline: list[str], sources: dict[str, str]) -> str:
+    @metrics.timed("plan")
+    async def aplan(
+        self,
+        query: str,
+        use_cache: bool = True,
+        outline: list[str] | None = None,
+        feedback: str | None = None,
+    ) -> list[str]:
         """
-        Draft the final research document using the outline and sources.
+        Async version of ``plan``.
 
         Args:
-            query: The original research question
-            outline: List of outline points
-            sources: Dictionary mapping outline points to their research data
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
+            outline: Current outline, to revise instead of planning afresh
+            feedback: The user's feedback on ``outline``
 
         Returns:
-            Completed research document
+            List of outline points
         """
-        draft_instructions = f"Question: {query}\n\n"
-        for n, bullet in enumerate(outline, 1):
-            draft_instructions += f"Section {n}: {bullet}\n{sources[bullet]}\n\n"
-        messages = self.config.WRITER_PROMPT.format_messages(
-            draft_instructions=draft_instructions
-        )
-        tokens_needed = (
-            sum(self.counter.count(str(m.content)) for m in messages)
-            + self.config.WRITER_TOK
-        )
-        self.limiter.consume(tokens_needed)
-
-        # Get response and ensure we're working with a string
-        response = self.llm.invoke(messages)
-        result = str(response.content) if response.content is not None else ""
-
-        # Extract sources from the research results
-        source_links = []
-        for bullet, content in sources.items():
-            # Extract URLs from the content
-            lines = content.split('\n')
-            for line in lines:
-                if 'http' in line:
-                    # Extract the URL from the line
-                    url_start = line.find('http')
-                    if url_start != -1:
-                        url_end = line.find(' ', url_start)
-                        if url_end == -1:
-                            url_end = len(line)
-                        url = line[url_start:url_end].strip()
-                        if url not in source_links:
-                            source_links.append(url)
-
-        # Add sources to the output if they exist
-        if source_links:
-            result += "\n\n<sources>\n" + "\n".join(source_links) + "\n</sources>"
-
-        return result
+        messages, tokens = self._plan_messages(query, outline, feedback)
+        outline_text = await self._acall_llm(messages, tokens, use_cache)
+        return self._parse_outline(outline_text)
 
-    def deep_research(self, query: str) -> str:
+    @classmethod
+    def _split_outline(cls, buffer: str) -> tuple[list[str], str]:
         """
-        Execute the complete research pipeline.
+        Take the outline points whose lines are complete off streamed text.
 
         Args:
-            query: The research question to answer
+            buffer: Planner text received and not yet parsed
 
         Returns:
-            Complete research report
+            Tuple of (complete outline points, unfinished last line)
         """
-        outline = self.plan(query)
-        evidence = {b: self.research(b) for b in outline}
-        return self.write(query, outline, evidence)
+        *lines, rest = buffer.split("\n")
+        return cls._parse_outline("\n".join(lines)), rest
 
+    @metrics.timed("plan")
+    def stream_plan(self, query: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        Streaming version of ``plan`` built on ``ChatGroq.stream``.
 
-def main():
-    """
-    Run the research pipeline with command-line arguments.
-    """
-    parser = argparse.ArgumentParser(description="AI-powered research assistant")
-    parser.add_argument(
-        "query", nargs="?", default=None, help="Research question to investigate"
-    )
-    args = parser.parse_args()
+        Each outline point is yielded as soon as its line is complete. The
+        points are the ones ``plan`` returns, and both share cached outlines.
 
-    # If no query provided, prompt the user
-    query = args.query
-    if not query:
-        query = input("Enter your research question: ")
+        Args:
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
 
-    if not query.strip():
-        print("Error: Research question cannot be empty")
-        return
+        Yields:
+            Outline points, in order
+        """
+        messages, tokens = self._plan_messages(query)
+        key = self._response_key(messages)
+        cached = self.response_cache.get(key) if use_cache else None
+        if cached is not None:
+            yield from self._parse_outline(cached)
+            return
 
-    # Run the pipeline
-    researcher = ResearchPipeline()
-    print(f"\nResearching: {query}\n")
-    print("Working...\n")
-    result = researcher.deep_research(query)
-    print("\n" + "=" * 50 + " RESEARCH REPORT " + "=" * 50 + "\n")
-    print(result)
-    print("\n" + "=" * 120)
+        reservation = self.scheduler.consume(tokens)
+        response, parts, buffer = None, [], ""
+        for chunk in self.llm.stream(messages):
+            response = chunk if response is None else response + chunk
+            if chunk.content:
+                parts.append(str(chunk.content))
+                bullets, buffer = self._split_outline(buffer + parts[-1])
+                yield from bullets
+        yield from self._parse_outline(buffer)
+        self._record_usage(reservation, response)
+        if use_cache:
+            self.response_cache.set(key, "".join(parts))
+
+    @metrics.timed("plan")
+    async def astream_plan(
+        self, query: str, use_cache: bool = True
+    ) -> AsyncIterator[str]:
+        """
+        Async version of ``stream_plan``.
+
+        Args:
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
+
+        Yields:
+            Outline points, in order
+        """
+        messages, tokens = self._plan_messages(query)
+        key = self._response_key(messages)
+        cached = self.response_cache.get(key) if use_cache else None
+        if cached is not None:
+            for bullet in self._parse_outline(cached):
+                yield bullet
+            return
+
+        reservation = await self.scheduler.aconsume(tokens)
+        response, parts, buffer = None, [], ""
+        async for chunk in self.llm.astream(messages):
+            response = chunk if response is None else response + chunk
+            if chunk.content:
+                parts.append(str(chunk.content))
+                bullets, buffer = self._split_outline(buffer + parts[-1])
+                for bullet in bullets:
+                    yield bullet
+        for bullet in self._parse_outline(buffer):
+            yield bullet
+        self._record_usage(reservation, response)
+        if use_cache:
+            self.response_cache.set(key, "".join(parts))
+
+    def _prefetch(self, bullet: str):
+        """
+        Search an outline point ahead of ``research_all``.
+
+        Args:
+            bullet: Outline point
+        """
+        try:
+            self.search_tool.invoke(bullet)
+        except Exception as e:
+            print(f"Prefetch failed for '{bullet}': {e}")
+
+    def plan_and_prefetch(self, query: str, use_cache: bool = True) -> list[str]:
+        """
+        Plan with ``stream_plan``, starting each point's search as soon as
+        the point arrives.
+
+        The searches finish in the search cache in the background.
+        ``research_all`` picks up their results, or joins the ones still in
+        flight, so planning overlaps evidence gathering instead of preceding
+        it. Only useful when every point is its own query, i.e. without
+        ``Config.MULTI_QUERY``.
+
+        Args:
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
+
+        Returns:
+            List of outline points
+        """
+        pool = ThreadPoolExecutor(max_workers=max(1, self.config.RESEARCH_CONCURRENCY))
+        outline = []
+        try:
+            for bullet in self.stream_plan(query, use_cache):
+                outline.append(bullet)
+                _submit(pool, self._prefetch, bullet)
+        finally:
+            pool.shutdown(wait=False)
+        return outline
+
+    async def aplan_and_prefetch(self, query: str, use_cache: bool = True) -> list[str]:
+        """
+        Async version of ``plan_and_prefetch``.
+
+        Args:
+            query: The research question
+            use_cache: Whether an identical earlier outline may be reused
+
+        Returns:
+            List of outline points
+        """
+        semaphore = asyncio.Semaphore(max(1, self.config.RESEARCH_CONCURRENCY))
+
+        async def prefetch(bullet: str):
+            async with semaphore:
+                try:
+                    await self.search_tool.ainvoke(bullet)
+                except Exception as e:
+                    print(f"Prefetch failed for '{bullet}': {e}")
+
+        outline = []
+        async for bullet in self.astream_plan(query, use_cache):
+            outline.append(bullet)
+            # keep a reference so the task is not collected mid-search
+            task = asyncio.ensure_future(prefetch(bullet))
+            self._prefetching.add(task)
+            task.add_done_callback(self._prefetching.discard)
+        return outline
+
+    def _query_messages(self, query: str, outline: list[str]) -> tuple[list, int]:
+        """
+        Build the messages for writing search queries for a whole outline.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+
+        Returns:
+            Tuple of (messages, tokens to reserve)
+        """
+        messages = [
+            SystemMessage(
+                content=outline_query_writer_instructions.format(
+                    topic=query,
+                    outline="\n".join(f"- {b}" for b in outline),
+                    number_of_queries=self.config.QUERIES_PER_SECTION,
+                )
+            ),
+            HumanMessage(
+                content="Generate search queries for every section of the outline."
+            ),
+        ]
+        return messages, self.counter.count_messages(messages) + self.config.WRITER_TOK
+
+    def _match_queries(
+        self, outline: list[str], generated: OutlineQueries
+    ) -> dict[str, list[str]]:
+        """
+        Assign generated queries to outline points.
+
+        Entries are matched by section text, falling back to their position
+        when the model rewords a section. Points left without queries are
+        searched as-is.
+
+        Args:
+            outline: List of outline points
+            generated: Structured output of the query writer
+
+        Returns:
+            Dictionary mapping outline points to their search queries
+        """
+        by_name = {normalize_query(s.section): s for s in generated.sections}
+        queries = {}
+        for n, bullet in enumerate(outline):
+            entry = by_name.get(normalize_query(bullet))
+            if entry is None and n < len(generated.sections):
+                entry = generated.sections[n]
+            found = (
+                [q.search_query for q in entry.queries if q.search_query.strip()]
+                if entry
+                else []
+            )
+            queries[bullet] = found[: self.config.QUERIES_PER_SECTION] or [bullet]
+        return queries
+
+    @metrics.timed("queries")
+    def plan_queries(
+        self, query: str, outline: list[str], use_cache: bool = True
+    ) -> dict[str, list[str]]:
+        """
+        Write search queries for every outline point in a single LLM call.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            use_cache: Whether a cached result may be reused
+
+        Returns:
+            Dictionary mapping outline points to their search queries; each
+            point is its own query if query writing fails
+        """
+        messages, tokens = self._query_messages(query, outline)
+        try:
+            generated = self._call_structured(
+                messages, OutlineQueries, tokens, use_cache
+            )
+        except Exception as e:
+            print(f"Query writing failed, searching outline points directly: {e}")
+            return {b: [b] for b in outline}
+        return self._match_queries(outline, generated)
+
+    @metrics.timed("queries")
+    async def aplan_queries(
+        self, query: str, outline: list[str], use_cache: bool = True
+    ) -> dict[str, list[str]]:
+        """
+        Async version of ``plan_queries``.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            use_cache: Whether a cached result may be reused
+
+        Returns:
+            Dictionary mapping outline points to their search queries
+        """
+        messages, tokens = self._query_messages(query, outline)
+        try:
+            generated = await self._acall_structured(
+                messages, OutlineQueries, tokens, use_cache
+            )
+        except Exception as e:
+            print(f"Query writing failed, searching outline points directly: {e}")
+            return {b: [b] for b in outline}
+        return self._match_queries(outline, generated)
+
+    @staticmethod
+    def _merge_sources(record_lists: list[list[Source]]) -> list[Source]:
+        """
+        Merge evidence records, keeping the first one per URL.
+
+        Args:
+            record_lists: Evidence records from several searches
+
+        Returns:
+            Evidence records with distinct URLs, in order
+        """
+        merged: dict[str, Source] = {}
+        for records in record_lists:
+            for record in records:
+                merged.setdefault(record.url or record.content, record)
+        return list(merged.values())
+
+    @classmethod
+    def _to_sources(cls, hit_lists: list[list]) -> list[Source]:
+        """
+        Turn the results of one or more searches into evidence records.
+
+        Hits are merged by URL, so a page returned by several queries is
+        only cited once.
+
+        Args:
+            hit_lists: Documents returned by each search
+
+        Returns:
+            Evidence records with distinct URLs, in query order
+        """
+        return cls._merge_sources(
+            [
+                [
+                    Source(
+                        url=h.metadata.get("source", ""),
+                        title=h.metadata.get("title", ""),
+                        score=h.metadata.get("score"),
+                        content=h.page_content,
+                    )
+                    for h in hits
+                ]
+                for hits in hit_lists
+            ]
+        )
+
+    @staticmethod
+    def _format_evidence(records: list[Source]) -> str:
+        """
+        Combine evidence records into the text given to the writer.
+
+        Args:
+            records: Evidence records for one outline point
+
+        Returns:
+            Combined search results as text
+        """
+        return "\n".join(f"{r.title} – {r.content}" for r in records)
+
+    @staticmethod
+    def citations(evidence: dict[str, list[Source]]) -> list[Source]:
+        """
+        Collect the distinct sources behind a report.
+
+        Args:
+            evidence: Dictionary mapping outline points to their evidence records
+
+        Returns:
+            One record per URL, in order of first appearance
+        """
+        cited: dict[str, Source] = {}
+        for records in evidence.values():
+            for record in records:
+                if record.url:
+                    cited.setdefault(record.url, record)
+        return list(cited.values())
+
+    @staticmethod
+    def _search_plan(
+        outline: list[str], queries: dict[str, list[str]] | None
+    ) -> tuple[dict[str, list[str]], list[str]]:
+        """
+        Work out which searches an outline needs.
+
+        Args:
+            outline: List of outline points
+            queries: Optional search queries per outline point; a point
+                without any is searched as-is
+
+        Returns:
+            Tuple of (queries per distinct outline point, distinct queries)
+        """
+        plan = {
+            b: list(dict.fromkeys((queries or {}).get(b) or [b]))
+            for b in dict.fromkeys(outline)
+        }
+        return plan, list(dict.fromkeys(q for qs in plan.values() for q in qs))
+
+    def research(self, bullet: str, queries: list[str] | None = None) -> list[Source]:
+        """
+        Gather evidence for a specific outline point.
+
+        Args:
+            bullet: The outline point to research
+            queries: Search queries to run instead of the point itself
+
+        Returns:
+            Evidence records, one per distinct URL
+        """
+        hit_lists = [self.search_tool.invoke(q) for q in queries or [bullet]]
+        return self._to_sources(hit_lists)
+
+    async def aresearch(
+        self, bullet: str, queries: list[str] | None = None
+    ) -> list[Source]:
+        """
+        Async version of ``research``.
+
+        Args:
+            bullet: The outline point to research
+            queries: Search queries to run instead of the point itself
+
+        Returns:
+            Evidence records, one per distinct URL
+        """
+        hit_lists = await asyncio.gather(
+            *(self.search_tool.ainvoke(q) for q in queries or [bullet])
+        )
+        return self._to_sources(hit_lists)
+
+    @metrics.timed("research")
+    def research_all(
+        self,
+        outline: list[str],
+        on_progress: Callable[[int, int, str, list[Source]], None] | None = None,
+        queries: dict[str, list[str]] | None = None,
+    ) -> dict[str, list[Source]]:
+        """
+        Gather evidence for every outline point concurrently.
+
+        Every search across the outline runs as one batch on a thread pool
+        capped at ``Config.RESEARCH_CONCURRENCY``, and each point's results
+        are merged by URL once its last search finishes. A failed search
+        contributes no hits instead of aborting the others.
+
+        Args:
+            outline: List of outline points
+            on_progress: Optional callback called as
+                ``(done, total, bullet, evidence)`` each time a bullet finishes
+            queries: Optional search queries per outline point, e.g. from
+                ``plan_queries``; by default each point is its own query
+
+        Returns:
+            Dictionary mapping outline points to their evidence records, in
+            outline order
+        """
+        if not outline:
+            return {}
+
+        plan, unique = self._search_plan(outline, queries)
+        waiting = {q: [b for b, qs in plan.items() if q in qs] for q in unique}
+        remaining = {b: len(qs) for b, qs in plan.items()}
+        hits: dict[str, list] = {}
+        results: dict[str, list[Source]] = {}
+        workers = max(1, min(self.config.RESEARCH_CONCURRENCY, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {_submit(pool, self.search_tool.invoke, q): q for q in unique}
+            for future in as_completed(futures):
+                q = futures[future]
+                try:
+                    hits[q] = future.result()
+                except Exception as e:
+                    print(f"Research failed for '{q}': {e}")
+                    hits[q] = []
+                for bullet in waiting[q]:
+                    remaining[bullet] -= 1
+                    if remaining[bullet]:
+                        continue
+                    results[bullet] = self._to_sources([hits[x] for x in plan[bullet]])
+                    if on_progress is not None:
+                        on_progress(len(results), len(plan), bullet, results[bullet])
+
+        return {b: results[b] for b in outline}
+
+    @metrics.timed("research")
+    async def aresearch_all(
+        self,
+        outline: list[str],
+        on_progress: Callable[[int, int, str, list[Source]], None] | None = None,
+        queries: dict[str, list[str]] | None = None,
+    ) -> dict[str, list[Source]]:
+        """
+        Async version of ``research_all``.
+
+        Concurrency is capped with a semaphore instead of a thread pool, so
+        many jobs can share one event loop.
+
+        Args:
+            outline: List of outline points
+            on_progress: Optional callback called as
+                ``(done, total, bullet, evidence)`` each time a bullet finishes
+            queries: Optional search queries per outline point, e.g. from
+                ``aplan_queries``; by default each point is its own query
+
+        Returns:
+            Dictionary mapping outline points to their evidence records, in
+            outline order
+        """
+        plan, unique = self._search_plan(outline, queries)
+        semaphore = asyncio.Semaphore(max(1, self.config.RESEARCH_CONCURRENCY))
+        done = 0
+
+        async def search(q: str) -> list:
+            async with semaphore:
+                try:
+                    return await self.search_tool.ainvoke(q)
+                except Exception as e:
+                    print(f"Research failed for '{q}': {e}")
+                    return []
+
+        # every distinct query is searched once, however many points share it
+        searches = {q: asyncio.ensure_future(search(q)) for q in unique}
+
+        async def gather_one(bullet: str) -> list[Source]:
+            nonlocal done
+            hit_lists = await asyncio.gather(*(searches[q] for q in plan[bullet]))
+            result = self._to_sources(hit_lists)
+            done += 1
+            if on_progress is not None:
+                on_progress(done, len(plan), bullet, result)
+            return result
+
+        results = await asyncio.gather(*(gather_one(b) for b in plan))
+        found = dict(zip(plan, results, strict=True))
+        return {b: found[b] for b in outline}
+
+    def compact(
+        self, outline: list[str], evidence: dict[str, list[Source]]
+    ) -> dict[str, list[Source]]:
+        """
+        Deduplicate and trim evidence so the write prompt fits its token envelope.
+
+        Args:
+            outline: List of outline points
+            evidence: Dictionary mapping outline points to their evidence records
+
+        Returns:
+            Compacted evidence, at most ``Config.EVIDENCE_TOK`` tokens in total
+        """
+        return self.compactor.compact(outline, evidence, self.config.EVIDENCE_TOK)
+
+    def _draft_messages(
+        self, query: str, outline: list[str], sources: dict[str, list[Source]]
+    ) -> tuple[list, int]:
+        """
+        Build the writer messages and the tokens to reserve for them.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+
+        Returns:
+            Tuple of (messages, tokens to reserve)
+        """
+        draft_instructions = f"Question: {query}\n\n"
+        for n, bullet in enumerate(outline, 1):
+            draft_instructions += (
+                f"Section {n}: {bullet}\n{self._format_evidence(sources[bullet])}\n\n"
+            )
+        messages = self.config.WRITER_PROMPT.format_messages(
+            draft_instructions=draft_instructions
+        )
+        tokens_needed = (
+            self.counter.count_messages(messages)
+            + self.config.WRITER_TOK
+        )
+        return messages, tokens_needed
+
+    @classmethod
+    def _append_sources(cls, result: str, sources: dict[str, list[Source]]) -> str:
+        """
+        Append the URLs of the cited sources to the report.
+
+        Args:
+            result: The drafted report
+            sources: Dictionary mapping outline points to their evidence records
+
+        Returns:
+            Report with a ``<sources>`` block if there are any sources
+        """
+        source_links = [s.url for s in cls.citations(sources)]
+        if source_links:
+            result += "\n\n<sources>\n" + "\n".join(source_links) + "\n</sources>"
+        return result
+
+    @metrics.timed("write")
+    def write(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Draft the final research document using the outline and sources.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Completed research document
+        """
+        messages, tokens_needed = self._draft_messages(query, outline, sources)
+        result = self._call_llm(messages, tokens_needed, use_cache)
+        return self._append_sources(result, sources)
+
+    @metrics.timed("write")
+    async def awrite(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Async version of ``write``.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Completed research document
+        """
+        messages, tokens_needed = self._draft_messages(query, outline, sources)
+        result = await self._acall_llm(messages, tokens_needed, use_cache)
+        return self._append_sources(result, sources)
+
+    @metrics.timed("write")
+    def stream_write(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+    ) -> Iterator[str]:
+        """
+        Streaming version of ``write`` built on ``ChatGroq.stream``.
+
+        Joining the yielded chunks gives the same document ``write`` returns.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+            use_cache: Whether an identical earlier draft may be reused
+
+        Yields:
+            Report text as it is generated, then the sources block
+        """
+        messages, tokens_needed = self._draft_messages(query, outline, sources)
+        key = self._response_key(messages)
+        cached = self.response_cache.get(key) if use_cache else None
+        if cached is not None:
+            yield cached
+        else:
+            reservation = self.scheduler.consume(tokens_needed)
+            response, parts = None, []
+            for chunk in self.llm.stream(messages):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    parts.append(str(chunk.content))
+                    yield parts[-1]
+            self._record_usage(reservation, response)
+            if use_cache:
+                self.response_cache.set(key, "".join(parts))
+
+        sources_block = self._append_sources("", sources)
+        if sources_block:
+            yield sources_block
+
+    @metrics.timed("write")
+    async def astream_write(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+    ) -> AsyncIterator[str]:
+        """
+        Async version of ``stream_write``.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+            use_cache: Whether an identical earlier draft may be reused
+
+        Yields:
+            Report text as it is generated, then the sources block
+        """
+        messages, tokens_needed = self._draft_messages(query, outline, sources)
+        key = self._response_key(messages)
+        cached = self.response_cache.get(key) if use_cache else None
+        if cached is not None:
+            yield cached
+        else:
+            reservation = await self.scheduler.aconsume(tokens_needed)
+            response, parts = None, []
+            async for chunk in self.llm.astream(messages):
+                response = chunk if response is None else response + chunk
+                if chunk.content:
+                    parts.append(str(chunk.content))
+                    yield parts[-1]
+            self._record_usage(reservation, response)
+            if use_cache:
+                self.response_cache.set(key, "".join(parts))
+
+        sources_block = self._append_sources("", sources)
+        if sources_block:
+            yield sources_block
+
+    def _section_messages(
+        self, query: str, section: Section, evidence: str
+    ) -> tuple[list, int]:
+        """
+        Build the messages for drafting one researched section.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            evidence: Research data for this section
+
+        Returns:
+            Tuple of (messages, tokens to reserve)
+        """
+        messages = [
+            SystemMessage(content=section_writer_instructions),
+            HumanMessage(
+                content=section_writer_inputs.format(
+                    topic=query,
+                    section_name=section.name,
+                    section_topic=section.description,
+                    section_content=section.content,
+                    context=evidence,
+                )
+            ),
+        ]
+        return messages, self.counter.count_messages(messages) + self.config.SECTION_TOK
+
+    def _final_section_messages(
+        self, query: str, section: Section, context: str
+    ) -> tuple[list, int]:
+        """
+        Build the messages for an introduction or conclusion.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            context: The already drafted research sections
+
+        Returns:
+            Tuple of (messages, tokens to reserve)
+        """
+        messages = [
+            SystemMessage(
+                content=final_section_writer_instructions.format(
+                    topic=query,
+                    section_name=section.name,
+                    section_topic=section.description,
+                    context=context,
+                )
+            ),
+            HumanMessage(
+                content="Generate a report section based on the provided sources."
+            ),
+        ]
+        return (
+            messages,
+            self.counter.count_messages(messages) + self.config.FINAL_SECTION_TOK,
+        )
+
+    @staticmethod
+    def _outline_sections(
+        query: str, outline: list[str]
+    ) -> tuple[list[Section], list[Section]]:
+        """
+        Turn an outline into researched sections plus the framing sections.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+
+        Returns:
+            Tuple of (researched sections, [introduction, conclusion])
+        """
+        body = [
+            Section(name=bullet, description=bullet, research=True, content="")
+            for bullet in outline
+        ]
+        framing = [
+            Section(
+                name="Introduction",
+                description=f"Brief overview of the topic: {query}",
+                research=False,
+                content="",
+            ),
+            Section(
+                name="Conclusion",
+                description=f"Concise summary of the report on: {query}",
+                research=False,
+                content="",
+            ),
+        ]
+        return body, framing
+
+    @staticmethod
+    def _join_sections(sections: list[Section]) -> str:
+        """
+        Join drafted sections into report text.
+
+        Args:
+            sections: Sections with content
+
+        Returns:
+            Section contents separated by blank lines
+        """
+        return "\n\n".join(s.content.strip() for s in sections if s.content.strip())
+
+    def write_section(
+        self, query: str, section: Section, evidence: str, use_cache: bool = True
+    ) -> Section:
+        """
+        Draft one researched section from its own evidence.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            evidence: Research data for this section
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Copy of the section with its content filled in
+        """
+        messages, tokens = self._section_messages(query, section, evidence)
+        content = self._call_llm(messages, tokens, use_cache, self.config.SECTION_TOK)
+        return section.model_copy(update={"content": content})
+
+    async def awrite_section(
+        self, query: str, section: Section, evidence: str, use_cache: bool = True
+    ) -> Section:
+        """
+        Async version of ``write_section``.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            evidence: Research data for this section
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Copy of the section with its content filled in
+        """
+        messages, tokens = self._section_messages(query, section, evidence)
+        content = await self._acall_llm(
+            messages, tokens, use_cache, self.config.SECTION_TOK
+        )
+        return section.model_copy(update={"content": content})
+
+    def write_final_section(
+        self, query: str, section: Section, context: str, use_cache: bool = True
+    ) -> Section:
+        """
+        Draft an introduction or conclusion from the finished sections.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            context: The already drafted research sections
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Copy of the section with its content filled in
+        """
+        messages, tokens = self._final_section_messages(query, section, context)
+        content = self._call_llm(
+            messages, tokens, use_cache, self.config.FINAL_SECTION_TOK
+        )
+        return section.model_copy(update={"content": content})
+
+    async def awrite_final_section(
+        self, query: str, section: Section, context: str, use_cache: bool = True
+    ) -> Section:
+        """
+        Async version of ``write_final_section``.
+
+        Args:
+            query: The original research question
+            section: Section to draft
+            context: The already drafted research sections
+            use_cache: Whether an identical earlier draft may be reused
+
+        Returns:
+            Copy of the section with its content filled in
+        """
+        messages, tokens = self._final_section_messages(query, section, context)
+        content = await self._acall_llm(
+            messages, tokens, use_cache, self.config.FINAL_SECTION_TOK
+        )
+        return section.model_copy(update={"content": content})
+
+    def _grade_messages(self, query: str, section: Section) -> tuple[list, int]:
+        """
+        Build the messages for grading a drafted section.
+
+        Args:
+            query: The original research question
+            section: Drafted section
+
+        Returns:
+            Tuple of (messages, tokens to reserve)
+        """
+        messages = [
+            SystemMessage(
+                content=section_grader_instructions.format(
+                    topic=query,
+                    section_topic=section.description,
+                    section=section.content,
+                    number_of_follow_up_queries=self.config.FOLLOW_UP_QUERIES,
+                )
+            ),
+            HumanMessage(
+                content=(
+                    "Grade the report and consider follow-up questions for missing "
+                    "information."
+                )
+            ),
+        ]
+        return messages, self.counter.count_messages(messages) + self.config.GRADER_TOK
+
+    async def agrade_section(
+        self, query: str, section: Section, use_cache: bool = True
+    ) -> Feedback:
+        """
+        Grade a drafted section and suggest follow-up searches if it falls short.
+
+        Args:
+            query: The original research question
+            section: Drafted section
+            use_cache: Whether an identical earlier grade may be reused
+
+        Returns:
+            Pass/fail grade with follow-up queries
+        """
+        messages, tokens = self._grade_messages(query, section)
+        return await self._acall_structured(messages, Feedback, tokens, use_cache)
+
+    @metrics.timed("reflect")
+    async def _arefine_sections(
+        self,
+        query: str,
+        states: dict[str, SectionState],
+        evidence: dict[str, list[Source]],
+        use_cache: bool = True,
+    ):
+        """
+        Grade drafted sections and re-research only the ones that fail.
+
+        Each round grades the pending sections concurrently, runs every
+        follow-up query of the failing ones concurrently, and redrafts just
+        those sections. It stops when everything passes, after
+        ``Config.MAX_SEARCH_DEPTH`` rounds, or once grading and redrafting
+        have cost ``Config.REFLECTION_TOKEN_CAP`` tokens.
+
+        Args:
+            query: The original research question
+            states: Section states keyed by outline point, updated in place
+            evidence: Evidence records keyed by outline point, extended in
+                place with what the follow-up searches find
+            use_cache: Whether cached LLM responses may be reused
+        """
+        allotment = self.config.EVIDENCE_TOK // max(1, len(states))
+        pending = [
+            b for b, state in states.items()
+            if state["search_iterations"] < self.config.MAX_SEARCH_DEPTH
+        ]
+        spent = 0
+        while pending and spent < self.config.REFLECTION_TOKEN_CAP:
+            grades = await asyncio.gather(
+                *(
+                    self.agrade_section(query, states[b]["section"], use_cache)
+                    for b in pending
+                )
+            )
+            spent += sum(
+                self._grade_messages(query, states[b]["section"])[1] for b in pending
+            )
+
+            failed = [
+                (bullet, feedback.follow_up_queries)
+                for bullet, feedback in zip(pending, grades, strict=True)
+                if feedback.grade == "fail" and feedback.follow_up_queries
+            ]
+            if not failed:
+                break
+
+            # one batch, so the research concurrency limit covers every section
+            found = await self.aresearch_all(
+                list(dict.fromkeys(q.search_query for _, qs in failed for q in qs))
+            )
+            for bullet, queries in failed:
+                state = states[bullet]
+                combined = self._merge_sources(
+                    [evidence[bullet], *(found[q.search_query] for q in queries)]
+                )
+                evidence[bullet] = self.compactor.compact(
+                    [bullet], {bullet: combined}, allotment
+                )[bullet]
+                state["source_str"] = self._format_evidence(evidence[bullet])
+                state["search_queries"] = state["search_queries"] + queries
+                state["search_iterations"] += 1
+
+            pending = [bullet for bullet, _ in failed]
+            redrafts = await asyncio.gather(
+                *(
+                    self.awrite_section(
+                        query, states[b]["section"], states[b]["source_str"], use_cache
+                    )
+                    for b in pending
+                )
+            )
+            spent += sum(
+                self._section_messages(
+                    query, states[b]["section"], states[b]["source_str"]
+                )[1]
+                for b in pending
+            )
+            for bullet, section in zip(pending, redrafts, strict=True):
+                states[bullet]["section"] = section
+            # a section at the depth limit keeps its last draft ungraded
+            pending = [
+                b for b in pending
+                if states[b]["search_iterations"] < self.config.MAX_SEARCH_DEPTH
+            ]
+
+    @metrics.timed("write")
+    def write_sections(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+    ) -> str:
+        """
+        Draft the report section by section instead of in one call.
+
+        Every researched section is drafted concurrently from its own
+        evidence, then the introduction and conclusion are written from the
+        drafted sections without further research.
+
+        With ``Config.REFLECTION`` on, drafted sections are graded and the
+        failing ones re-researched and redrafted before the final pass.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence records
+            use_cache: Whether identical earlier drafts may be reused
+
+        Returns:
+            Completed research document
+        """
+        if self.config.REFLECTION:
+            # the grading loop is built on the async stages
+            return asyncio.run(self.awrite_sections(query, outline, sources, use_cache))
+
+        body, framing = self._outline_sections(query, outline)
+        workers = max(1, min(self.config.RESEARCH_CONCURRENCY, len(body)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            drafts = [
+                _submit(
+                    pool,
+                    self.write_section,
+                    query,
+                    s,
+                    self._format_evidence(sources[s.name]),
+                    use_cache,
+                )
+                for s in body
+            ]
+            completed = [draft.result() for draft in drafts]
+            context = self._join_sections(completed)
+            framed = [
+                _submit(pool, self.write_final_section, query, s, context, use_cache)
+                for s in framing
+            ]
+            intro, conclusion = (f.result() for f in framed)
+
+        report = self._join_sections([intro, *completed, conclusion])
+        return self._append_sources(report, sources)
+
+    @metrics.timed("write")
+    async def awrite_sections(
+        self,
+        query: str,
+        outline: list[str],
+        sources: dict[str, list[Source]],
+        use_cache: bool = True,
+        on_section: Callable[[int, int, Section], None] | None = None,
+        drafted: dict[str, Section] | None = None,
+    ) -> str:
+        """
+        Async version of ``write_sections``.
+
+        Args:
+            query: The original research question
+            outline: List of outline points
+            sources: Dictionary mapping outline points to their evidence
+                records; with ``Config.REFLECTION`` on, follow-up evidence is
+                added in place so ``citations`` covers it
+            use_cache: Whether identical earlier drafts may be reused
+            on_section: Optional callback called as ``(done, total, section)``
+                each time a researched section is drafted
+            drafted: Sections drafted by an earlier, interrupted run, keyed by
+                outline point; they are reused instead of drafted again
+
+        Returns:
+            Completed research document
+        """
+        body, framing = self._outline_sections(query, outline)
+        drafted = drafted or {}
+        done = sum(1 for section in body if section.name in drafted)
+
+        async def draft(section: Section) -> Section:
+            nonlocal done
+            if section.name in drafted:
+                return drafted[section.name]
+            completed = await self.awrite_section(
+                query, section, self._format_evidence(sources[section.name]), use_cache
+            )
+            done += 1
+            if on_section is not None:
+                on_section(done, len(body), completed)
+            return completed
+
+        completed = await asyncio.gather(*(draft(s) for s in body))
+
+        if self.config.REFLECTION:
+            states: dict[str, SectionState] = {
+                section.name: {
+                    "topic": query,
+                    "section": section,
+                    "search_iterations": 1,
+                    "search_queries": [SearchQuery(search_query=section.name)],
+                    "source_str": self._format_evidence(sources[section.name]),
+                    "report_sections_from_research": "",
+                    "completed_sections": [],
+                }
+                for section in completed
+            }
+            await self._arefine_sections(query, states, sources, use_cache)
+            completed = [states[s.name]["section"] for s in body]
+
+        context = self._join_sections(completed)
+        intro, conclusion = await asyncio.gather(
+            *(self.awrite_final_section(query, s, context, use_cache) for s in framing)
+        )
+
+        report = self._join_sections([intro, *completed, conclusion])
+        return self._append_sources(report, sources)
+
+    def deep_research(self, query: str, use_cache: bool = True) -> str:
+        """
+        Execute the complete research pipeline.
+
+        Args:
+            query: The research question to answer
+            use_cache: Whether cached LLM responses may be reused
+
+        Returns:
+            Complete research report
+        """
+        if self.config.STREAM_PLAN and not self.config.MULTI_QUERY:
+            outline = self.plan_and_prefetch(query, use_cache)
+        else:
+            outline = self.plan(query, use_cache)
+        queries = None
+        if self.config.MULTI_QUERY:
+            queries = self.plan_queries(query, outline, use_cache)
+        evidence = self.research_all(outline, queries=queries)
+        evidence = self.compact(outline, evidence)
+        if self.config.WRITE_MODE == "sections":
+            return self.write_sections(query, outline, evidence, use_cache)
+        return self.write(query, outline, evidence, use_cache)
+
+    async def adeep_research(self, query: str, use_cache: bool = True) -> str:
+        """
+        Async version of ``deep_research``.
+
+        Args:
+            query: The research question to answer
+            use_cache: Whether cached LLM responses may be reused
+
+        Returns:
+            Complete research report
+        """
+        if self.config.STREAM_PLAN and not self.config.MULTI_QUERY:
+            outline = await self.aplan_and_prefetch(query, use_cache)
+        else:
+            outline = await self.aplan(query, use_cache)
+        queries = None
+        if self.config.MULTI_QUERY:
+            queries = await self.aplan_queries(query, outline, use_cache)
+        evidence = await self.aresearch_all(outline, queries=queries)
+        evidence = self.compact(outline, evidence)
+        if self.config.WRITE_MODE == "sections":
+            return await self.awrite_sections(query, outline, evidence, use_cache)
+        return await self.awrite(query, outline, evidence, use_cache)
+
+
+def _parse_args() -> argparse.Namespace:
+    """
+    Parse command-line arguments.
+
+    Returns:
+        Parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="AI-powered research assistant")
+    parser.add_argument(
+        "query", nargs="?", default=None, help="Research question to investigate"
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="JSONL",
+        help="Research every query in a JSONL file ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--output", default="batch_results.jsonl",
+        help="Batch results file; finished queries in it are skipped on rerun",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=Config.BATCH_CONCURRENCY,
+        help="Batch queries in flight at once",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Run the pipeline stages concurrently on an asyncio event loop",
+    )
+    return parser.parse_args()
+
+
+def _read_query(args: argparse.Namespace) -> str | None:
+    """
+    Read the research question from the command line or prompt for it.
+
+    Args:
+        args: Parsed command-line arguments
+
+    Returns:
+        The research question, or None if it was empty
+    """
+    # If no query provided, prompt the user
+    query = args.query
+    if not query:
+        query = input("Enter your research question: ")
+
+    if not query.strip():
+        print("Error: Research question cannot be empty")
+        return None
+    return query
+
+
+def _print_report(result: str):
+    """
+    Print a finished research report.
+
+    Args:
+        result: Complete research report
+    """
+    print("\n" + "=" * 50 + " RESEARCH REPORT " + "=" * 50 + "\n")
+    print(result)
+    print("\n" + "=" * 120)
+
+
+def main():
+    """
+    Run the research pipeline with command-line arguments.
+    """
+    args = _parse_args()
+    if args.batch:
+        # only batch runs need the batch runner
+        import batch
+
+        batch.main(ResearchPipeline(), args.batch, args.output, args.concurrency)
+        return
+
+    # read the question before any event loop starts, since input() blocks
+    query = _read_query(args)
+    if query is None:
+        return
+    if args.use_async:
+        asyncio.run(amain(query))
+        return
+
+    # Run the pipeline
+    researcher = ResearchPipeline()
+    print(f"\nResearching: {query}\n")
+    print("Working...\n")
+    result = researcher.deep_research(query)
+    _print_report(result)
+
+
+async def amain(query: str):
+    """
+    Async entry point: run the research pipeline on the current event loop.
+
+    Args:
+        query: The research question to answer
+    """
+    researcher = ResearchPipeline()
+    print(f"\nResearching: {query}\n")
+    print("Working...\n")
+    result = await researcher.adeep_research(query)
+    _print_report(result)
 
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
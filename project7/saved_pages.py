@@ -0,0 +1,273 @@
+"""
+Storage and metadata index for saved research pages.
+
+Saved reports are stored as gzip-compressed JSON records and rendered when
+they are viewed, so a record never embeds a stale copy of the sidebar.
+Pages saved before that change are static ``.html`` files and are still
+served as-is.
+
+Listing saved pages used to mean opening every file in ``saved_pages/`` to
+read its ``<title>``. The index keeps id, title, creation time and size in a
+small SQLite database next to the pages. It is updated on every save and
+delete and rebuilt from disk only when it is missing.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+RECORD_SUFFIX = ".json.gz"
+HTML_SUFFIX = ".html"
+
+
+def record_path(directory: str, page_id: str) -> str:
+    """
+    Path of a saved report record.
+
+    Args:
+        directory: Directory holding the saved pages
+        page_id: Page id
+
+    Returns:
+        Path to the compressed JSON record
+    """
+    return os.path.join(directory, f"{page_id}{RECORD_SUFFIX}")
+
+
+def write_record(directory: str, record: dict) -> int:
+    """
+    Store a saved report as compressed JSON.
+
+    The file is written under a temporary name and moved into place, so a
+    reader never sees half a record.
+
+    Args:
+        directory: Directory holding the saved pages
+        record: Report with id, title, requirements, content, references
+            and created_at (a timestamp)
+
+    Returns:
+        Size of the stored record in bytes
+    """
+    path = record_path(directory, record['id'])
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(record, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def read_record(directory: str, page_id: str) -> dict | None:
+    """
+    Load a saved report.
+
+    Args:
+        directory: Directory holding the saved pages
+        page_id: Page id
+
+    Returns:
+        The record, or None if there is none
+    """
+    try:
+        with gzip.open(record_path(directory, page_id), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_title(file_path: str, fallback: str) -> str:
+    """
+    Pull the ``<title>`` out of a saved HTML page.
+
+    Args:
+        file_path: Path to the HTML file
+        fallback: Title to use if the page has none
+
+    Returns:
+        The page title
+    """
+    with open(file_path, encoding='utf-8') as f:
+        content = f.read()
+    title_start = content.find('<title>') + 7
+    title_end = content.find('</title>')
+    if title_start > 7 and title_end > title_start:
+        return content[title_start:title_end].strip()
+    return fallback
+
+
+class SavedPageIndex:
+    """
+    Persistent index of saved pages, newest first.
+    """
+
+    def __init__(self, directory: str, filename: str = "index.db"):
+        """
+        Open the index, rebuilding it from disk if it does not exist yet.
+
+        Args:
+            directory: Directory holding the saved pages
+            filename: Index file name inside that directory
+        """
+        self.directory = directory
+        path = os.path.join(directory, filename)
+        missing = not os.path.exists(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "id TEXT PRIMARY KEY, title TEXT NOT NULL, "
+                "created_at REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS pages_created ON pages (created_at)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)"
+            )
+        if missing:
+            self.rebuild()
+
+    def _touch(self):
+        # callers hold the lock inside a transaction
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('updated_at', ?)", (time.time(),)
+        )
+
+    def updated_at(self) -> float:
+        """
+        When the list of saved pages last changed.
+
+        Rendered pages include the sidebar, so this feeds their cache
+        validators.
+
+        Returns:
+            Timestamp of the last add, remove, clear or rebuild
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'updated_at'"
+            ).fetchone()
+        return row[0] if row else 0.0
+
+    def rebuild(self):
+        """
+        Re-scan the saved pages directory and replace the index contents.
+        """
+        rows = []
+        for filename in os.listdir(self.directory):
+            file_path = os.path.join(self.directory, filename)
+            if filename.endswith(HTML_SUFFIX):
+                page_id = filename[:-len(HTML_SUFFIX)]
+                rows.append((
+                    page_id,
+                    read_title(file_path, page_id),
+                    os.path.getctime(file_path),
+                    os.path.getsize(file_path),
+                ))
+            elif filename.endswith(RECORD_SUFFIX):
+                record = read_record(self.directory, filename[:-len(RECORD_SUFFIX)])
+                rows.append((
+                    record['id'],
+                    record['title'],
+                    record['created_at'],
+                    os.path.getsize(file_path),
+                ))
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+            self._conn.executemany("INSERT INTO pages VALUES (?, ?, ?, ?)", rows)
+            self._touch()
+
+    def add(self, page_id: str, title: str, created_at: datetime, size: int):
+        """
+        Record a newly saved page.
+
+        Args:
+            page_id: Page id
+            title: Page title
+            created_at: When the page was saved
+            size: File size in bytes
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (page_id, title, created_at.timestamp(), size),
+            )
+            self._touch()
+
+    def remove(self, page_id: str):
+        """
+        Forget a deleted page.
+
+        Args:
+            page_id: Page id
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+            self._touch()
+
+    def clear(self):
+        """
+        Forget every page.
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pages")
+            self._touch()
+
+    def count(self) -> int:
+        """
+        Number of saved pages.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def list(self, page: int = 1, per_page: int = 50) -> list[dict]:
+        """
+        One page of saved pages, newest first.
+
+        Args:
+            page: 1-based page number
+            per_page: Saved pages per page
+
+        Returns:
+            Dictionaries with id, title, created_at (datetime) and size
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, title, created_at, size FROM pages "
+                "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                (per_page, (max(page, 1) - 1) * per_page),
+            ).fetchall()
+        return [
+            {
+                'id': page_id,
+                'title': title,
+                'created_at': datetime.fromtimestamp(created_at),
+                'size': size,
+            }
+            for page_id, title, created_at, size in rows
+        ]
+
+    def next_sequence_number(self) -> int:
+        """
+        Next number for default titles like "Research #3".
+
+        Returns:
+            One more than the highest number in use, or 1
+        """
+        with self._lock:
+            titles = self._conn.execute(
+                "SELECT title FROM pages WHERE title LIKE 'Research #%'"
+            ).fetchall()
+        numbers = []
+        for (title,) in titles:
+            try:
+                numbers.append(int(title.split("#")[1]))
+            except (ValueError, IndexError):
+                pass
+        return max(numbers) + 1 if numbers else 1
@@ -0,0 +1,252 @@
+"""
+Priority- and fair-share scheduling of LLM calls over the shared token budget.
+
+``Budget`` on its own admits whichever call happens to retry first once the
+window has room, so one large report can keep the window full and leave a
+short interactive query sleeping behind it. ``TokenScheduler`` sits in front
+of the budget and decides who goes next. Calls wait in one queue and only the
+call at the head asks the budget for tokens. The head is chosen by:
+
+1. a call that has waited longer than ``max_wait``, oldest first, so nothing
+   starves
+2. job priority (``INTERACTIVE`` before ``BATCH``)
+3. with ``shortest_first``, the job's estimated remaining time
+4. fair share: the fewest tokens admitted to the user over the last few
+   budget windows, counting this call, so a small call goes before a large
+   one from an equally served user
+5. arrival order
+
+The job a call belongs to is read from a context variable set with
+``job_context``, so every LLM call the job makes, including those in tasks it
+spawns, is ranked without threading a parameter through the pipeline. Calls
+made outside a job rank as an anonymous interactive user.
+
+The queue is per process. Processes sharing a budget file still share its
+limit, but each orders only its own callers.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+
+class JobTicket:
+    """
+    What the scheduler knows about the job making a call.
+
+    The job may update ``priority`` and ``estimate`` while it runs; every
+    ranking reads the current values.
+    """
+
+    def __init__(
+        self,
+        user: str = "anonymous",
+        priority: int = INTERACTIVE,
+        estimate: float = 0.0,
+    ):
+        """
+        Describe a job.
+
+        Args:
+            user: Who the job runs for, for fair share
+            priority: ``INTERACTIVE`` or ``BATCH``; lower goes first
+            estimate: Expected seconds of work left, for shortest-first
+        """
+        self.user = user
+        self.priority = priority
+        self.estimate = estimate
+
+
+_ANONYMOUS = JobTicket()
+_current_ticket: ContextVar[JobTicket] = ContextVar(
+    "scheduler_ticket", default=_ANONYMOUS
+)
+
+
+@contextmanager
+def job_context(ticket: JobTicket) -> Iterator[JobTicket]:
+    """
+    Rank every LLM call made inside the block as part of ``ticket``'s job.
+
+    Args:
+        ticket: The job's ticket
+
+    Yields:
+        The ticket
+    """
+    token = _current_ticket.set(ticket)
+    try:
+        yield ticket
+    finally:
+        try:
+            _current_ticket.reset(token)
+        except ValueError:
+            # left in a different context than it was entered in
+            _current_ticket.set(_ANONYMOUS)
+
+
+class _Waiter:
+    """
+    One call waiting for tokens.
+    """
+
+    def __init__(
+        self, ticket: JobTicket, tokens: int, seq: int, wake: Callable[[], None]
+    ):
+        self.ticket = ticket
+        self.tokens = tokens
+        self.seq = seq
+        self.wake = wake
+        self.since = time.monotonic()
+
+
+class TokenScheduler:
+    """
+    Orders LLM calls in front of a ``Budget``.
+    """
+
+    POLL = 1.0  # seconds between rank checks for calls not at the head
+    SHARE_WINDOWS = 5  # budget windows of usage remembered for fair share
+
+    def __init__(self, budget, shortest_first: bool = False, max_wait: float = 120.0):
+        """
+        Put a scheduler in front of a budget.
+
+        Args:
+            budget: The pipeline's ``Budget``
+            shortest_first: Rank jobs by estimated remaining time before
+                fair share
+            max_wait: Seconds after which a waiting call goes first
+                regardless of priority
+        """
+        self.budget = budget
+        self.shortest_first = shortest_first
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        # tokens admitted per user over the last SHARE_WINDOWS windows
+        self._usage: dict[str, deque[tuple[float, int]]] = defaultdict(deque)
+
+    def _used(self, user: str, now: float) -> int:
+        # callers hold the lock
+        log = self._usage[user]
+        while log and log[0][0] <= now - self.budget.WINDOW * self.SHARE_WINDOWS:
+            log.popleft()
+        return sum(tokens for _, tokens in log)
+
+    def _rank(self, waiter: _Waiter, now: float) -> tuple:
+        if now - waiter.since >= self.max_wait:
+            return (0, waiter.since)
+        ticket = waiter.ticket
+        return (
+            1,
+            ticket.priority,
+            ticket.estimate if self.shortest_first else 0.0,
+            self._used(ticket.user, now) + waiter.tokens,
+            waiter.seq,
+        )
+
+    def _head(self) -> _Waiter | None:
+        # callers hold the lock
+        if not self._waiters:
+            return None
+        now = time.monotonic()
+        return min(self._waiters, key=lambda w: self._rank(w, now))
+
+    def _enter(self, tokens: int, wake: Callable[[], None]) -> _Waiter:
+        waiter = _Waiter(_current_ticket.get(), tokens, next(self._seq), wake)
+        with self._lock:
+            self._waiters.append(waiter)
+        return waiter
+
+    def _leave(self, waiter: _Waiter, admitted: bool):
+        with self._lock:
+            self._waiters.remove(waiter)
+            if admitted:
+                admitted_at = (time.monotonic(), waiter.tokens)
+                self._usage[waiter.ticket.user].append(admitted_at)
+            head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _try(self, waiter: _Waiter) -> tuple[int | None, float]:
+        with self._lock:
+            at_head = self._head() is waiter
+        if not at_head:
+            return None, self.POLL
+        return self.budget.try_acquire(waiter.tokens)
+
+    def consume(self, n_tokens: int) -> int:
+        """
+        Wait for this call's turn, then reserve tokens in the budget.
+
+        Args:
+            n_tokens: Number of tokens to consume
+
+        Returns:
+            Reservation id, for reporting the real usage with
+            ``Budget.record_usage``
+        """
+        event = threading.Event()
+        waiter = self._enter(n_tokens, event.set)
+        started = time.perf_counter()
+        admitted = False
+        try:
+            while True:
+                event.clear()
+                reservation, wait = self._try(waiter)
+                if reservation is not None:
+                    admitted = True
+                    self.budget.add_throttled(time.perf_counter() - started)
+                    return reservation
+                event.wait(wait)
+        finally:
+            self._leave(waiter, admitted)
+
+    async def aconsume(self, n_tokens: int) -> int:
+        """
+        Async version of ``consume`` that awaits instead of blocking.
+
+        Args:
+            n_tokens: Number of tokens to consume
+
+        Returns:
+            Reservation id, for reporting the real usage with
+            ``Budget.record_usage``
+        """
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enter(n_tokens, lambda: loop.call_soon_threadsafe(event.set))
+        started = time.perf_counter()
+        admitted = False
+        try:
+            while True:
+                event.clear()
+                reservation, wait = self._try(waiter)
+                if reservation is not None:
+                    admitted = True
+                    self.budget.add_throttled(time.perf_counter() - started)
+                    return reservation
+                try:
+                    await asyncio.wait_for(event.wait(), wait)
+                except TimeoutError:
+                    pass
+        finally:
+            self._leave(waiter, admitted)
+
+    def queued(self) -> int:
+        """
+        Number of calls waiting for tokens.
+        """
+        with self._lock:
+            return len(self._waiters)
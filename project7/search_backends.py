@@ -0,0 +1,525 @@
+"""
+Search backends for the research pipeline.
+
+Every backend exposes the ``invoke``/``ainvoke`` calls the pipeline makes on
+a retriever and returns LangChain ``Document`` objects with ``source``,
+``title`` and ``score`` metadata. Backends are registered by name, and
+``Config.SEARCH_BACKEND`` picks one:
+
+- ``tavily``: web search through Tavily
+- ``local``: BM25 search over a SQLite FTS5 index on disk, with no network
+  call. The index holds our own documents, added with the ``index`` command
+  below, and every source page a web search has returned.
+- ``hybrid``: the local index first, then the web when it finds fewer than
+  ``Config.HYBRID_MIN_LOCAL_HITS`` results
+
+The pipeline puts the search cache in front of the web backend; the local
+index answers in milliseconds and is searched directly, so documents show up
+as soon as they are indexed. The hybrid backend caches only its web half.
+
+Usage:
+    python search_backends.py index docs/ notes.md
+    python search_backends.py search "sodium-ion battery cost"
+    python search_backends.py stats
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable
+
+from cache import CachedRetriever, SQLiteCache
+from langchain_community.retrievers import TavilySearchAPIRetriever
+from langchain_core.documents import Document
+
+BACKENDS: dict[str, Callable] = {}
+
+INDEXED_SUFFIXES = (".txt", ".md", ".html", ".htm")
+
+
+def register(name: str) -> Callable:
+    """
+    Class decorator that makes a backend available under ``name``.
+
+    The class is built with ``cls.from_config(config)``.
+
+    Args:
+        name: Value of ``Config.SEARCH_BACKEND`` that selects the backend
+
+    Returns:
+        The decorator
+    """
+    def decorate(cls):
+        BACKENDS[name] = cls
+        cls.name = name
+        return cls
+
+    return decorate
+
+
+def create(name: str, config) -> "SearchBackend":
+    """
+    Build the backend registered under ``name``.
+
+    Args:
+        name: Registered backend name
+        config: Pipeline ``Config``
+
+    Returns:
+        The backend
+
+    Raises:
+        ValueError: If no backend has that name
+    """
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown search backend {name!r}; choose from {sorted(BACKENDS)}"
+        )
+    return BACKENDS[name].from_config(config)
+
+
+class SearchBackend(ABC):
+    """
+    Base class for search backends.
+
+    Subclasses implement ``from_config`` and ``invoke``; one missing either
+    cannot be instantiated.
+    """
+
+    name = "base"
+    cacheable = True  # whether the search cache may keep the results
+
+    def __init__(self, k: int):
+        """
+        Set the result count.
+
+        Args:
+            k: Results returned per search
+        """
+        self.k = k
+
+    @classmethod
+    @abstractmethod
+    def from_config(cls, config) -> "SearchBackend":
+        """
+        Build the backend from the pipeline settings.
+
+        Args:
+            config: Pipeline ``Config``
+
+        Returns:
+            The backend
+        """
+
+    @abstractmethod
+    def invoke(self, query: str) -> list[Document]:
+        """
+        Search.
+
+        Args:
+            query: Search query
+
+        Returns:
+            Up to ``k`` matching documents, best first
+        """
+
+    async def ainvoke(self, query: str) -> list[Document]:
+        """
+        Async version of ``invoke``; by default ``invoke`` on a worker thread.
+
+        Args:
+            query: Search query
+
+        Returns:
+            Up to ``k`` matching documents, best first
+        """
+        return await asyncio.to_thread(self.invoke, query)
+
+
+class LocalIndex:
+    """
+    On-disk full-text index of documents, ranked with BM25.
+
+    Documents are kept once per URL in a plain table, and an FTS5 table over
+    their title and content is kept in step by triggers.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Open (or create) the index.
+
+        Args:
+            path: SQLite database file; the default keeps the index private
+                to this process
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, "
+                "title TEXT NOT NULL, content TEXT NOT NULL, origin TEXT NOT NULL, "
+                "added_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+                "title, content, content='documents', content_rowid='id', "
+                "tokenize='porter unicode61')"
+            )
+            self._conn.executescript(
+                """
+                CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents
+                BEGIN
+                    INSERT INTO documents_fts (rowid, title, content)
+                    VALUES (new.id, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents
+                BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents
+                BEGIN
+                    INSERT INTO documents_fts (documents_fts, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                    INSERT INTO documents_fts (rowid, title, content)
+                    VALUES (new.id, new.title, new.content);
+                END;
+                """
+            )
+
+    def add(self, url: str, title: str, content: str, origin: str = "corpus"):
+        """
+        Index a document, replacing any earlier version with the same URL.
+
+        Args:
+            url: Address or file URL identifying the document
+            title: Document title
+            content: Document text
+            origin: ``"corpus"`` for our own documents, ``"fetched"`` for
+                pages returned by web search
+        """
+        self.add_many([(url, title, content, origin)])
+
+    def add_many(self, documents: Iterable[tuple[str, str, str, str]]):
+        """
+        Index several documents in one transaction.
+
+        Args:
+            documents: ``(url, title, content, origin)`` tuples
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO documents (url, title, content, origin, added_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                "title = excluded.title, content = excluded.content, "
+                "origin = excluded.origin, added_at = excluded.added_at",
+                [
+                    (url, title, content, origin, now)
+                    for url, title, content, origin in documents
+                ],
+            )
+
+    @staticmethod
+    def _match(query: str) -> str | None:
+        # any query term may match; BM25 ranks documents matching more of
+        # the rarer terms first. Quoting keeps FTS5 syntax out of user text.
+        terms = re.findall(r"\w+", query.lower())
+        return " OR ".join(f'"{t}"' for t in terms) if terms else None
+
+    def search(self, query: str, k: int) -> list[tuple[str, str, str, float]]:
+        """
+        Find the documents that best match a query.
+
+        Args:
+            query: Search query
+            k: Results to return
+
+        Returns:
+            ``(url, title, content, score)`` tuples, best first; higher
+            scores are better
+        """
+        match = self._match(query)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT d.url, d.title, d.content, bm25(documents_fts) AS rank "
+                "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+                "WHERE documents_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, k),
+            ).fetchall()
+        # bm25() is lower for better matches
+        return [(url, title, content, -rank) for url, title, content, rank in rows]
+
+    def stats(self) -> dict[str, int]:
+        """
+        Indexed documents by origin.
+
+        Returns:
+            Dictionary mapping origin to document count
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT origin, COUNT(*) FROM documents GROUP BY origin"
+            ).fetchall()
+        return dict(rows)
+
+
+def _read_document(path: str) -> tuple[str, str]:
+    """
+    Title and text of a corpus file.
+
+    Args:
+        path: Text, Markdown or HTML file
+
+    Returns:
+        Tuple of (title, text)
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    title = os.path.basename(path)
+    if path.endswith((".html", ".htm")):
+        found = re.search(r"<title>(.*?)</title>", text, re.IGNORECASE | re.DOTALL)
+        if found:
+            title = found.group(1).strip()
+        text = re.sub(
+            r"<(script|style)\b.*?</\1>", " ", text, flags=re.IGNORECASE | re.DOTALL
+        )
+        text = re.sub(r"<[^>]+>", " ", text)
+    else:
+        first = text.strip().splitlines()[0] if text.strip() else ""
+        if first:
+            title = first.lstrip("# ").strip()
+    return title, re.sub(r"\s+", " ", text).strip()
+
+
+def index_paths(index: LocalIndex, paths: list[str]) -> int:
+    """
+    Add corpus files to the local index.
+
+    Args:
+        index: The local index
+        paths: Files, or directories searched recursively for text,
+            Markdown and HTML files
+
+    Returns:
+        Number of documents indexed
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(
+                    os.path.join(root, n) for n in names if n.endswith(INDEXED_SUFFIXES)
+                )
+        else:
+            files.append(path)
+    documents = []
+    for path in files:
+        title, text = _read_document(path)
+        if text:
+            documents.append((f"file://{os.path.abspath(path)}", title, text, "corpus"))
+    index.add_many(documents)
+    return len(documents)
+
+
+@register("tavily")
+class TavilyBackend(SearchBackend):
+    """
+    Web search through Tavily, optionally saving each result to the local
+    index.
+    """
+
+    def __init__(self, k: int, index: LocalIndex | None = None):
+        """
+        Set up the Tavily retriever.
+
+        Args:
+            k: Results returned per search
+            index: Local index that fetched pages are added to, if any
+        """
+        super().__init__(k)
+        self.retriever = TavilySearchAPIRetriever(k=k)
+        self.index = index
+
+    @classmethod
+    def from_config(cls, config) -> "TavilyBackend":
+        index = (
+            LocalIndex(config.LOCAL_INDEX_PATH)
+            if config.INDEX_FETCHED_SOURCES
+            else None
+        )
+        return cls(config.SEARCH_K, index)
+
+    def _keep(self, hits: list[Document]):
+        if self.index is None:
+            return
+        self.index.add_many(
+            (
+                h.metadata.get("source", ""),
+                h.metadata.get("title", ""),
+                h.page_content,
+                "fetched",
+            )
+            for h in hits
+            if h.metadata.get("source") and h.page_content
+        )
+
+    def invoke(self, query: str) -> list[Document]:
+        hits = self.retriever.invoke(query)
+        self._keep(hits)
+        return hits
+
+    async def ainvoke(self, query: str) -> list[Document]:
+        hits = await self.retriever.ainvoke(query)
+        self._keep(hits)
+        return hits
+
+
+@register("local")
+class LocalIndexBackend(SearchBackend):
+    """
+    BM25 search over the local index, with no network call.
+    """
+
+    cacheable = False
+
+    def __init__(self, k: int, index: LocalIndex):
+        """
+        Search an index.
+
+        Args:
+            k: Results returned per search
+            index: The local index
+        """
+        super().__init__(k)
+        self.index = index
+
+    @classmethod
+    def from_config(cls, config) -> "LocalIndexBackend":
+        return cls(config.SEARCH_K, LocalIndex(config.LOCAL_INDEX_PATH))
+
+    def invoke(self, query: str) -> list[Document]:
+        return [
+            Document(
+                page_content=content,
+                metadata={"source": url, "title": title, "score": score},
+            )
+            for url, title, content, score in self.index.search(query, self.k)
+        ]
+
+
+@register("hybrid")
+class HybridBackend(SearchBackend):
+    """
+    The local index first, then the web when it has too little.
+
+    Not cached as a whole, so newly indexed documents are found at once;
+    ``from_config`` puts the search cache in front of the web half only.
+    """
+
+    cacheable = False
+
+    def __init__(self, local: LocalIndexBackend, web, min_local_hits: int):
+        """
+        Combine two backends.
+
+        Args:
+            local: Local index backend
+            web: Web backend used when the local one falls short, or a
+                ``CachedRetriever`` around one
+            min_local_hits: Local results needed to skip the web search
+        """
+        super().__init__(local.k)
+        self.local = local
+        self.web = web
+        self.min_local_hits = min_local_hits
+
+    @classmethod
+    def from_config(cls, config) -> "HybridBackend":
+        index = LocalIndex(config.LOCAL_INDEX_PATH)
+        tavily = TavilyBackend(
+            config.SEARCH_K, index if config.INDEX_FETCHED_SOURCES else None
+        )
+        # the same table the pipeline caches searches in, so the web half
+        # shares entries with the tavily backend
+        cache = SQLiteCache(
+            config.CACHE_PATH,
+            "search_results",
+            ttl=config.SEARCH_CACHE_TTL,
+            max_entries=config.SEARCH_CACHE_MAX_ENTRIES,
+        )
+        local = LocalIndexBackend(config.SEARCH_K, index)
+        web = CachedRetriever(tavily, cache)
+        return cls(local, web, config.HYBRID_MIN_LOCAL_HITS)
+
+    def _merge(self, local: list[Document], web: list[Document]) -> list[Document]:
+        # local hits first, then web results for pages not already found
+        seen = {h.metadata.get("source") for h in local}
+        extra = [h for h in web if h.metadata.get("source") not in seen]
+        return (local + extra)[: self.k]
+
+    def invoke(self, query: str) -> list[Document]:
+        local = self.local.invoke(query)
+        if len(local) >= self.min_local_hits:
+            return local
+        return self._merge(local, self.web.invoke(query))
+
+    async def ainvoke(self, query: str) -> list[Document]:
+        local = await self.local.ainvoke(query)
+        if len(local) >= self.min_local_hits:
+            return local
+        return self._merge(local, await self.web.ainvoke(query))
+
+
+def main():
+    """
+    Manage and query the local index from the command line.
+    """
+    from research import Config
+
+    parser = argparse.ArgumentParser(
+        description="Local search index for the research pipeline"
+    )
+    parser.add_argument(
+        "--path", default=Config.LOCAL_INDEX_PATH, help="Index database file"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    index_cmd = commands.add_parser(
+        "index", help="Add text, Markdown or HTML files to the index"
+    )
+    index_cmd.add_argument("paths", nargs="+", help="Files or directories")
+    search_cmd = commands.add_parser("search", help="Search the index")
+    search_cmd.add_argument("query")
+    search_cmd.add_argument("-k", type=int, default=Config.SEARCH_K)
+    commands.add_parser("stats", help="Count indexed documents by origin")
+    args = parser.parse_args()
+
+    index = LocalIndex(args.path)
+    if args.command == "index":
+        print(f"Indexed {index_paths(index, args.paths)} documents")
+    elif args.command == "search":
+        started = time.perf_counter()
+        results = index.search(args.query, args.k)
+        elapsed = (time.perf_counter() - started) * 1000
+        for url, title, content, score in results:
+            print(f"{score:7.3f}  {title}\n         {url}\n         {content[:160]}\n")
+        print(f"{len(results)} results in {elapsed:.1f} ms")
+    else:
+        for origin, count in sorted(index.stats().items()):
+            print(f"{origin}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,36 @@ class Queries(BaseModel):
         description="List of search queries.",
     )
 
+class SectionQueries(BaseModel):
+    section: str = Field(
+        description="The outline point these queries are for, copied exactly.",
+    )
+    queries: list[SearchQuery] = Field(
+        description="List of search queries for this section.",
+    )
+
+class OutlineQueries(BaseModel):
+    sections: list[SectionQueries] = Field(
+        description=(
+            "Search queries for every section of the outline, in outline order."
+        ),
+    )
+
+class Source(BaseModel):
+    url: str = Field(
+        description="Address of the search result.",
+    )
+    title: str = Field(
+        description="Title of the page.",
+    )
+    score: float | None = Field(
+        default=None,
+        description="Relevance score reported by the search engine.",
+    )
+    content: str = Field(
+        description="Text of the search result.",
+    )
+
 class Feedback(BaseModel):
     grade: Literal["pass","fail"] = Field(
         description="Evaluation result indicating whether the response meets requirements ('pass') or needs revision ('fail')."
@@ -37,6 +67,45 @@ class Feedback(BaseModel):
         description="List of follow-up search queries.",
     )
 
+class JobCheckpoint(BaseModel):
+    query: str = Field(
+        description="The research question.",
+    )
+    stage: str | None = Field(
+        default=None,
+        description="Last pipeline stage the job completed.",
+    )
+    outline: list[str] = Field(
+        default_factory=list,
+        description="Planned outline points.",
+    )
+    queries: dict[str, list[str]] | None = Field(
+        default=None,
+        description="Search queries per outline point, in multi-query mode.",
+    )
+    evidence: dict[str, list[Source]] | None = Field(
+        default=None,
+        description="Compacted evidence per outline point.",
+    )
+    sections: dict[str, Section] = Field(
+        default_factory=dict,
+        description="Sections drafted so far, by outline point.",
+    )
+    plan_approved: bool | None = Field(
+        default=None,
+        description=(
+            "Whether the user approved the outline; None when it needs no review."
+        ),
+    )
+    feedback_on_report_plan: list[str] = Field(
+        default_factory=list,
+        description="Feedback on the outline, one entry per review round.",
+    )
+    plan_revisions: int = Field(
+        default=0,
+        description="Feedback rounds the outline has been revised for.",
+    )
+
 class ReportStateInput(TypedDict):
     topic: str # Report topic
     
@@ -68,37 +68,68 @@ document.addEventListener('DOMContentLoaded', function() {
         const loadingText = document.querySelector('.loading-text');
         loadingContainer.style.display = 'block';
 
-        // Start progress polling
-        let progressInterval = setInterval(async () => {
-            try {
-                const response = await fetch('/progress');
-                const data = await response.json();
-                
-                // Update loading text
-                loadingText.textContent = data.task || 'Processing your research request...';
-                
-                // If progress is 100%, stop polling
-                if (data.progress >= 100) {
-                    clearInterval(progressInterval);
-                }
-            } catch (error) {
-                console.error('Error fetching progress:', error);
-            }
-        }, 100); // Poll every 100ms
-
         try {
-            const response = await fetch('/process', {
+            // Submit the research job; the server answers straight away with its id
+            const submitResponse = await fetch('/jobs', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
                 },
-                body: JSON.stringify({ requirements: requirements })
+                body: JSON.stringify({
+                    requirements: requirements,
+                    review_plan: document.getElementById('reviewPlan').checked
+                })
             });
+            const submitted = await submitResponse.json();
+            if (!submitResponse.ok) {
+                throw new Error(submitted.error || 'Could not start research');
+            }
 
-            const data = await response.json();
-            
-            // Clear the progress polling interval
-            clearInterval(progressInterval);
+            // Follow the job's event stream: stage changes, evidence and report tokens
+            const outputArea = document.getElementById('outputText');
+            outputArea.value = '';
+            const data = await new Promise((resolve, reject) => {
+                const events = new EventSource(`/jobs/${submitted.job_id}/events`);
+                events.addEventListener('stage', event => {
+                    const stage = JSON.parse(event.data);
+                    const task = stage.task || 'Processing your research request...';
+                    loadingText.textContent = stage.eta != null
+                        ? `${task} ${stage.progress}% (about ${Math.ceil(stage.eta)}s left)`
+                        : task;
+                });
+                events.addEventListener('plan', event => {
+                    // The job is parked until the plan is approved
+                    reviewPlan(submitted.job_id, JSON.parse(event.data));
+                });
+                events.addEventListener('evidence', event => {
+                    const found = JSON.parse(event.data);
+                    loadingText.textContent = `Found evidence for "${found.bullet}" (${found.done}/${found.total})`;
+                });
+                events.addEventListener('section', event => {
+                    const section = JSON.parse(event.data);
+                    loadingText.textContent = `Drafted "${section.name}" (${section.done}/${section.total})`;
+                    // Show each section as it lands; the final report arrives in order on 'done'
+                    const content = (section.content || '').trim();
+                    if (content) {
+                        outputArea.value += (outputArea.value ? '\n\n' : '') + content;
+                        adjustTextareaHeight(outputArea);
+                    }
+                });
+                events.addEventListener('token', event => {
+                    outputArea.value += JSON.parse(event.data).text;
+                    adjustTextareaHeight(outputArea);
+                });
+                events.addEventListener('done', event => {
+                    events.close();
+                    resolve(JSON.parse(event.data));
+                });
+                events.onerror = () => {
+                    // EventSource reconnects by itself unless the stream is gone for good
+                    if (events.readyState === EventSource.CLOSED) {
+                        reject(new Error('Lost connection to the research job'));
+                    }
+                };
+            });
             
             // Hide loading animation
             loadingContainer.style.display = 'none';
@@ -107,26 +138,17 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('outputText').value = data.output;
             adjustTextareaHeight(document.getElementById('outputText'));
             
-            // Extract sources from the output text
-            const outputText = data.output;
-            const sources = [];
-            
-            // Look for sources in the format <sources>...</sources>
-            if (outputText.includes('<sources>') && outputText.includes('</sources>')) {
-                const sourcesText = outputText.split('<sources>')[1].split('</sources>')[0];
-                sources.push(...sourcesText.split('\n').map(s => s.trim()).filter(s => s));
-            }
-            
-            // Update reference links
+            // Update reference links from the structured citations
             const referenceLinks = document.getElementById('referenceLinks');
             referenceLinks.innerHTML = '';
-            
+            const sources = data.sources || [];
+
             if (sources.length > 0) {
-                // Add sources from the output
-                sources.forEach(link => {
+                sources.forEach(source => {
                     const a = document.createElement('a');
-                    a.href = link;
-                    a.textContent = link;
+                    a.href = source.url;
+                    a.textContent = source.title || source.url;
+                    a.title = source.url;
                     a.target = '_blank';
                     a.rel = 'noopener noreferrer';
                     referenceLinks.appendChild(a);
@@ -140,24 +162,8 @@ document.addEventListener('DOMContentLoaded', function() {
                 noSources.style.opacity = '0.7';
                 referenceLinks.appendChild(noSources);
             }
-            
-            // Add any additional references from the API response
-            if (data.references && data.references.length > 0) {
-                data.references.forEach(link => {
-                    if (!sources.includes(link)) {  // Avoid duplicates
-                        const a = document.createElement('a');
-                        a.href = link;
-                        a.textContent = link;
-                        a.target = '_blank';
-                        a.rel = 'noopener noreferrer';
-                        referenceLinks.appendChild(a);
-                        referenceLinks.appendChild(document.createElement('br'));
-                    }
-                });
-            }
         } catch (error) {
             console.error('Error:', error);
-            clearInterval(progressInterval);
             loadingContainer.style.display = 'none';
             alert('An error occurred while processing your request.');
         }
@@ -261,6 +267,75 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 });
 
+// Show a parked job's plan for approval, edits or feedback
+function reviewPlan(jobId, plan) {
+    const modal = document.getElementById('planModal');
+    const outline = document.getElementById('planOutline');
+    const feedback = document.getElementById('planFeedback');
+    outline.value = plan.outline.join('\n');
+    feedback.value = '';
+    document.getElementById('planRoundsLeft').textContent = plan.rounds_left;
+    document.getElementById('sendPlanFeedback').disabled = plan.rounds_left <= 0;
+    modal.style.display = 'block';
+    adjustTextareaHeight(outline);
+
+    // Ticking a point approves just that point, so its search starts now
+    const sections = document.getElementById('planSections');
+    sections.innerHTML = '';
+    plan.outline.forEach(point => {
+        const label = document.createElement('label');
+        const checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.onchange = () => {
+            if (!checkbox.checked) {
+                return;
+            }
+            // A started search cannot be taken back
+            checkbox.disabled = true;
+            fetch(`/jobs/${jobId}/plan`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ approved_sections: [point] })
+            })
+            .catch(error => console.error('Error:', error));
+        };
+        label.appendChild(checkbox);
+        label.appendChild(document.createTextNode(point));
+        sections.appendChild(label);
+    });
+
+    const send = body => fetch(`/jobs/${jobId}/plan`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(body)
+    })
+    .then(response => response.json().then(data => {
+        if (response.ok) {
+            modal.style.display = 'none';
+        } else {
+            alert(data.error || 'Could not update the plan');
+        }
+    }))
+    .catch(error => console.error('Error:', error));
+
+    // Assigned rather than added so each review round has one handler
+    document.getElementById('approvePlan').onclick = () => send({
+        approve: true,
+        outline: outline.value.split('\n').map(line => line.trim()).filter(line => line !== '')
+    });
+    document.getElementById('sendPlanFeedback').onclick = () => {
+        if (feedback.value.trim() === '') {
+            alert('Please enter feedback for the plan.');
+            return;
+        }
+        send({ feedback: feedback.value });
+    };
+}
+
 function adjustNoteHeight(textarea) {
     textarea.style.height = 'auto';
     textarea.style.height = (textarea.scrollHeight) + 'px';
@@ -0,0 +1,39 @@
+"""
+Shared pytest fixtures.
+
+The pipeline modules live flat in ``project7/`` and import each other by
+module name, so that directory is put on the import path.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "project7"))
+
+
+class Clock:
+    """
+    Manually advanced stand-in for ``time.time``.
+    """
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    """
+    Freeze ``time.time`` and let the test move it forward.
+    """
+    fake = Clock()
+    monkeypatch.setattr(time, "time", fake)
+    return fake
@@ -0,0 +1,121 @@
+import io
+import json
+
+import batch
+import pytest
+from batch import ResultWriter, finished_ids, query_id, read_queries
+
+
+class FakePipeline:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.researched = []
+
+    async def adeep_research(self, query):
+        self.researched.append(query)
+        if query in self.failing:
+            raise RuntimeError("search failed")
+        return f"report on {query}"
+
+
+def write_lines(path, *lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+
+
+def records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_queries_without_an_id_are_keyed_by_their_text():
+    stream = io.StringIO('"Battery costs"\n{"query": "battery COSTS?"}\n')
+
+    assert read_queries(stream) == [
+        {"id": query_id("Battery costs"), "query": "Battery costs"}
+    ]
+
+
+def test_unusable_lines_are_skipped():
+    stream = io.StringIO(
+        "\n".join(
+            [
+                "",
+                "{not json",
+                "[1, 2]",
+                '{"id": "x"}',
+                '{"query": "  "}',
+                '{"id": 0, "query": "zero"}',
+                '{"id": "", "query": "empty"}',
+            ]
+        )
+    )
+
+    assert read_queries(stream) == [
+        {"id": "0", "query": "zero"},
+        {"id": "", "query": "empty"},
+    ]
+
+
+def test_latest_record_decides_whether_an_id_is_done(tmp_path):
+    output = tmp_path / "out.jsonl"
+    write_lines(
+        output,
+        '{"id": "a", "status": "done"}',
+        '{"id": "b", "status": "done"}',
+        '{"id": "b", "status": "error"}',
+        '{"id": "c", "status": "error"}',
+        '{"id": "c", "status": "done"}',
+        "[]",
+        '"done"',
+        '{"id": "d", "sta',
+    )
+
+    assert finished_ids(output) == {"a", "c"}
+    assert finished_ids(tmp_path / "missing.jsonl") == set()
+
+
+def test_writer_finishes_a_line_cut_short(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"id": "a", "status": "done"}\n{"id": "b", "sta')
+
+    writer = ResultWriter(str(output))
+    writer.write({"id": "c", "status": "done"})
+    writer.close()
+
+    assert finished_ids(output) == {"a", "c"}
+
+
+def test_rerun_skips_done_queries_and_retries_failed_ones(tmp_path):
+    source = tmp_path / "topics.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_lines(source, '{"id": "a", "query": "alpha"}', '{"id": "b", "query": "beta"}')
+
+    first = FakePipeline(failing={"beta"})
+    batch.main(first, str(source), str(output), concurrency=2)
+    assert sorted(first.researched) == ["alpha", "beta"]
+    assert finished_ids(output) == {"a"}
+
+    second = FakePipeline()
+    batch.main(second, str(source), str(output), concurrency=2)
+    assert second.researched == ["beta"]
+    assert finished_ids(output) == {"a", "b"}
+    assert sorted(r["status"] for r in records(output)) == ["done", "done", "error"]
+
+    third = FakePipeline()
+    batch.main(third, str(source), str(output), concurrency=2)
+    assert third.researched == []
+
+
+@pytest.mark.parametrize("concurrency", [0, 1])
+def test_batch_runs_with_any_concurrency(tmp_path, concurrency):
+    source = tmp_path / "topics.jsonl"
+    output = tmp_path / "out.jsonl"
+    write_lines(source, '"alpha"', '"beta"')
+
+    pipeline = FakePipeline()
+    batch.main(pipeline, str(source), str(output), concurrency)
+
+    assert pipeline.researched == ["alpha", "beta"]
+    assert {r["output"] for r in records(output)} == {
+        "report on alpha",
+        "report on beta",
+    }
@@ -0,0 +1,66 @@
+import pytest
+from research import Budget
+
+
+def test_admits_until_window_is_full(clock):
+    budget = Budget(100)
+
+    assert budget.try_acquire(60)[0] is not None
+    assert budget.try_acquire(40)[0] is not None
+    reservation, wait = budget.try_acquire(1)
+    assert reservation is None
+    assert wait == pytest.approx(Budget.WINDOW)
+
+
+def test_wait_is_until_enough_old_tokens_expire(clock):
+    budget = Budget(100)
+    budget.try_acquire(30)
+    clock.advance(10)
+    budget.try_acquire(30)
+    clock.advance(10)
+    budget.try_acquire(40)
+    clock.advance(5)
+
+    # 50 tokens need the first two reservations (60 tokens) to expire
+    reservation, wait = budget.try_acquire(50)
+    assert reservation is None
+    assert wait == pytest.approx(Budget.WINDOW - 15)
+
+    clock.advance(wait)
+    assert budget.try_acquire(50)[0] is not None
+
+
+def test_window_slides(clock):
+    budget = Budget(100)
+    budget.try_acquire(100)
+
+    clock.advance(Budget.WINDOW - 1)
+    assert budget.try_acquire(1)[0] is None
+    clock.advance(1)
+    assert budget.try_acquire(100)[0] is not None
+
+
+def test_request_larger_than_budget_runs_on_an_empty_window(clock):
+    budget = Budget(100)
+
+    assert budget.try_acquire(500)[0] is not None
+    assert budget.try_acquire(1)[0] is None
+
+
+def test_record_usage_replaces_the_estimate(clock):
+    budget = Budget(100)
+    reservation = budget.try_acquire(80)[0]
+    assert budget.headroom() == 20
+
+    budget.record_usage(reservation, 30)
+    assert budget.headroom() == 70
+
+
+def test_budgets_on_one_file_share_the_window(tmp_path, clock):
+    path = str(tmp_path / "budget.db")
+    first = Budget(100, path)
+    second = Budget(100, path)
+
+    first.try_acquire(70)
+    assert second.headroom() == 30
+    assert second.try_acquire(40)[0] is None
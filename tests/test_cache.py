@@ -0,0 +1,109 @@
+from cache import CachedRetriever, ResponseCache, SQLiteCache, normalize_query
+from langchain_core.documents import Document
+
+
+class FakeRetriever:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = 0
+
+    def invoke(self, query):
+        self.calls += 1
+        return self.results.pop(0)
+
+
+def make_cache(tmp_path, ttl=60, max_entries=3):
+    return SQLiteCache(str(tmp_path / "cache.db"), "entries", ttl, max_entries)
+
+
+def test_normalize_query_ignores_list_markers_case_and_punctuation():
+    assert normalize_query("  2) Battery   COSTS? ") == "battery costs"
+    assert normalize_query("- battery costs") == normalize_query("Battery costs.")
+
+
+def test_get_returns_stored_value_and_counts_hits(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.set("k", {"a": [1, 2]})
+
+    assert cache.get("k") == {"a": [1, 2]}
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=60)
+    cache.set("k", "v")
+
+    clock.advance(60)
+    assert cache.get("k") == "v"
+    clock.advance(1)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.set("a", 1)
+    clock.advance(1)
+    cache.set("b", 2)
+    clock.advance(1)
+    cache.get("a")  # "b" is now the least recently used
+    clock.advance(1)
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_tables_in_one_file_are_independent(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = SQLiteCache(path, "first", 60, 10)
+    second = SQLiteCache(path, "second", 60, 10)
+    first.set("k", "one")
+
+    assert second.get("k") is None
+    assert first.get("k") == "one"
+
+
+def test_retriever_results_are_cached(tmp_path):
+    retriever = FakeRetriever([[Document(page_content="hit", metadata={"url": "a"})]])
+    cached = CachedRetriever(retriever, make_cache(tmp_path))
+
+    assert cached.invoke("Battery costs")[0].page_content == "hit"
+    assert cached.invoke("battery costs.")[0].metadata == {"url": "a"}
+    assert retriever.calls == 1
+
+
+def test_empty_results_are_not_cached(tmp_path):
+    retriever = FakeRetriever([[], [Document(page_content="hit", metadata={})]])
+    cached = CachedRetriever(retriever, make_cache(tmp_path))
+
+    assert cached.invoke("battery costs") == []
+    assert cached.invoke("battery costs")[0].page_content == "hit"
+    assert retriever.calls == 2
+
+
+def test_memory_tier_expires_with_the_disk_entry(tmp_path, clock):
+    responses = ResponseCache(make_cache(tmp_path, ttl=60), max_memory_entries=10)
+    responses.set("k", "answer")
+
+    clock.advance(60)
+    assert responses.get("k") == "answer"
+    assert responses.memory_hits == 1
+    clock.advance(1)
+    assert responses.get("k") is None
+    assert responses.stats()["memory_entries"] == 0
+
+
+def test_disk_hits_are_promoted_until_they_expire(tmp_path, clock):
+    disk = make_cache(tmp_path, ttl=60)
+    disk.set("k", "answer")
+    clock.advance(30)
+    responses = ResponseCache(disk, max_memory_entries=10)
+
+    assert responses.get("k") == "answer"
+    assert responses.get("k") == "answer"
+    assert responses.memory_hits == 1
+    clock.advance(31)
+    assert responses.get("k") is None
@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+
+import checkpoint
+import pytest
+from checkpoint import CheckpointStore
+from state import JobCheckpoint
+
+
+class FakeJob:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.query = f"query {job_id}"
+        self.requirements = [self.query]
+        self.user = "user"
+        self.priority = 0
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.db"))
+
+
+def set_owner(store, job_id, owner, status=CheckpointStore.RUNNING):
+    with store._conn:
+        store._conn.execute(
+            "UPDATE checkpoints SET owner = ?, status = ? WHERE job_id = ?",
+            (owner, status, job_id),
+        )
+
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_save_and_load_round_trip(store):
+    store.register(FakeJob("a"))
+    state = JobCheckpoint(query="query a", stage="research", outline=["x", "y"])
+    store.save("a", state)
+
+    assert store.load("a") == state
+    assert store.get("a")["status"] == CheckpointStore.RUNNING
+    assert store.load("missing") is None
+
+
+def test_register_keeps_an_existing_checkpoint(store):
+    job = FakeJob("a")
+    store.register(job)
+    store.save("a", JobCheckpoint(query=job.query, stage="plan"))
+    store.register(job)
+
+    assert store.load("a").stage == "plan"
+
+
+def test_own_jobs_are_not_claimed(store):
+    store.register(FakeJob("a"))
+    store.save("a", JobCheckpoint(query="query a"))
+
+    assert store.claim_orphans() == []
+
+
+def test_jobs_of_a_dead_process_are_claimed_once(store):
+    store.register(FakeJob("a"))
+    set_owner(store, "a", f"{dead_pid()}:earlier")
+
+    claimed = store.claim_orphans()
+    assert [job["job_id"] for job in claimed] == ["a"]
+    assert claimed[0]["status"] == CheckpointStore.QUEUED
+    assert store.claim_orphans() == []
+
+
+def test_jobs_of_an_earlier_process_with_our_pid_are_claimed(store):
+    # a restarted container often gets its old PID back
+    store.register(FakeJob("a"))
+    store.register(FakeJob("b"))
+    set_owner(store, "a", f"{os.getpid()}:earlier")
+    set_owner(store, "b", os.getpid())  # written before instance tokens
+
+    claimed = {job["job_id"] for job in store.claim_orphans()}
+    assert claimed == {"a", "b"}
+
+
+def test_jobs_of_a_live_process_are_left_alone(store):
+    store.register(FakeJob("a"))
+    set_owner(store, "a", f"{os.getppid()}:other")
+
+    assert store.claim_orphans() == []
+
+
+def test_finished_jobs_are_not_claimed(store):
+    for job_id, status in (("a", CheckpointStore.ERROR), ("b", "cancelled")):
+        store.register(FakeJob(job_id))
+        set_owner(store, job_id, f"{dead_pid()}:earlier", status)
+
+    assert store.claim_orphans() == []
+
+
+def test_parked_jobs_of_a_dead_process_are_claimed(store):
+    store.register(FakeJob("a"))
+    set_owner(store, "a", f"{dead_pid()}:earlier", CheckpointStore.AWAITING_APPROVAL)
+
+    assert [job["job_id"] for job in store.claim_orphans()] == ["a"]
+
+
+def test_prune_drops_only_old_finished_and_parked_jobs(store, clock):
+    statuses = {
+        "error": CheckpointStore.ERROR,
+        "cancelled": CheckpointStore.CANCELLED,
+        "parked": CheckpointStore.AWAITING_APPROVAL,
+        "running": CheckpointStore.RUNNING,
+        "queued": CheckpointStore.QUEUED,
+    }
+    for job_id, status in statuses.items():
+        store.register(FakeJob(job_id))
+        store.set_status(job_id, status)
+    store.register(FakeJob("recent"))
+    clock.advance(100)
+    store.set_status("recent", CheckpointStore.ERROR)
+
+    store.prune(max_age=50)
+
+    remaining = {job_id for job_id in [*statuses, "recent"] if store.get(job_id)}
+    assert remaining == {"running", "queued", "recent"}
+
+
+def test_instance_token_starts_with_our_pid():
+    assert checkpoint.INSTANCE.startswith(f"{os.getpid()}:")
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from coalesce import AsyncSingleFlight, SingleFlight
+
+
+def run_concurrently(flight, fn, callers=5):
+    """Call ``flight.do`` from several threads at once; return their outcomes."""
+    outcomes = [None] * callers
+    barrier = threading.Barrier(callers)
+
+    def call(i):
+        barrier.wait()
+        try:
+            outcomes[i] = ("ok", flight.do("key", fn))
+        except Exception as e:
+            outcomes[i] = ("error", e)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    outcomes = run_concurrently(flight, work)
+    assert len(calls) == 1
+    assert outcomes == [("ok", "result")] * 5
+
+
+def test_error_reaches_every_waiter_and_the_key_is_released():
+    flight = SingleFlight()
+    calls = []
+
+    def fail():
+        calls.append(1)
+        time.sleep(0.2)
+        raise ValueError("search failed")
+
+    outcomes = run_concurrently(flight, fail)
+    assert len(calls) == 1
+    errors = [error for kind, error in outcomes if kind == "error"]
+    assert len(errors) == 5
+    assert all(error is errors[0] for error in errors)
+
+    # a later call runs again instead of replaying the failure
+    assert flight.do("key", lambda: "retried") == "retried"
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+
+
+def test_async_callers_share_one_call_and_its_error():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fail():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("llm failed")
+
+    async def main():
+        return await asyncio.gather(
+            *(flight.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelling_one_async_caller_leaves_the_others_running():
+    flight = AsyncSingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "result"
@@ -0,0 +1,71 @@
+import bench
+import pytest
+from evidence import EvidenceCompactor
+from research import TokenCounter
+from state import Source
+
+PASSAGE = "lithium iron phosphate cells cost less per kilowatt hour than nickel cells"
+
+
+@pytest.fixture
+def compactor():
+    return EvidenceCompactor(TokenCounter(encoding=bench.WordEncoding()))
+
+
+def source(url, content):
+    return Source(url=url, title=url, content=content)
+
+
+def test_near_duplicates_are_dropped_from_later_sections(compactor):
+    evidence = {
+        "Costs": [source("a", PASSAGE)],
+        "Chemistry": [
+            source("b", PASSAGE.upper() + "!"),
+            source("c", "sodium cells need no lithium at all"),
+        ],
+    }
+
+    deduped = compactor.deduplicate(["Costs", "Chemistry"], evidence)
+
+    assert [r.url for r in deduped["Costs"]] == ["a"]
+    assert [r.url for r in deduped["Chemistry"]] == ["c"]
+
+
+def test_repeated_outline_point_keeps_its_evidence(compactor):
+    evidence = {"Costs": [source("a", PASSAGE)]}
+
+    deduped = compactor.deduplicate(["Costs", "Grid", "Costs"], evidence)
+
+    assert [r.url for r in deduped["Costs"]] == ["a"]
+    assert deduped["Grid"] == []
+
+
+def test_empty_results_are_dropped(compactor):
+    deduped = compactor.deduplicate(["Costs"], {"Costs": [source("a", " ... ")]})
+
+    assert deduped["Costs"] == []
+
+
+def test_short_sections_hand_their_share_to_the_others(compactor):
+    allotment = compactor.allot({"a": 10, "b": 100, "c": 100}, 150)
+
+    assert allotment == {"a": 10, "b": 70, "c": 70}
+
+
+def test_allotment_never_exceeds_what_a_section_needs(compactor):
+    assert compactor.allot({"a": 5, "b": 7}, 100) == {"a": 5, "b": 7}
+
+
+def test_compact_truncates_the_first_result_that_does_not_fit(compactor):
+    evidence = {
+        "Costs": [
+            source("a", "one two three"),
+            source("b", "four five six seven"),
+            source("c", "eight"),
+        ]
+    }
+
+    compacted = compactor.compact(["Costs"], evidence, 5)
+
+    assert [r.url for r in compacted["Costs"]] == ["a", "b"]
+    assert compactor.counter.count(compacted["Costs"][1].content) == 2
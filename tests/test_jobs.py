@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from jobs import AwaitingApproval, Job, JobManager
+
+
+class Runner:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.runs = []
+
+    async def __call__(self, job):
+        self.runs.append(job.id)
+        if job.options.get("review"):
+            raise AwaitingApproval("Waiting for plan approval")
+        while not self.gate.is_set():
+            await asyncio.sleep(0.01)
+        return {"output": job.query}
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+@pytest.fixture
+def runner():
+    return Runner()
+
+
+def make_manager(loop, runner, **kwargs):
+    return JobManager(
+        runner,
+        loop,
+        max_concurrent=2,
+        max_history=10,
+        key=lambda requirements, options: " ".join(requirements),
+        **kwargs,
+    )
+
+
+def wait_for(job, status):
+    for _ in range(200):
+        if job.status == status:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"job {job.id} stuck in {job.status}")
+
+
+def test_identical_submissions_share_one_job(loop, runner):
+    jobs = make_manager(loop, runner)
+    first = jobs.submit(["battery costs"], "a", priority=1)
+    wait_for(first, Job.RUNNING)
+    second = jobs.submit(["battery costs"], "b", priority=0)
+
+    assert second is first
+    assert first.subscribers == 2
+    assert first.priority == 0
+    runner.gate.set()
+    assert first.wait(2)
+    assert first.result == {"output": "battery costs"}
+    assert len(runner.runs) == 1
+
+
+def test_a_finished_job_is_not_shared(loop, runner):
+    jobs = make_manager(loop, runner)
+    runner.gate.set()
+    first = jobs.submit(["battery costs"])
+    assert first.wait(2)
+
+    second = jobs.submit(["battery costs"])
+    assert second is not first
+    assert second.wait(2)
+    assert len(runner.runs) == 2
+
+
+def test_cancelling_a_shared_job_detaches_until_the_last_submitter(loop, runner):
+    jobs = make_manager(loop, runner)
+    job = jobs.submit(["battery costs"])
+    wait_for(job, Job.RUNNING)
+    jobs.submit(["battery costs"])
+
+    assert jobs.cancel(job.id) == Job.DETACHED
+    assert job.status == Job.RUNNING
+    assert jobs.cancel(job.id) == Job.CANCELLED
+    assert job.wait(2)
+    assert job.status == Job.CANCELLED
+    assert jobs.cancel(job.id) is None
+    assert jobs.cancel("unknown") is None
+    # the cancelled job no longer absorbs new submissions
+    assert jobs.submit(["battery costs"]) is not job
+
+
+def test_parked_jobs_expire_after_the_approval_timeout(loop, runner, clock):
+    expired = []
+    jobs = make_manager(loop, runner, approval_timeout=60, on_expire=expired.append)
+    parked = jobs.submit(["battery costs"], options={"review": True})
+    wait_for(parked, Job.AWAITING_APPROVAL)
+
+    clock.advance(60)
+    jobs.submit(["grid storage"])
+    assert parked.status == Job.AWAITING_APPROVAL
+    assert expired == []
+
+    clock.advance(1)
+    jobs.submit(["sodium cells"])
+    assert parked.status == Job.CANCELLED
+    assert parked.wait(0)
+    assert expired == [parked]
+
+
+def test_resumed_jobs_do_not_expire(loop, runner, clock):
+    jobs = make_manager(loop, runner, approval_timeout=60)
+    job = jobs.submit(["battery costs"], options={"review": True})
+    wait_for(job, Job.AWAITING_APPROVAL)
+
+    assert job.unpark()
+    clock.advance(61)
+    assert not job.expire(60)
+    assert job.status == Job.QUEUED
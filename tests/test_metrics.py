@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from metrics import Registry
+from research import _submit
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("lookups_total", "Lookups.")
+    registry.inc("lookups_total", cache='a"b\\c\nd')
+
+    assert 'lookups_total{cache="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+
+def test_pool_work_is_attributed_to_the_submitting_span():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        with metrics.trace() as trace, metrics.span("write") as span:
+            futures = [_submit(pool, metrics.record_tokens, 3, 4) for _ in range(2)]
+            for future in futures:
+                future.result()
+        # work submitted outside the span is not counted against it
+        pool.submit(metrics.record_tokens, 100, 100).result()
+
+    assert (span.tokens_in, span.tokens_out) == (6, 8)
+    assert trace.totals()[0] == 14
@@ -0,0 +1,170 @@
+"""
+The /jobs plan review flow: park after planning, feedback, approval.
+
+The app is imported against a scratch directory. The LLM, search and
+tiktoken encoding are swapped for the benchmark's stand-ins, so nothing
+touches the network.
+"""
+
+import importlib
+import time
+
+import pytest
+
+WAITING = ("awaiting_approval", "done", "error", "cancelled")
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("app"))
+        mp.setenv("GROQ_API_KEY", "test")
+        mp.setenv("TAVILY_API_KEY", "test")
+        app = importlib.import_module("app")
+        bench = importlib.import_module("bench")
+        research = importlib.import_module("research")
+        # room for every job in the module without waiting on the window
+        app.researcher.limiter = research.Budget(10_000_000)
+        app.researcher.llm = bench.FakeChatModel(latency=0, tokens_per_second=1e6)
+        app.researcher.search_tool.retriever = bench.FakeRetriever(latency=0)
+        # shared with the compactor; set before anything counts tokens
+        app.researcher.counter.enc = bench.WordEncoding()
+        yield app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def wait(client, job_id, until=WAITING):
+    for _ in range(200):
+        status = client.get(f"/jobs/{job_id}").get_json()["status"]
+        if status in until:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} stuck in {status}")
+
+
+def submit(client, topic):
+    response = client.post("/jobs", json={"requirements": [topic], "review_plan": True})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert wait(client, job_id) == "awaiting_approval"
+    return job_id
+
+
+def review(client, job_id, **body):
+    return client.post(f"/jobs/{job_id}/plan", json=body)
+
+
+def test_job_parks_with_its_plan(client):
+    job_id = submit(client, "parks with its plan")
+
+    plan = client.get(f"/jobs/{job_id}/plan").get_json()
+    assert plan["status"] == "awaiting_approval"
+    assert plan["approved"] is False
+    assert len(plan["outline"]) == 5
+    assert plan["rounds_left"] == 5
+
+
+def test_unreviewed_job_has_no_plan_to_review(client):
+    response = client.post("/jobs", json={"requirements": ["no review"]})
+    job_id = response.get_json()["job_id"]
+    wait(client, job_id)
+
+    assert client.get(f"/jobs/{job_id}/plan").status_code == 404
+    assert review(client, job_id, approve=True).status_code == 404
+
+
+def test_feedback_replans_and_parks_again(client):
+    job_id = submit(client, "feedback replans")
+    before = client.get(f"/jobs/{job_id}/plan").get_json()["outline"]
+
+    assert review(client, job_id, feedback="Cover costs").status_code == 202
+    assert wait(client, job_id) == "awaiting_approval"
+
+    plan = client.get(f"/jobs/{job_id}/plan").get_json()
+    assert plan["feedback"] == ["Cover costs"]
+    assert plan["rounds_left"] == 4
+    assert plan["outline"] != before
+
+
+def test_feedback_rounds_run_out(client, app_module):
+    job_id = submit(client, "rounds run out")
+    for n in range(app_module.MAX_PLAN_FEEDBACK_ROUNDS):
+        assert review(client, job_id, feedback=f"round {n}").status_code == 202
+        assert wait(client, job_id) == "awaiting_approval"
+
+    assert review(client, job_id, feedback="one more").status_code == 409
+    assert review(client, job_id, approve=True).status_code == 202
+    assert wait(client, job_id, ("done", "error")) == "done"
+
+
+def test_invalid_reviews_are_rejected(client):
+    job_id = submit(client, "invalid reviews")
+
+    assert review(client, job_id).status_code == 400
+    assert review(client, job_id, feedback="  ").status_code == 400
+    assert review(client, job_id, approve=True, outline=[" "]).status_code == 400
+    assert review(client, job_id, approve=True, outline="x").status_code == 400
+    assert client.get(f"/jobs/{job_id}").get_json()["status"] == "awaiting_approval"
+
+
+def test_approved_sections_start_searching_without_resuming(client, app_module):
+    job_id = submit(client, "approved sections")
+    outline = client.get(f"/jobs/{job_id}/plan").get_json()["outline"]
+    searches = app_module.researcher.search_tool.retriever.stats.calls
+
+    response = review(client, job_id, approved_sections=[outline[0], "not a point"])
+    assert response.status_code == 202
+    for _ in range(100):
+        if app_module.researcher.search_tool.retriever.stats.calls > searches:
+            break
+        time.sleep(0.05)
+    assert app_module.researcher.search_tool.retriever.stats.calls == searches + 1
+    assert client.get(f"/jobs/{job_id}").get_json()["status"] == "awaiting_approval"
+
+
+def test_approving_an_edited_outline_runs_the_job(client, app_module):
+    job_id = submit(client, "edited outline")
+
+    response = review(client, job_id, approve=True, outline=["First", " Second "])
+    assert response.status_code == 202
+    assert response.get_json()["outline"] == ["First", "Second"]
+    assert wait(client, job_id, ("done", "error")) == "done"
+
+    # the checkpoint goes once the job succeeds, and the plan with it
+    assert app_module.checkpoints.get(job_id) is None
+    assert client.get(f"/jobs/{job_id}/plan").status_code == 404
+    assert client.get(f"/jobs/{job_id}/result").status_code == 200
+
+
+def test_a_plan_is_approved_only_once(client):
+    job_id = submit(client, "approved once")
+    assert review(client, job_id, approve=True).status_code == 202
+
+    # resumed: running (409), or finished with its checkpoint gone (404)
+    assert review(client, job_id, approve=True).status_code in (404, 409)
+    assert wait(client, job_id, ("done", "error")) == "done"
+
+
+def test_cancelling_a_parked_job(client, app_module):
+    job_id = submit(client, "cancel parked")
+
+    response = client.delete(f"/jobs/{job_id}").get_json()
+    assert response == {"success": True, "outcome": "cancelled"}
+    assert client.get(f"/jobs/{job_id}").get_json()["status"] == "cancelled"
+    assert app_module.checkpoints.get(job_id)["status"] == "cancelled"
+    assert review(client, job_id, approve=True).status_code == 409
+
+
+def test_result_keeps_references_as_urls(client):
+    response = client.post("/jobs", json={"requirements": ["plain references"]})
+    job_id = response.get_json()["job_id"]
+    assert wait(client, job_id, ("done", "error")) == "done"
+
+    result = client.get(f"/jobs/{job_id}/result").get_json()
+    assert result["references"]
+    assert result["references"] == [source["url"] for source in result["sources"]]
+    assert set(result["sources"][0]) == {"url", "title", "score"}
@@ -0,0 +1,113 @@
+import time
+
+import pytest
+from progress import JobProgress, ProgressEstimator
+from research import Budget
+
+MODEL = "model"
+
+
+@pytest.fixture
+def estimator():
+    return ProgressEstimator()
+
+
+@pytest.fixture
+def perf(clock, monkeypatch):
+    """Drive ``time.perf_counter`` from the test clock as well."""
+    monkeypatch.setattr(time, "perf_counter", clock)
+    return clock
+
+
+def run_job(estimator, perf, outline_size, seconds):
+    """Record one job whose every stage works ``seconds``."""
+    tracker = JobProgress(estimator, MODEL, ["plan", "research"], Budget(10**9))
+    tracker.begin("plan", (0, 0.0))
+    perf.advance(seconds)
+    tracker.outline_size = outline_size
+    tracker.end((100, 0.0))
+    tracker.begin("research", (100, 0.0))
+    perf.advance(seconds)
+    tracker.end((100, 0.0))
+
+
+def test_defaults_before_any_history(estimator):
+    assert estimator.typical_outline_size(MODEL) == 5
+    assert estimator.expected(MODEL, "plan", 5) == (5.0, 600.0)
+    # per-point stages scale with the outline
+    assert estimator.expected(MODEL, "write", 10) == (20.0, 12_000.0)
+
+
+def test_typical_outline_size_learns_from_planned_jobs(estimator, perf):
+    for _ in range(10):
+        run_job(estimator, perf, outline_size=9, seconds=2.0)
+
+    assert estimator.typical_outline_size(MODEL) == 9
+    assert estimator.expected_job(MODEL, ["plan", "research"]) == pytest.approx(4.0)
+
+
+def test_estimates_use_the_median_once_a_bucket_has_enough_samples(estimator):
+    for seconds in (1.0, 2.0):
+        estimator.record(MODEL, "plan", 5, seconds, 100)
+    assert estimator.expected(MODEL, "plan", 5) == (5.0, 600.0)
+
+    estimator.record(MODEL, "plan", 5, 9.0, 300)
+    assert estimator.expected(MODEL, "plan", 5) == (2.0, 100)
+
+
+def test_other_outline_sizes_are_scaled_per_point(estimator):
+    for _ in range(3):
+        estimator.record(MODEL, "research", 4, 8.0, 0)
+        estimator.record(MODEL, "plan", 4, 3.0, 50)
+
+    assert estimator.expected(MODEL, "research", 8) == (16.0, 0.0)
+    # planning does not grow with the outline
+    assert estimator.expected(MODEL, "plan", 8) == (3.0, 50)
+
+
+def test_window_keeps_only_recent_samples(estimator):
+    for n in range(ProgressEstimator.WINDOW + 10):
+        estimator.record(MODEL, "plan", 5, float(n), 0)
+
+    count = estimator._conn.execute("SELECT COUNT(*) FROM stage_samples").fetchone()
+    assert count[0] == ProgressEstimator.WINDOW
+
+
+def test_eta_counts_down_within_a_stage(estimator, perf):
+    tracker = JobProgress(estimator, MODEL, ["plan", "research"], Budget(10**9))
+    tracker.outline_size = 5
+    assert tracker.eta() == pytest.approx(25.0)
+
+    tracker.begin("plan", (0, 0.0))
+    perf.advance(2.0)
+    # no progress reported yet, so the whole stage is still ahead
+    assert tracker.eta() == pytest.approx(25.0)
+    tracker.advance(0.9)
+    # never less than the stage's history still needs
+    assert tracker.eta() == pytest.approx(23.0)
+    tracker.end((600, 0.0))
+    assert tracker.eta() == pytest.approx(20.0)
+
+
+def test_eta_adds_expected_throttling(estimator):
+    budget = Budget(1_000)
+    budget.try_acquire(1_000)
+    tracker = JobProgress(estimator, MODEL, ["plan"], budget)
+    tracker.outline_size = 5
+
+    # 600 expected tokens need 600 / 1000 of a window to free up
+    assert tracker.eta() == pytest.approx(5.0 + 0.6 * Budget.WINDOW)
+
+
+def test_snapshot_percent_never_goes_backwards(estimator, perf):
+    tracker = JobProgress(estimator, MODEL, ["plan"], Budget(10**9))
+    tracker.outline_size = 5
+    tracker.begin("plan", (0, 0.0))
+    perf.advance(4.0)
+    percent, _ = tracker.snapshot()
+    assert percent == 44
+
+    perf.advance(100.0)
+    assert tracker.snapshot()[0] == 95
+    tracker.skip("plan")
+    assert tracker.snapshot()[0] == 99
@@ -0,0 +1,100 @@
+import bench
+import pytest
+from research import ResearchPipeline, TokenCounter
+from state import OutlineQueries, SearchQuery, SectionQueries
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return ResearchPipeline(
+        llm=bench.FakeChatModel(latency=0, tokens_per_second=1e6),
+        retriever=bench.FakeRetriever(latency=0),
+        counter=TokenCounter(encoding=bench.WordEncoding()),
+    )
+
+
+def written(*sections):
+    return OutlineQueries(
+        sections=[
+            SectionQueries(
+                section=name,
+                queries=[SearchQuery(search_query=q) for q in queries],
+            )
+            for name, queries in sections
+        ]
+    )
+
+
+def test_queries_are_matched_by_section_text(pipeline):
+    generated = written(
+        ("Battery costs", ["lfp prices"]),
+        ("- grid storage.", ["pumped hydro", "grid batteries"]),
+    )
+
+    queries = pipeline._match_queries(["Grid storage", "Battery costs"], generated)
+
+    assert queries == {
+        "Grid storage": ["pumped hydro", "grid batteries"],
+        "Battery costs": ["lfp prices"],
+    }
+
+
+def test_reworded_sections_fall_back_to_their_position(pipeline):
+    generated = written(
+        ("Battery costs", ["lfp prices"]),
+        ("Storing energy on the grid", ["pumped hydro"]),
+    )
+
+    queries = pipeline._match_queries(["Battery costs", "Grid storage"], generated)
+
+    assert queries["Grid storage"] == ["pumped hydro"]
+
+
+def test_points_without_queries_are_searched_as_is(pipeline):
+    pipeline.config.QUERIES_PER_SECTION = 2
+    generated = written(("Battery costs", ["a", " ", "b", "c"]), ("Grid", []))
+
+    queries = pipeline._match_queries(["Battery costs", "Grid", "Outlook"], generated)
+
+    assert queries == {
+        "Battery costs": ["a", "b"],
+        "Grid": ["Grid"],
+        "Outlook": ["Outlook"],
+    }
+
+
+class CountingEncoding(bench.WordEncoding):
+    def __init__(self):
+        self.single = 0
+        self.batches = 0
+
+    def encode_ordinary(self, text):
+        self.single += 1
+        return super().encode_ordinary(text)
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        self.batches += 1
+        return [bench.WordEncoding.encode_ordinary(self, text) for text in texts]
+
+
+def test_single_counts_skip_the_batch_encoder_and_are_memoized():
+    encoding = CountingEncoding()
+    counter = TokenCounter(encoding=encoding)
+
+    assert counter.count("three word text") == 3
+    assert counter.count("three word text") == 3
+    assert (encoding.single, encoding.batches) == (1, 0)
+    assert counter.count_batch(["three word text", "two words"]) == [3, 2]
+    assert encoding.batches == 1
+
+
+def test_memo_keeps_the_most_recent_counts():
+    encoding = CountingEncoding()
+    counter = TokenCounter(memo_size=2, encoding=encoding)
+
+    counter.count_batch(["a", "b c", "d e f"])
+    assert counter.count("d e f") == 3
+    assert encoding.single == 0
+    assert counter.count("a") == 1
+    assert encoding.single == 1
@@ -0,0 +1,95 @@
+import time
+
+from research import Budget
+from scheduler import BATCH, INTERACTIVE, JobTicket, TokenScheduler, job_context
+
+
+def enqueue(scheduler, ticket, tokens=10):
+    with job_context(ticket):
+        return scheduler._enter(tokens, lambda: None)
+
+
+def head(scheduler):
+    with scheduler._lock:
+        return scheduler._head()
+
+
+def test_interactive_goes_before_batch():
+    scheduler = TokenScheduler(Budget(100))
+    batch = enqueue(scheduler, JobTicket("a", BATCH))
+    interactive = enqueue(scheduler, JobTicket("b", INTERACTIVE))
+
+    assert head(scheduler) is interactive
+    scheduler._leave(interactive, admitted=True)
+    assert head(scheduler) is batch
+
+
+def test_user_with_smaller_recent_share_goes_first():
+    scheduler = TokenScheduler(Budget(100))
+    heavy = enqueue(scheduler, JobTicket("heavy"), tokens=50)
+    scheduler._leave(heavy, admitted=True)
+
+    again = enqueue(scheduler, JobTicket("heavy"))
+    light = enqueue(scheduler, JobTicket("light"))
+    assert head(scheduler) is light
+    scheduler._leave(light, admitted=True)
+    assert head(scheduler) is again
+
+
+def test_equal_calls_go_in_arrival_order():
+    scheduler = TokenScheduler(Budget(100))
+    first = enqueue(scheduler, JobTicket("a"))
+    enqueue(scheduler, JobTicket("b"))
+
+    assert head(scheduler) is first
+
+
+def test_shortest_first_ranks_by_estimate():
+    scheduler = TokenScheduler(Budget(100), shortest_first=True)
+    enqueue(scheduler, JobTicket("a", estimate=30.0))
+    short = enqueue(scheduler, JobTicket("b", estimate=5.0))
+
+    assert head(scheduler) is short
+
+
+def test_call_waiting_past_max_wait_goes_first():
+    scheduler = TokenScheduler(Budget(100), max_wait=60)
+    batch = enqueue(scheduler, JobTicket("a", BATCH))
+    enqueue(scheduler, JobTicket("b", INTERACTIVE))
+
+    batch.since = time.monotonic() - 61
+    assert head(scheduler) is batch
+
+
+def test_only_the_head_asks_the_budget():
+    budget = Budget(100)
+    scheduler = TokenScheduler(budget)
+    first = enqueue(scheduler, JobTicket("a"))
+    second = enqueue(scheduler, JobTicket("b"))
+
+    reservation, wait = scheduler._try(second)
+    assert reservation is None
+    assert wait == TokenScheduler.POLL
+    assert budget.headroom() == 100
+    assert scheduler._try(first)[0] is not None
+
+
+def test_consume_reserves_in_the_budget():
+    budget = Budget(100)
+    scheduler = TokenScheduler(budget)
+
+    scheduler.consume(40)
+    assert budget.headroom() == 60
+    assert scheduler.queued() == 0
+
+
+def test_fair_share_counts_the_call_itself():
+    scheduler = TokenScheduler(Budget(100))
+    served = enqueue(scheduler, JobTicket("served"), tokens=20)
+    scheduler._leave(served, admitted=True)
+
+    large = enqueue(scheduler, JobTicket("fresh"), tokens=50)
+    small = enqueue(scheduler, JobTicket("served"), tokens=10)
+    assert head(scheduler) is small
+    scheduler._leave(small, admitted=True)
+    assert head(scheduler) is large
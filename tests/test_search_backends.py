@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+import search_backends
+from langchain_core.documents import Document
+from search_backends import (
+    HybridBackend,
+    LocalIndex,
+    LocalIndexBackend,
+    SearchBackend,
+    index_paths,
+)
+
+
+class FakeWeb(SearchBackend):
+    """Web backend that answers every query with one page."""
+
+    name = "fake-web"
+
+    def __init__(self, k=3):
+        super().__init__(k)
+        self.queries = []
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.SEARCH_K)
+
+    def invoke(self, query):
+        self.queries.append(query)
+        return [
+            Document(
+                page_content=f"web page about {query}",
+                metadata={"source": f"https://example.com/{len(self.queries)}"},
+            )
+        ]
+
+
+@pytest.fixture
+def index():
+    index = LocalIndex()
+    index.add_many(
+        [
+            (
+                "file:///a.md",
+                "Sodium-ion batteries",
+                "Sodium-ion cells cost less than lithium cells.",
+                "corpus",
+            ),
+            (
+                "file:///b.md",
+                "Grid storage",
+                "Grid storage uses battery packs and pumped hydro.",
+                "corpus",
+            ),
+            ("file:///c.md", "Gardening", "Soil, compost and seeds.", "corpus"),
+            ("file:///d.md", "Cooking", "Bread needs flour and time.", "corpus"),
+        ]
+    )
+    return index
+
+
+def test_best_bm25_match_comes_first(index):
+    results = index.search("sodium battery cost", 3)
+
+    assert [url for url, *_ in results] == ["file:///a.md", "file:///b.md"]
+    assert results[0][3] > results[1][3]
+
+
+def test_stemming_and_fts_syntax_in_queries(index):
+    assert index.search("batteries", 3)[0][0] == "file:///b.md"
+    assert index.search('soil" OR NEAR(', 3)[0][0] == "file:///c.md"
+    assert index.search("?!", 3) == []
+
+
+def test_add_replaces_a_document_with_the_same_url(index):
+    index.add("file:///c.md", "Gardening", "Tomatoes and peppers.", "corpus")
+
+    assert index.search("compost", 3) == []
+    assert index.search("tomatoes", 3)[0][0] == "file:///c.md"
+    assert index.stats() == {"corpus": 4}
+
+
+def test_index_paths_reads_text_markdown_and_html(tmp_path):
+    (tmp_path / "notes.md").write_text("# Perovskite cells\nEfficiency keeps rising.")
+    (tmp_path / "page.html").write_text(
+        "<html><title>Wind power</title><script>var x;</script>"
+        "<body>Offshore turbines</body></html>"
+    )
+    (tmp_path / "image.png").write_bytes(b"\x89PNG")
+    index = LocalIndex(str(tmp_path / "index.db"))
+
+    assert index_paths(index, [str(tmp_path)]) == 2
+    url, title, content, _ = index.search("offshore", 1)[0]
+    assert url.endswith("page.html")
+    assert title == "Wind power"
+    assert "var x" not in content
+    assert index.search("perovskite", 1)[0][1] == "Perovskite cells"
+
+
+def test_local_backend_returns_documents_and_is_not_cached(index):
+    backend = LocalIndexBackend(1, index)
+
+    hits = backend.invoke("pumped hydro")
+    assert len(hits) == 1
+    assert hits[0].metadata["source"] == "file:///b.md"
+    assert hits[0].metadata["title"] == "Grid storage"
+    assert backend.cacheable is False
+    assert asyncio.run(backend.ainvoke("pumped hydro")) == hits
+
+
+def test_hybrid_skips_the_web_when_the_index_has_enough(index):
+    web = FakeWeb()
+    hybrid = HybridBackend(LocalIndexBackend(3, index), web, min_local_hits=2)
+
+    assert len(hybrid.invoke("sodium battery")) == 2
+    assert web.queries == []
+
+
+def test_hybrid_merges_web_results_when_the_index_falls_short(index):
+    web = FakeWeb()
+    hybrid = HybridBackend(LocalIndexBackend(3, index), web, min_local_hits=2)
+
+    hits = asyncio.run(hybrid.ainvoke("sodium"))
+    assert [h.metadata["source"] for h in hits] == [
+        "file:///a.md",
+        "https://example.com/1",
+    ]
+    assert web.queries == ["sodium"]
+
+
+def test_fetched_pages_are_added_to_the_index(monkeypatch):
+    monkeypatch.setenv("TAVILY_API_KEY", "test")
+    index = LocalIndex()
+    backend = search_backends.TavilyBackend(3, index)
+    backend.retriever = FakeWeb()
+
+    backend.invoke("tidal energy")
+    assert index.stats() == {"fetched": 1}
+    assert index.search("tidal", 1)[0][0] == "https://example.com/1"
+
+
+def test_backends_must_implement_the_interface():
+    class Incomplete(SearchBackend):
+        @classmethod
+        def from_config(cls, config):
+            return cls(3)
+
+    with pytest.raises(TypeError):
+        Incomplete(3)
+
+
+def test_create_rejects_unknown_backends():
+    assert {"tavily", "local", "hybrid"} <= set(search_backends.BACKENDS)
+    with pytest.raises(ValueError):
+        search_backends.create("nope", object())